@@ -2,8 +2,23 @@
 Package commons
 """
 import locale
+import os
 from pathlib import Path
 
 locale.setlocale(locale.LC_ALL, '')
 BASEDIR = Path(__file__).parent
 DEFAULT_LOG_DIR = Path("/var/tmp")
+
+
+def private_directory(directory: Path | str) -> bool:
+    """
+    Check that only the current user can change a directory, before trusting what it holds.
+    DEFAULT_LOG_DIR is writable by everybody, anybody could create a directory there first
+    :param directory:
+    :return: False if it doesn't exist, belongs to another user, or others can write on it
+    """
+    try:
+        stat = os.stat(directory)
+    except FileNotFoundError:
+        return False
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
@@ -13,11 +13,12 @@ from textual.app import App, ComposeResult, CSSPathType
 from textual.driver import Driver
 from textual.reactive import Reactive
 from textual.widgets import DataTable, Footer, Header
+from textual.widgets.data_table import RowKey
 from textual.worker import get_current_worker
 
 from suricatalog.clipboard import copy_from_table
 from suricatalog.filter import BaseFilter
-from suricatalog.log import EveLogHandler
+from suricatalog.log import EveLogHandler, notify_malformed
 from suricatalog.providers import TableAlertProvider, TableColumns
 from suricatalog.screens import DetailScreen, ErrorScreen
 
@@ -42,6 +43,7 @@ class BaseAlertApp(App):
         super().__init__(driver_class, css_path, watch_css)
         self.eve_files = None
         self.filter = None
+        self.eve_lh = None
 
     @staticmethod
     def __get_key_from_map__(data: dict[str, Any], keys: list[str]) -> str | None:
@@ -111,6 +113,16 @@ class BaseAlertApp(App):
             raise ValueError("One or more eve files is required")
         self.eve_files = eve_files
 
+    def set_eve_log_handler(self, eve_lh: EveLogHandler):
+        """
+        Set the reader used to get the events from the eve files
+        :param eve_lh:
+        :return:
+        """
+        if not eve_lh:
+            raise ValueError("Eve log handler is required")
+        self.eve_lh = eve_lh
+
 
 class TableAlertApp(BaseAlertApp):
     """
@@ -138,7 +150,7 @@ class TableAlertApp(BaseAlertApp):
         :param watch_css:
         """
         super().__init__(driver_class, css_path, watch_css)
-        self.events: dict[dict[str, any]] | dict = {}
+        self.events: dict[RowKey, dict[str, Any]] = {}
 
     async def show_error(
             self,
@@ -182,18 +194,50 @@ class TableAlertApp(BaseAlertApp):
     async def update_alert_table(self):
         alerts_tbl = self.query_one(DataTable)
         alert_cnt = 0
-        eve_lh = EveLogHandler()
+        eve_lh = self.eve_lh if self.eve_lh else EveLogHandler()
         worker = get_current_worker()
 
         batch_of_events = []
         chunk = 100
-        for event in eve_lh.get_events(data_filter=self.filter, eve_files=self.eve_files):
+        following = False
+
+        def add_rows() -> None:
+            """
+            Show the pending rows, keeping each event by the key of its row (several alerts can share a timestamp)
+            """
+            nonlocal batch_of_events
+            row_keys = self.call_from_thread(alerts_tbl.add_rows, [row for row, _ in batch_of_events])
+            for row_key, (_, event) in zip(row_keys, batch_of_events, strict=True):
+                self.events[row_key] = event
+            batch_of_events = []
+
+        def flush_pending() -> None:
+            """
+            In follow mode, show the pending rows as soon as there is nothing more to read
+            """
+            nonlocal following
+            if batch_of_events and not worker.is_cancelled:
+                add_rows()
+            if not following and not worker.is_cancelled:
+                following = True
+                self.call_from_thread(
+                    self.notify,
+                    title="Following new events",
+                    timeout=5,
+                    message=f"Loaded {alert_cnt:,} messages, new alerts will show up as they arrive."
+                )
+
+        for event in eve_lh.get_events(
+                data_filter=self.filter,
+                eve_files=self.eve_files,
+                stop=lambda: worker.is_cancelled,
+                on_idle=flush_pending
+        ):
             self.log.debug(f"Got event (filter={self.filter}): {event}")
-            if not self.filter.accept(event):
-                continue
             brief_data = await BaseAlertApp.extract_from_alert(event)
             if not brief_data:
                 self.log.warning("Skipping malformed event: %s", event)
+                continue
             timestamp = brief_data['timestamp']
             severity = brief_data['severity']
             signature = brief_data['signature']
@@ -201,7 +245,7 @@ class TableAlertApp(BaseAlertApp):
             dest_ip_port = f"{brief_data['dest_ip']}:{brief_data['dest_port']}"
             src_ip_port = f"{brief_data['src_ip']}:{brief_data['src_port']}"
             payload_printable = brief_data['payload_printable']
-            batch_of_events.append([
+            batch_of_events.append(([
                 timestamp,
                 severity,
                 signature,
@@ -209,16 +253,13 @@ class TableAlertApp(BaseAlertApp):
                 dest_ip_port,
                 src_ip_port,
                 payload_printable
-            ])
+            ], event))
             if len(batch_of_events) == chunk and not worker.is_cancelled:
-                self.call_from_thread(alerts_tbl.add_rows, batch_of_events)
-                batch_of_events = []
+                add_rows()
                 await asyncio.sleep(0.05)
-            alert_cnt += len(batch_of_events)
-            self.events[timestamp] = event
+            alert_cnt += 1
         if batch_of_events and not worker.is_cancelled:
-            self.call_from_thread(alerts_tbl.add_rows, batch_of_events)
-        del batch_of_events
+            add_rows()
         alerts_tbl.sub_title = f"Total alerts: {alert_cnt}"
         if not worker.is_cancelled:
             self.call_from_thread(
@@ -231,6 +272,7 @@ class TableAlertApp(BaseAlertApp):
                         Click on a row to get more details, CTR+\\ to search
                         """) if alert_cnt > 0 else "Nothing to display."
             )
+            self.call_from_thread(notify_malformed, self, eve_lh)
 
         if not alert_cnt:
             val = self.call_from_thread(
@@ -294,10 +336,7 @@ class TableAlertApp(BaseAlertApp):
         :param event:
         :return:
         """
-        table = event.data_table
-        row_key = event.row_key
-        row = table.get_row(row_key)
-        data = self.events[row[0]]
+        data = self.events[event.row_key]
         event_detail = DetailScreen(data=data)
         self.push_screen(event_detail)
 
@@ -0,0 +1,473 @@
+"""
+Columnar cache of parsed eve files, so repeated reports don't parse the same JSON again.
+
+An eve file is converted once (see the eve_cache script) into segments partitioned by event type and day.
+Each field path of a segment is stored as its own zlib compressed column: integers, floats and booleans as
+contiguous arrays, Suricata timestamps as epoch microseconds, anything else dictionary encoded.
+Readers only decompress the columns they need, and skip the segments whose event type or time range
+can't be accepted by the filter.
+"""
+import array
+import copy
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import zlib
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from suricatalog import DEFAULT_LOG_DIR, private_directory
+from suricatalog.filter import AlwaysTrueFilter, BaseFilter
+from suricatalog.log import MalformedLines, detect_compression, parse_events, read_lines
+from suricatalog.time import timestamp_micros
+
+DEFAULT_CACHE_DIR = DEFAULT_LOG_DIR / "suricatalog-cache"
+CACHE_VERSION = 2
+SEGMENT_ROWS = 64 * 1024
+SEGMENT_MAGIC = b'SLC1'
+MANIFEST = "manifest.json"
+MICROSECONDS_PER_DAY = 86_400_000_000
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+EPOCH = datetime(1970, 1, 1)
+# Missing value on a column, JSON null is a legit value
+_MISSING = object()
+
+
+def _flatten(event: dict[str, Any], prefix: tuple[str, ...] = ()) -> Iterator[tuple[tuple[str, ...], Any]]:
+    """
+    Walk the leaves of a nested event. Empty objects are leaves too, so they survive the round trip
+    :param event:
+    :param prefix:
+    :return: Path and value of every leaf
+    """
+    for key, value in event.items():
+        path = prefix + (key,)
+        if isinstance(value, dict) and value:
+            yield from _flatten(value, path)
+        else:
+            yield path, value
+
+
+def _split_timestamp(value: Any) -> tuple[int, str] | None:
+    """
+    Split a Suricata timestamp, like 2022-02-08T09:40:29.080710-0500, into UTC epoch microseconds and its offset
+    :param value:
+    :return: None if the value doesn't have exactly that format
+    """
+    if not isinstance(value, str) or len(value) != 31 or value[26] not in '+-' or value[10] != 'T':
+        return None
+    try:
+        local = datetime(
+            int(value[0:4]), int(value[5:7]), int(value[8:10]),
+            int(value[11:13]), int(value[14:16]), int(value[17:19]), int(value[20:26])
+        )
+        offset = (int(value[27:29]) * 3600 + int(value[29:31]) * 60) * 1_000_000
+    except ValueError:
+        return None
+    if value[26] == '-':
+        offset = -offset
+    utc = (local - EPOCH) // timedelta(microseconds=1) - offset
+    if _join_timestamp(utc, offset, value[26:]) != value:
+        return None
+    return utc, value[26:]
+
+
+def _join_timestamp(utc: int, offset: int, offset_text: str) -> str:
+    """
+    Inverse of _split_timestamp
+    :param utc: Epoch microseconds
+    :param offset: UTC offset, in microseconds
+    :param offset_text: UTC offset as written on the original timestamp
+    :return:
+    """
+    return (EPOCH + timedelta(microseconds=utc + offset)).isoformat(timespec='microseconds') + offset_text
+
+
+def _offset_microseconds(offset_text: str) -> int:
+    """
+    :param offset_text: Like -0500
+    :return:
+    """
+    offset = (int(offset_text[1:3]) * 3600 + int(offset_text[3:5]) * 60) * 1_000_000
+    return -offset if offset_text[0] == '-' else offset
+
+
+def _encode_column(values: list[Any]) -> tuple[str, list[bytes]]:
+    """
+    Pick the most compact encoding for the values of a column
+    :param values: One value per row, _MISSING where the row doesn't have it
+    :return: Kind of column and its uncompressed parts
+    """
+    present = [value for value in values if value is not _MISSING]
+    presence = [b''] if len(present) == len(values) else [bytes(value is not _MISSING for value in values)]
+    kinds = {type(value) for value in present}
+    if kinds == {bool}:
+        return 'bool', presence + [bytes(value is True for value in values)]
+    if kinds == {int} and min(present) >= INT64_MIN and max(present) <= INT64_MAX:
+        return 'int', presence + [array.array('q', (0 if value is _MISSING else value for value in values)).tobytes()]
+    if kinds == {float}:
+        return 'float', presence + [
+            array.array('d', (0.0 if value is _MISSING else value for value in values)).tobytes()
+        ]
+    if kinds == {str}:
+        splits = [None if value is _MISSING else _split_timestamp(value) for value in values]
+        if all(split is not None for split, value in zip(splits, values, strict=True) if value is not _MISSING):
+            offsets: dict[str, int] = {}
+            codes = array.array('I', (0 if split is None else offsets.setdefault(split[1], len(offsets) + 1)
+                                      for split in splits))
+            utc = array.array('q', (0 if split is None else split[0] for split in splits))
+            return 'timestamp', [utc.tobytes(), orjson.dumps(list(offsets)), codes.tobytes()]
+    dictionary: dict[Any, int] = {}
+    entries = []
+    codes = array.array('I')
+    for value in values:
+        if value is _MISSING:
+            codes.append(0)
+            continue
+        if isinstance(value, str):
+            key = value
+        else:
+            try:
+                key = orjson.dumps(value)
+            except TypeError:
+                key = json.dumps(value).encode('utf-8')
+        code = dictionary.get(key)
+        if code is None:
+            code = dictionary[key] = len(entries) + 1
+            entries.append(value)
+        codes.append(code)
+    try:
+        return 'dictionary', [orjson.dumps(entries), codes.tobytes()]
+    except TypeError:
+        # Integers orjson can't represent
+        return 'json', [json.dumps(entries).encode('utf-8'), codes.tobytes()]
+
+
+def _decode_column(kind: str, parts: list[bytes], byteorder: str) -> list[Any]:
+    """
+    Inverse of _encode_column
+    :param kind:
+    :param parts:
+    :param byteorder: Byte order of the machine that wrote the arrays
+    :return: One value per row, _MISSING where the row doesn't have it
+    """
+
+    def numbers(typecode: str, data: bytes) -> list[Any]:
+        numeric = array.array(typecode)
+        numeric.frombytes(data)
+        if byteorder != sys.byteorder:
+            numeric.byteswap()
+        return numeric.tolist()
+
+    if kind in ('bool', 'int', 'float'):
+        presence, data = parts
+        if kind == 'bool':
+            values: list[Any] = [value == 1 for value in data]
+        else:
+            values = numbers('q' if kind == 'int' else 'd', data)
+        if presence:
+            values = [value if here else _MISSING for value, here in zip(values, presence, strict=True)]
+        return values
+    if kind == 'timestamp':
+        utc = numbers('q', parts[0])
+        offsets = [None] + [(_offset_microseconds(text), text) for text in orjson.loads(parts[1])]
+        return [
+            _MISSING if not code else _join_timestamp(epoch, *offsets[code])
+            for epoch, code in zip(utc, numbers('I', parts[2]), strict=True)
+        ]
+    if kind in ('dictionary', 'json'):
+        entries = orjson.loads(parts[0]) if kind == 'dictionary' else json.loads(parts[0])
+        if any(isinstance(entry, list | dict) for entry in entries):
+            # Every row gets its own copy of lists and objects
+            return [copy.deepcopy(entries[code - 1]) if code else _MISSING for code in numbers('I', parts[1])]
+        lookup = [_MISSING] + entries
+        return [lookup[code] for code in numbers('I', parts[1])]
+    raise ValueError(f"Unknown column kind: {kind}")
+
+
+def _needed(path: list[str], tree: dict[str, Any] | None) -> bool:
+    """
+    Check if a column is part of a projection
+    :param path:
+    :param tree: See suricatalog.log.projection(), None keeps everything
+    :return:
+    """
+    node = tree
+    for key in path:
+        if node is None:
+            return True
+        if key not in node:
+            return False
+        node = node[key]
+    return True
+
+
+class _SegmentBuilder:
+    """
+    Collect the events of one partition, until they are written as a segment
+    """
+
+    def __init__(self, event_type: str | None, day: int | None, first_row: int):
+        self.event_type = event_type
+        self.day = day
+        self.first_row = first_row
+        self.rows = 0
+        self.columns: dict[tuple[str, ...], tuple[list[int], list[Any]]] = {}
+        self.min_time: float | None = None
+        self.max_time: float | None = None
+        self.untimed = False
+
+    def add(self, event: dict[str, Any]) -> None:
+        """
+        Append an event, remembering the time range as the filters see it
+        :param event:
+        :return:
+        """
+        for path, value in _flatten(event):
+            column = self.columns.get(path)
+            if column is None:
+                column = self.columns[path] = ([], [])
+            column[0].append(self.rows)
+            column[1].append(value)
+        self.rows += 1
+        try:
+            seen = timestamp_micros(event['timestamp']) / 1_000_000
+        except (KeyError, ValueError, TypeError, AttributeError):
+            self.untimed = True
+            return
+        self.min_time = seen if self.min_time is None else min(self.min_time, seen)
+        self.max_time = seen if self.max_time is None else max(self.max_time, seen)
+
+    def write(self, segment_file: Path) -> dict[str, Any]:
+        """
+        Write the segment: magic, header length, JSON header and the compressed column parts
+        :param segment_file:
+        :return: Description of the segment for the manifest
+        """
+        header: dict[str, Any] = {'rows': self.rows, 'byteorder': sys.byteorder, 'columns': []}
+        blobs = []
+        position = 0
+        for path, (rows, present) in self.columns.items():
+            values: list[Any] = [_MISSING] * self.rows
+            for row, value in zip(rows, present, strict=True):
+                values[row] = value
+            kind, parts = _encode_column(values)
+            spans = []
+            for part in parts:
+                blob = zlib.compress(part)
+                blobs.append(blob)
+                spans.append([position, len(blob)])
+                position += len(blob)
+            header['columns'].append({'path': list(path), 'kind': kind, 'parts': spans})
+        encoded_header = orjson.dumps(header)
+        with open(segment_file, 'wb') as segment:
+            segment.write(SEGMENT_MAGIC + struct.pack('<I', len(encoded_header)) + encoded_header)
+            for blob in blobs:
+                segment.write(blob)
+        return {
+            'file': segment_file.name,
+            'event_type': self.event_type,
+            'day': self.day,
+            'first_row': self.first_row,
+            'rows': self.rows,
+            'min_time': self.min_time,
+            'max_time': None if self.untimed else self.max_time
+        }
+
+
+def read_segment(segment_file: Path | str, tree: dict[str, Any] | None = None) -> Iterator[dict[str, Any]]:
+    """
+    Rebuild the events of a segment, only with the columns of a projection
+    :param segment_file:
+    :param tree: See suricatalog.log.projection(), None rebuilds the whole events
+    :return:
+    """
+    with open(segment_file, 'rb') as segment:
+        magic, header_size = segment.read(len(SEGMENT_MAGIC)), struct.unpack('<I', segment.read(4))[0]
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f"{segment_file} is not a cache segment")
+        header = orjson.loads(segment.read(header_size))
+        start = segment.tell()
+        columns = []
+        for column in header['columns']:
+            if not _needed(column['path'], tree):
+                continue
+            parts = []
+            for position, size in column['parts']:
+                segment.seek(start + position)
+                parts.append(zlib.decompress(segment.read(size)))
+            *parents, leaf = column['path']
+            columns.append((parents, leaf, _decode_column(column['kind'], parts, header['byteorder'])))
+    for row in range(header['rows']):
+        event: dict[str, Any] = {}
+        for parents, leaf, values in columns:
+            value = values[row]
+            if value is _MISSING:
+                continue
+            node = event
+            for key in parents:
+                node = node.setdefault(key, {})
+            node[leaf] = value
+        yield event
+
+
+@dataclasses.dataclass
+class CacheEntry:
+    """
+    Cached version of one eve file
+    """
+    directory: Path
+    manifest: dict[str, Any]
+
+    def get_events(self, data_filter: BaseFilter, tree: dict[str, Any] | None = None) -> Iterator[dict[str, Any]]:
+        """
+        Events accepted by the filter, grouped by day and, inside a day, by event type.
+        Segments of event types the filter never takes, or older than its minimum timestamp, are not read.
+        :param data_filter:
+        :param tree: Projection of the events, see suricatalog.log.projection()
+        :return:
+        """
+        min_timestamp = data_filter.min_timestamp
+        for segment in self.manifest['segments']:
+            if data_filter.event_types is not None and segment['event_type'] not in data_filter.event_types:
+                continue
+            if min_timestamp and segment['max_time'] is not None and segment['max_time'] <= min_timestamp.timestamp():
+                continue
+            for event in read_segment(self.directory / segment['file'], tree):
+                if data_filter.accept(event):
+                    yield event
+
+
+class EveCache:
+    """
+    Directory with the columnar version of eve files, one entry per file.
+    Entries are keyed by the device and inode of the file, and only used while its size and mtime don't change.
+    """
+
+    def __init__(self, cache_dir: Path | str = DEFAULT_CACHE_DIR, segment_rows: int = SEGMENT_ROWS):
+        """
+        :param cache_dir: Created on the first build, only for the current user. Not used if anybody else can change it
+        :param segment_rows: Maximum number of events on each segment
+        """
+        self.cache_dir = Path(cache_dir)
+        self.segment_rows = segment_rows
+        self.__warned__ = False
+
+    def __trusted__(self) -> bool:
+        """
+        Check that nobody else could have planted entries on the cache directory. Warn once if they could
+        :return:
+        """
+        if private_directory(self.cache_dir):
+            return True
+        if self.cache_dir.exists() and not self.__warned__:
+            logging.getLogger(__name__).warning(
+                "Ignoring cache '%s', it must belong to you and nobody else can write on it", self.cache_dir
+            )
+            self.__warned__ = True
+        return False
+
+    def __get_entry_dir__(self, stat: os.stat_result) -> Path:
+        """
+        Where the entry of a file lives
+        :param stat:
+        :return:
+        """
+        return self.cache_dir / hashlib.sha256(f"{stat.st_dev}:{stat.st_ino}".encode()).hexdigest()[:32]
+
+    def lookup(self, eve_file: Path | str) -> CacheEntry | None:
+        """
+        Find the entry of a file
+        :param eve_file:
+        :return: None if the file was never cached, or changed since then
+        """
+        stat = os.stat(eve_file)
+        if not self.__trusted__():
+            return None
+        entry_dir = self.__get_entry_dir__(stat)
+        try:
+            manifest = orjson.loads((entry_dir / MANIFEST).read_bytes())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return None
+        if (
+                manifest.get('version') != CACHE_VERSION or
+                manifest['size'] != stat.st_size or
+                manifest['mtime_ns'] != stat.st_mtime_ns
+        ):
+            return None
+        return CacheEntry(directory=entry_dir, manifest=manifest)
+
+    def build(self, eve_file: Path | str, malformed: MalformedLines | None = None) -> CacheEntry:
+        """
+        Parse a file (compressed or not) and replace its cache entry
+        :param eve_file:
+        :param malformed: Counts the lines that are not valid JSON. If missing, they are summarized at the end
+        :return:
+        :raise PermissionError: The cache directory belongs to another user, or others can write on it
+        """
+        if malformed is None:
+            malformed = MalformedLines(logging.getLogger(__name__))
+            try:
+                return self.build(eve_file, malformed)
+            finally:
+                malformed.summary()
+        stat = os.stat(eve_file)
+        entry_dir = self.__get_entry_dir__(stat)
+        self.cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not private_directory(self.cache_dir):
+            raise PermissionError(f"Cache '{self.cache_dir}' must belong to you and nobody else can write on it")
+        build_dir = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=f"{entry_dir.name}."))
+        try:
+            if detect_compression(eve_file):
+                lines = read_lines(eve_file)
+            else:
+                # Data appended while building shows up on the next run, the size on the manifest doesn't include it
+                lines = read_lines(eve_file, end=stat.st_size)
+            partitions: dict[tuple[str | None, int | None], _SegmentBuilder] = {}
+            segments = []
+            events = 0
+            for event in parse_events(lines, AlwaysTrueFilter(), malformed.add):
+                if not isinstance(event, dict):
+                    malformed.logger.warning("Ignoring event that is not a JSON object: %s", event)
+                    continue
+                event_type = event.get('event_type')
+                split = _split_timestamp(event.get('timestamp'))
+                day = split[0] // MICROSECONDS_PER_DAY if split else None
+                builder = partitions.get((event_type, day))
+                if builder is None:
+                    builder = partitions[(event_type, day)] = _SegmentBuilder(event_type, day, events)
+                builder.add(event)
+                events += 1
+                if builder.rows >= self.segment_rows:
+                    segments.append(builder.write(build_dir / f"{len(segments)}.seg"))
+                    del partitions[(event_type, day)]
+            for builder in partitions.values():
+                segments.append(builder.write(build_dir / f"{len(segments)}.seg"))
+            segments.sort(key=lambda segment: (segment['day'] is None, segment['day'] or 0, segment['first_row']))
+            manifest = {
+                'version': CACHE_VERSION,
+                'source': Path(eve_file).resolve().as_posix(),
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'events': events,
+                'segments': segments
+            }
+            (build_dir / MANIFEST).write_bytes(orjson.dumps(manifest))
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir)
+            os.rename(build_dir, entry_dir)
+        except BaseException:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+        return CacheEntry(directory=entry_dir, manifest=manifest)
@@ -8,10 +8,14 @@ from pathlib import Path
 
 from textual.app import App
 
+from suricatalog.checkpoint import Checkpoint
+from suricatalog.distinct_app import DistinctApp
 from suricatalog.filter import BaseFilter
 from suricatalog.flow_app import FlowApp
 from suricatalog.hostdatause_app import HostDataUse
+from suricatalog.log import EveLogHandler
 from suricatalog.oneshot_app import OneShotApp
+from suricatalog.sketch import DEFAULT_COUNTERS, DEFAULT_PRECISION
 from suricatalog.topuser_app import TopUserApp
 
 locale.setlocale(locale.LC_ALL, '')
@@ -20,17 +24,23 @@ locale.setlocale(locale.LC_ALL, '')
 def get_one_shot_flow_table(
         *,
         eve: list[Path],
-        data_filter: BaseFilter
+        data_filter: BaseFilter,
+        eve_lh: EveLogHandler | None = None,
+        checkpoint: Checkpoint | None = None
 ) -> App:
     """
     Helper to construct flow table
     :param eve:
     :param data_filter:
+    :param eve_lh:
+    :param checkpoint:
     :return:
     """
     flow_app = FlowApp(
         eve=eve,
-        data_filter=data_filter
+        data_filter=data_filter,
+        eve_lh=eve_lh,
+        checkpoint=checkpoint
     )
     logs = ' '.join(map(str, eve))
     flow_app.title = f"SuricataLog FLOW protocol, logs={logs}"
@@ -40,19 +50,25 @@ def get_one_shot_flow_table(
 def get_host_data_use(
         eve_files: list[Path],
         data_filter: BaseFilter,
-        ip_address: any
+        ip_address: any,
+        eve_lh: EveLogHandler | None = None,
+        checkpoint: Checkpoint | None = None
 ) -> App:
     """
     Helper to construct host data use
     :param eve_files:
     :param data_filter:
     :param ip_address:
+    :param eve_lh:
+    :param checkpoint:
     :return:
     """
     hdu = HostDataUse(
         eve=eve_files,
         data_filter=data_filter,
-        ip_address=ip_address
+        ip_address=ip_address,
+        eve_lh=eve_lh,
+        checkpoint=checkpoint
     )
     hdu.title = f"SuricataLog Net-Flow for: {ip_address}"
     return hdu
@@ -60,38 +76,113 @@ def get_host_data_use(
 
 def get_agents(
         eve_files: list[Path],
-        data_filter: BaseFilter
+        data_filter: BaseFilter,
+        eve_lh: EveLogHandler | None = None,
+        checkpoint: Checkpoint | None = None,
+        counters: int | None = DEFAULT_COUNTERS
 ) -> App:
     """
     Helper to construct common agents app
     :param eve_files:
     :param data_filter:
+    :param eve_lh:
+    :param checkpoint:
+    :param counters: Memory budget, see TopValues
     :return:
     """
     top_user_app = TopUserApp(
         eve=eve_files,
-        data_filter=data_filter
+        data_filter=data_filter,
+        eve_lh=eve_lh,
+        checkpoint=checkpoint,
+        counters=counters
     )
     top_user_app.title = "SuricataLog User Agents"
     return top_user_app
 
 
+def get_top_values(
+        eve_files: list[Path],
+        data_filter: BaseFilter,
+        field: str,
+        counters: int | None,
+        eve_lh: EveLogHandler | None = None,
+        checkpoint: Checkpoint | None = None
+) -> App:
+    """
+    Helper to construct the top values app, for any field
+    :param eve_files:
+    :param data_filter:
+    :param field: Dotted path of the field
+    :param counters: Memory budget, see TopValues
+    :param eve_lh:
+    :param checkpoint:
+    :return:
+    """
+    top_values_app = TopUserApp(
+        eve=eve_files,
+        data_filter=data_filter,
+        eve_lh=eve_lh,
+        checkpoint=checkpoint,
+        field=field,
+        counters=counters
+    )
+    top_values_app.title = f"SuricataLog top {field}"
+    return top_values_app
+
+
+def get_distinct(
+        eve_files: list[Path],
+        data_filter: BaseFilter,
+        key_field: str,
+        value_field: str,
+        precision: int = DEFAULT_PRECISION,
+        eve_lh: EveLogHandler | None = None,
+        checkpoint: Checkpoint | None = None
+) -> App:
+    """
+    Helper to construct the distinct count app
+    :param eve_files:
+    :param data_filter:
+    :param key_field: Dotted path of the field the values are grouped by
+    :param value_field: Dotted path of the field whose distinct values are counted
+    :param precision: Memory per key, see DistinctCountReport
+    :param eve_lh:
+    :param checkpoint:
+    :return:
+    """
+    distinct_app = DistinctApp(
+        eve=eve_files,
+        data_filter=data_filter,
+        eve_lh=eve_lh,
+        checkpoint=checkpoint,
+        key_field=key_field,
+        value_field=value_field,
+        precision=precision
+    )
+    distinct_app.title = f"SuricataLog distinct {value_field} per {key_field}"
+    return distinct_app
+
+
 def get_capture(
         *,
         eve: list[Path],
         data_filter: BaseFilter,
-        title: str
+        title: str,
+        eve_lh: EveLogHandler | None = None
 ) -> App:
     """
     Helper to construct capture app
     :param eve:
     :param data_filter:
     :param title:
+    :param eve_lh:
     :return:
     """
     one_shot_app = OneShotApp(
         eve=eve,
-        data_filter=data_filter
+        data_filter=data_filter,
+        eve_lh=eve_lh
     )
     one_shot_app.title = f"{title}"
     return one_shot_app
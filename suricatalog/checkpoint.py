@@ -0,0 +1,201 @@
+"""
+Persistent checkpoints, so re-runs over a growing eve file only parse the new data
+"""
+import dataclasses
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from suricatalog import DEFAULT_LOG_DIR
+
+DEFAULT_CHECKPOINT_FILE = DEFAULT_LOG_DIR / "suricatalog-checkpoints.json"
+HEAD_SIZE = 4096
+
+
+def head_hash(eve_file: Path | str, size: int) -> str:
+    """
+    Hash the first bytes of a file, to tell apart a file from a different one that reused its inode
+    :param eve_file:
+    :param size: Number of bytes to hash
+    :return:
+    """
+    with open(eve_file, 'rb') as eve:
+        return hashlib.sha256(eve.read(size)).hexdigest()
+
+
+def last_newline_offset(eve_file: Path | str, block_size: int = 64 * 1024) -> int:
+    """
+    Find the offset right after the last newline of a file, so a line still being written is left out
+    :param eve_file:
+    :param block_size:
+    :return: 0 if the file has no complete line
+    """
+    with open(eve_file, 'rb') as eve:
+        position = eve.seek(0, os.SEEK_END)
+        while position > 0:
+            start = max(0, position - block_size)
+            eve.seek(start)
+            block = eve.read(position - start)
+            idx = block.rfind(b'\n')
+            if idx >= 0:
+                return start + idx + 1
+            position = start
+    return 0
+
+
+@dataclasses.dataclass
+class Checkpoint:
+    """
+    Saved state of a report, plus how far each eve file was read to build it.
+    Files are keyed by device and inode, so a file renamed by logrotate is still recognized. Files that are gone are
+    forgotten when the checkpoint is saved, see prune().
+    """
+    name: str
+    state: dict[str, Any] | None = None
+    files: dict[str, dict[str, Any]] = dataclasses.field(default_factory=dict)
+    store: "CheckpointStore | None" = None
+
+    @staticmethod
+    def __key__(stat: os.stat_result) -> str:
+        """
+        Identity of a file on this host
+        :param stat:
+        :return:
+        """
+        return f"{stat.st_dev}:{stat.st_ino}"
+
+    def start_offset(self, eve_file: Path | str) -> int | None:
+        """
+        Where to resume reading a file
+        :param eve_file:
+        :return: Byte offset, None if the file was completely read before and can't grow (compressed)
+        """
+        stat = os.stat(eve_file)
+        saved = self.files.get(Checkpoint.__key__(stat))
+        if not saved or stat.st_size < saved['size']:
+            return 0
+        if head_hash(eve_file, saved['head_size']) != saved['head']:
+            return 0
+        if saved['complete']:
+            return None
+        return saved['offset']
+
+    def update(self, eve_file: Path | str, offset: int | None) -> None:
+        """
+        Record how far a file was read
+        :param eve_file:
+        :param offset: Offset right after the last line read, None if the whole (compressed) file was read
+        :return:
+        """
+        stat = os.stat(eve_file)
+        head_size = min(stat.st_size, HEAD_SIZE)
+        self.files[Checkpoint.__key__(stat)] = {
+            'path': Path(eve_file).absolute().as_posix(),
+            'offset': offset if offset is not None else stat.st_size,
+            'size': stat.st_size,
+            'head': head_hash(eve_file, head_size),
+            'head_size': head_size,
+            'complete': offset is None
+        }
+
+    def prune(self) -> None:
+        """
+        Forget the files that are gone: no file of the directory they were last seen in has their device and inode
+        anymore, or one has but with other first bytes (the inode was reused). Files renamed within their directory,
+        like logrotate does, are kept and their new path recorded
+        :return:
+        """
+        by_directory: dict[Path, set[int]] = {}
+        for key, saved in self.files.items():
+            by_directory.setdefault(Path(saved['path']).parent, set()).add(int(key.rsplit(':', 1)[1]))
+        current: dict[str, str] = {}
+        for directory, inodes in by_directory.items():
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.inode() in inodes and entry.is_file():
+                                current[Checkpoint.__key__(entry.stat())] = entry.path
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        files = {}
+        for key, saved in self.files.items():
+            path = current.get(key)
+            try:
+                if path is None or head_hash(path, saved['head_size']) != saved['head']:
+                    continue
+            except OSError:
+                continue
+            saved['path'] = Path(path).as_posix()
+            files[key] = saved
+        self.files = files
+
+    def save(self) -> None:
+        """
+        Persist this checkpoint in its store
+        :return:
+        """
+        if not self.store:
+            raise ValueError(f"Checkpoint '{self.name}' has no store")
+        self.store.save(self)
+
+
+class CheckpointStore:
+    """
+    JSON file with one checkpoint per report name
+    """
+
+    def __init__(self, path: Path | str = DEFAULT_CHECKPOINT_FILE):
+        """
+        :param path: Checkpoint file, created on the first save
+        """
+        self.path = Path(path)
+
+    def __read__(self) -> dict[str, Any]:
+        """
+        Read all the checkpoints
+        :return:
+        """
+        try:
+            return orjson.loads(self.path.read_bytes())
+        except FileNotFoundError:
+            return {}
+        except orjson.JSONDecodeError as jde:
+            raise ValueError(f"Corrupted checkpoint file {self.path}, please remove it") from jde
+
+    def load(self, name: str) -> Checkpoint:
+        """
+        Load a checkpoint, or an empty one if none was saved with that name
+        :param name: Name of the report, plus anything that changes its results (like an IP address)
+        :return:
+        """
+        saved = self.__read__().get(name, {})
+        return Checkpoint(
+            name=name,
+            state=saved.get('state'),
+            files=saved.get('files', {}),
+            store=self
+        )
+
+    def save(self, checkpoint: Checkpoint) -> None:
+        """
+        Save a checkpoint, replacing the file atomically
+        :param checkpoint:
+        :return:
+        """
+        checkpoint.prune()
+        checkpoints = self.__read__()
+        checkpoints[checkpoint.name] = {
+            'state': checkpoint.state,
+            'files': checkpoint.files
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(mode='wb', dir=self.path.parent, prefix=self.path.name, delete=False) as tmp:
+            tmp.write(orjson.dumps(checkpoints))
+        os.replace(tmp.name, self.path)
@@ -0,0 +1,119 @@
+"""
+Deduplication of events read more than once, like the same alert on eve.json and on a copy of it, or on the logs
+of the two sensors of an HA pair.
+
+Events are identified by their flow id, timestamp, event type and alert signature id. The identities seen so far
+are remembered on a Bloom filter sized up front, so memory stays the same no matter how many events go through it.
+The price is that, at the configured rate, an event seen for the first time may be taken as a duplicate and dropped.
+"""
+import math
+from typing import Any
+
+from suricatalog.sketch import hash64
+
+DEFAULT_CAPACITY = 10_000_000
+DEFAULT_ERROR_RATE = 0.001
+DEDUP_FIELDS = ('flow_id', 'timestamp', 'event_type', 'alert.signature_id')
+HALF_BITS = 32
+HALF_MASK = (1 << HALF_BITS) - 1
+
+
+def event_key(event: dict[str, Any]) -> tuple[Any, ...]:
+    """
+    Identity of an event for deduplication: flow id, timestamp, event type and alert signature id
+    :param event:
+    :return:
+    """
+    alert = event.get('alert')
+    return (
+        event.get('flow_id'),
+        event.get('timestamp'),
+        event.get('event_type'),
+        alert.get('signature_id') if isinstance(alert, dict) else None
+    )
+
+
+class BloomFilter:
+    """
+    Set of hashable keys with false positives and no false negatives, in a fixed amount of memory.
+    Bit positions come from the two halves of the 64-bit hash of the key (double hashing). The hash is
+    suricatalog.sketch.hash64, the same on every process, so the bits can be saved or shared with other processes.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE):
+        """
+        :param capacity: Number of keys the filter is sized for. Past it the false positive rate grows
+        :param error_rate: Probability that a key never added is reported as present, once the filter is full
+        """
+        if capacity < 1:
+            raise ValueError(f"Invalid capacity: {capacity}")
+        if not 0 < error_rate < 1:
+            raise ValueError(f"Invalid error rate: {error_rate}")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add(self, key: Any) -> bool:
+        """
+        Add a key to the filter
+        :param key:
+        :return: True if the key was (probably) already there
+        """
+        bits = self.bits
+        size = self.size
+        hashed = hash64(key)
+        first = hashed & HALF_MASK
+        second = hashed >> HALF_BITS | 1
+        present = True
+        for idx in range(self.hashes):
+            position = (first + idx * second) % size
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                present = False
+                bits[position >> 3] |= mask
+        if not present:
+            self.count += 1
+        return present
+
+    def __contains__(self, key: Any) -> bool:
+        """
+        :param key:
+        :return: True if the key was (probably) added
+        """
+        size = self.size
+        hashed = hash64(key)
+        first = hashed & HALF_MASK
+        second = hashed >> HALF_BITS | 1
+        for idx in range(self.hashes):
+            position = (first + idx * second) % size
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class Deduplicator:
+    """
+    Drop the events already seen, see event_key()
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE):
+        """
+        :param capacity: Number of distinct events expected, memory is about 1.8 bytes per event for a 0.1% error rate
+        :param error_rate: Probability of dropping an event that was not seen before
+        """
+        self.seen = BloomFilter(capacity, error_rate)
+        self.duplicates = 0
+
+    def unique_batch(self, events: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Events of a batch not seen before, in the same order
+        :param events:
+        :return:
+        """
+        add = self.seen.add
+        unique = [event for event in events if not add(event_key(event))]
+        self.duplicates += len(events) - len(unique)
+        return unique
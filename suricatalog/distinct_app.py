@@ -0,0 +1,147 @@
+"""
+Distinct count application, like the sources per port of a scan
+"""
+from functools import partial
+from pathlib import Path
+
+import pyperclip
+from textual import work
+from textual.app import App, ComposeResult, CSSPathType
+from textual.driver import Driver
+from textual.widgets import DataTable, Footer, Header
+
+from suricatalog.checkpoint import Checkpoint
+from suricatalog.clipboard import copy_from_table
+from suricatalog.filter import BaseFilter
+from suricatalog.log import EveLogHandler, notify_malformed
+from suricatalog.report import DistinctCountReport
+from suricatalog.sketch import DEFAULT_PRECISION
+
+
+class DistinctApp(App):
+    """
+    Distinct values per key application
+    """
+    BINDINGS = [
+        ("q", "quit_app", "Quit"),
+        ("y,c", "copy_table", "Copy to clipboard")
+    ]
+    ENABLE_COMMAND_PALETTE = False
+
+    def __init__(
+            self,
+            driver_class: type[Driver] | None = None,
+            css_path: CSSPathType | None = None,
+            watch_css: bool = False,
+            data_filter: BaseFilter = None,
+            eve: list[Path] = None,
+            eve_lh: EveLogHandler = None,
+            checkpoint: Checkpoint = None,
+            key_field: str = 'dest_port',
+            value_field: str = 'src_ip',
+            precision: int = DEFAULT_PRECISION
+    ):
+        """
+        Constructor
+        :param driver_class:
+        :param css_path:
+        :param watch_css:
+        :param data_filter:
+        :param eve:
+        :param eve_lh: Reader for the eve files, a default one is used if missing
+        :param checkpoint: If set, resume the report from it and only read new data. Saved once done
+        :param key_field: Dotted path of the field the values are grouped by
+        :param value_field: Dotted path of the field whose distinct values are counted
+        :param precision: Memory per key, see DistinctCountReport
+        :raise ValueError: The checkpoint counts other fields, or with another precision
+        """
+        super().__init__(driver_class, css_path, watch_css)
+        self.data_filter = data_filter
+        self.eve = eve
+        self.eve_lh = eve_lh if eve_lh else EveLogHandler()
+        self.checkpoint = checkpoint
+        if checkpoint and checkpoint.state:
+            self.report = DistinctCountReport.from_checkpoint(
+                checkpoint.state,
+                key_field=key_field,
+                value_field=value_field,
+                precision=precision
+            )
+        else:
+            self.report = DistinctCountReport(key_field=key_field, value_field=value_field, precision=precision)
+
+    def action_quit_app(self) -> None:
+        """
+        Exit the application
+        :return:
+        """
+        self.exit("Exiting Distinct count now...")
+
+    def action_copy_table(self) -> None:
+        """
+        Copy contents to the clipboard
+        :return:
+        """
+        table_data = self.query_one(DataTable)
+        try:
+            _, ln = copy_from_table(table_data)
+            self.notify(f"Copied {ln} characters!", title="Copied selection")
+        except pyperclip.PyperclipException as exc:
+            # Show a toast popup if we fail to copy.
+            self.notify(
+                str(exc),
+                title="Clipboard error",
+                severity="error",
+            )
+
+    def compose(self) -> ComposeResult:
+        """
+        Place components of the app on screen
+        :return:
+        """
+        yield Header()
+        distinct_tbl = DataTable()
+        distinct_tbl.show_header = True
+        distinct_tbl.add_column(self.report.key_field)
+        distinct_tbl.add_column(f"Distinct {self.report.value_field}")
+        distinct_tbl.add_column("Error")
+        distinct_tbl.zebra_stripes = True
+        distinct_tbl.loading = True
+        distinct_tbl.cursor_type = 'row'
+        yield distinct_tbl
+        yield Footer()
+
+    @work(exclusive=True, thread=True)
+    async def on_mount(self) -> None:
+        """
+        Populate components of the app on screen with relevant data
+        :return:
+        """
+        report = self.report
+        cnt = self.eve_lh.aggregate(
+            report,
+            eve_files=self.eve,
+            data_filter=self.data_filter,
+            checkpoint=self.checkpoint,
+            factory=partial(
+                DistinctCountReport,
+                key_field=report.key_field,
+                value_field=report.value_field,
+                precision=report.precision
+            )
+        )
+        if self.checkpoint:
+            self.checkpoint.state = report.to_state()
+            self.checkpoint.save()
+        rows = [
+            (str(key), f"{count:n}", f"±{error:.1%}" if error else "exact") for key, count, error in report.top()
+        ]
+        distinct_tbl = self.query_one(DataTable)
+        self.call_from_thread(distinct_tbl.add_rows, rows)
+        distinct_tbl.loading = False
+        self.notify(
+            message=f"Aggregated {cnt} events",
+            title="Aggregated events",
+            severity="information" if cnt > 0 else "error",
+        )
+        notify_malformed(self, self.eve_lh)
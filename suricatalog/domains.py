@@ -0,0 +1,174 @@
+"""
+Sets of domains with suffix semantics, like the blocklists of threat feeds: listing 'evil.example' also lists
+'www.evil.example' and anything else under it.
+
+Domains are kept on a trie of their labels, right to left (example, evil, www), so checking a name is one lookup per
+label and stops at the first label that is not on the trie. Nodes are only numbers. The edges are an open addressing
+hash table on two flat arrays: a 64-bit hash of (parent node, label) and the child node, 12 bytes a slot (17 to 26 bytes
+per edge, depending on how full the table is) against about 100 bytes per domain for a set of strings, so multi-million
+domain lists stay within a few hundred MB. Nothing under a listed domain is stored.
+Labels are not stored: two edges with the same 64-bit hash would be confused, with 10 million edges the chance of that
+happening at all is about 1 in 300,000. The hash is suricatalog.sketch.hash64, not hash(), which is salted per process:
+sets are pickled to the workers of EveLogHandler and must find the same keys there.
+"""
+from array import array
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Self
+
+from suricatalog.sketch import hash64
+
+DEFAULT_DOMAIN_FIELDS = ('dns.rrname', 'tls.sni', 'http.hostname')
+INITIAL_CAPACITY = 1024
+MAX_LOAD = 0.7
+NAME_DOMAINS = 3
+
+
+def edge_key(node: int, label: str) -> int:
+    """
+    :param node: Parent node, 0 for the root
+    :param label:
+    :return: Non zero 64-bit key of the edge, the same on every process
+    """
+    return hash64(f'{node}\0{label}') or 1
+
+
+def split_domain(domain: str) -> list[str]:
+    """
+    :param domain: Domain or host name, like 'WWW.Evil.Example.' or '*.evil.example'
+    :return: Lower case labels, right to left, like ['example', 'evil', 'www']. Empty if it is not a name
+    """
+    domain = domain.strip().lower().rstrip('.').removeprefix('*.').lstrip('.')
+    if not domain:
+        return []
+    labels = domain.split('.')
+    labels.reverse()
+    return labels
+
+
+class DomainSet:
+    """
+    Set of domains and everything under them, see the module documentation
+    """
+
+    def __init__(self, domains: Iterable[str] = (), name: str | None = None):
+        """
+        :param domains: Domains like 'evil.example'. A leading '*.' or '.' is ignored, it is implied
+        :param name: Description of the set, defaults to the first domains
+        """
+        self.keys = array('Q', [0]) * INITIAL_CAPACITY
+        self.children = array('I', [0]) * INITIAL_CAPACITY
+        self.nodes = 0
+        self.domains = 0
+        names = []
+        for domain in domains:
+            if self.add(domain) and len(names) <= NAME_DOMAINS:
+                names.append(domain.strip())
+        if name is None:
+            name = ', '.join(names[:NAME_DOMAINS]) + (', ...' if len(names) > NAME_DOMAINS else '')
+        self.name = name
+
+    @classmethod
+    def from_file(cls, domains_file: Path | str) -> Self:
+        """
+        Read one domain per line, the file is never fully loaded in memory. Empty lines and anything after a '#' are
+        skipped. On hosts files ('0.0.0.0 evil.example') the last name of the line is used
+        :param domains_file:
+        :return:
+        """
+        with open(domains_file, encoding='utf-8') as domains:
+            return cls(
+                (tokens[-1] for tokens in (line.split('#', 1)[0].split() for line in domains) if tokens),
+                name=str(domains_file)
+            )
+
+    def __grow__(self) -> None:
+        """
+        Double the hash table, the slot of each edge only depends on its key
+        """
+        keys = self.keys
+        children = self.children
+        capacity = len(keys) * 2
+        mask = capacity - 1
+        self.keys = new_keys = array('Q', [0]) * capacity
+        self.children = new_children = array('I', [0]) * capacity
+        for idx, key in enumerate(keys):
+            if key:
+                slot = key & mask
+                while new_keys[slot]:
+                    slot = (slot + 1) & mask
+                new_keys[slot] = key
+                new_children[slot] = children[idx]
+
+    def add(self, domain: str) -> bool:
+        """
+        :param domain:
+        :return: False if the domain, or a domain above it, was already on the set, or it is not a name
+        """
+        labels = split_domain(domain)
+        if not labels:
+            return False
+        last = len(labels) - 1
+        node = 0
+        for depth, label in enumerate(labels):
+            key = edge_key(node, label)
+            keys = self.keys
+            mask = len(keys) - 1
+            slot = key & mask
+            while keys[slot] and keys[slot] != key:
+                slot = (slot + 1) & mask
+            if keys[slot]:
+                child = self.children[slot]
+                if child & 1:
+                    return False
+                if depth == last:
+                    self.children[slot] = child | 1
+                    self.domains += 1
+                    return True
+                node = child >> 1
+                continue
+            self.nodes += 1
+            node = self.nodes
+            keys[slot] = key
+            self.children[slot] = node << 1 | (depth == last)
+            if self.nodes > len(keys) * MAX_LOAD:
+                self.__grow__()
+        self.domains += 1
+        return True
+
+    def __contains__(self, candidate: object) -> bool:
+        """
+        :param candidate: Host name, as written on the eve events
+        :return: True if the name, or any domain above it, is on the set
+        """
+        if not isinstance(candidate, str):
+            return False
+        labels = candidate.lower().rstrip('.').split('.')
+        keys = self.keys
+        children = self.children
+        mask = len(keys) - 1
+        node = 0
+        for label in reversed(labels):
+            key = edge_key(node, label)
+            slot = key & mask
+            while True:
+                found = keys[slot]
+                if found == key:
+                    break
+                if not found:
+                    return False
+                slot = (slot + 1) & mask
+            child = children[slot]
+            if child & 1:
+                return True
+            node = child >> 1
+        return False
+
+    def __len__(self) -> int:
+        """
+        :return: Number of domains added, not counting the ones that were already under a domain of the set
+        """
+        return self.domains
+
+    def __str__(self) -> str:
+        return self.name
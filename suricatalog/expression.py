@@ -0,0 +1,344 @@
+"""
+Filter expressions, like the ones of --where:
+
+event_type == "alert" and alert.severity <= 2 and dest_port in {443, 8443}
+
+The syntax is a small subset of Python: dotted field paths, constants (strings, numbers, True, False, None, and sets,
+lists or tuples of them), comparisons (==, !=, <, <=, >, >=, in, not in, chained too), 'and', 'or', 'not' and
+parentheses. A field missing on an event is None, and a comparison between values of incompatible types is False.
+
+Expressions are parsed once and compiled into nested closures: field paths are split ahead of time, comparisons
+against constants are specialized, and 'and'/'or' short-circuit. From the comparisons every event must pass, the
+compiler also derives the byte needles the reader uses to skip lines before parsing them (see BaseFilter.needles),
+the fields the expression reads and the only event types it can accept.
+"""
+import ast
+import dataclasses
+import operator
+import re
+from collections.abc import Callable
+from typing import Any
+
+Predicate = Callable[[dict[str, Any]], Any]
+SAFE_NEEDLE_TEXT = re.compile(r'[A-Za-z0-9_.:+ -]*')
+ORDERINGS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.In: lambda value, container: value in container,
+    ast.NotIn: lambda value, container: value not in container,
+    **ORDERINGS,
+}
+
+
+class ExpressionError(ValueError):
+    """
+    The expression is not valid
+    """
+
+
+@dataclasses.dataclass
+class CompiledExpression:
+    """
+    Result of compile_expression(). The predicate returns a truthy value for the matching events
+    """
+    predicate: Predicate
+    needles: tuple[bytes, ...]
+    fields: tuple[str, ...]
+    event_types: tuple[str, ...] | None
+
+
+def _getter(path: tuple[str, ...]) -> Predicate:
+    """
+    Function returning the value of a field path on an event, or None if it is missing
+    :param path: Keys, from the top of the event
+    :return:
+    """
+    if len(path) == 1:
+        key = path[0]
+        return lambda event: event.get(key)
+    if len(path) == 2:
+        first, second = path
+
+        def get_nested(event: dict[str, Any]) -> Any:
+            value = event.get(first)
+            return value.get(second) if value.__class__ is dict else None
+
+        return get_nested
+
+    def get_path(event: dict[str, Any]) -> Any:
+        value = event
+        for key in path:
+            if value.__class__ is not dict:
+                return None
+            value = value.get(key)
+        return value
+
+    return get_path
+
+
+class _Compiler:
+    """
+    Turn a validated expression tree into closures, collecting the field paths it reads
+    """
+
+    def __init__(self):
+        self.paths: dict[tuple[str, ...], None] = {}
+
+    @staticmethod
+    def field_path(node: ast.AST) -> tuple[str, ...] | None:
+        """
+        :param node:
+        :return: Keys of a dotted field path, None if the node is not one
+        """
+        if isinstance(node, ast.Name):
+            return (node.id,)
+        if isinstance(node, ast.Attribute):
+            parent = _Compiler.field_path(node.value)
+            return (*parent, node.attr) if parent else None
+        return None
+
+    @staticmethod
+    def constant(node: ast.AST) -> tuple[bool, Any]:
+        """
+        :param node:
+        :return: If the node is a constant, and its value. Sets become frozensets, lists become tuples
+        """
+        if isinstance(node, ast.Constant) and isinstance(node.value, str | int | float | bool | type(None)):
+            return True, node.value
+        if (
+                isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub | ast.UAdd) and
+                isinstance(node.operand, ast.Constant) and isinstance(node.operand.value, int | float) and
+                not isinstance(node.operand.value, bool)
+        ):
+            return True, -node.operand.value if isinstance(node.op, ast.USub) else node.operand.value
+        if isinstance(node, ast.Set | ast.List | ast.Tuple):
+            values = []
+            for element in node.elts:
+                is_constant, value = _Compiler.constant(element)
+                if not is_constant or isinstance(value, frozenset | tuple):
+                    raise ExpressionError(f"Only constants are allowed inside a collection: {ast.unparse(element)}")
+                values.append(value)
+            return True, frozenset(values) if isinstance(node, ast.Set) else tuple(values)
+        return False, None
+
+    def value(self, node: ast.AST) -> Predicate:
+        """
+        :param node: Field path or constant
+        :return: Function of the event returning the value
+        """
+        path = self.field_path(node)
+        if path:
+            self.paths[path] = None
+            return _getter(path)
+        is_constant, value = self.constant(node)
+        if is_constant:
+            return lambda event: value
+        raise ExpressionError(f"Expected a field or a constant: {ast.unparse(node)}")
+
+    def compile(self, node: ast.AST) -> Predicate:
+        """
+        :param node:
+        :return: Function of the event returning a truthy value if the node matches
+        """
+        if isinstance(node, ast.BoolOp):
+            return self.bool_op(node)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = self.compile(node.operand)
+            return lambda event: not operand(event)
+        if isinstance(node, ast.Compare):
+            comparisons = [
+                self.compare(left, op, right)
+                for left, op, right in zip([node.left, *node.comparators], node.ops, node.comparators, strict=False)
+            ]
+            return self.all_of(comparisons)
+        if self.field_path(node) or self.constant(node)[0]:
+            return self.value(node)
+        raise ExpressionError(f"Unsupported expression: {ast.unparse(node)}")
+
+    def bool_op(self, node: ast.BoolOp) -> Predicate:
+        """
+        :param node: 'and' or 'or' of two or more operands
+        :return:
+        """
+        operands = [self.compile(value) for value in node.values]
+        if isinstance(node.op, ast.And):
+            return self.all_of(operands)
+        if len(operands) == 2:
+            first, second = operands
+            return lambda event: first(event) or second(event)
+        return lambda event: any(operand(event) for operand in operands)
+
+    @staticmethod
+    def all_of(operands: list[Predicate]) -> Predicate:
+        """
+        :param operands:
+        :return: Short-circuit 'and' of the operands
+        """
+        if len(operands) == 1:
+            return operands[0]
+        if len(operands) == 2:
+            first, second = operands
+            return lambda event: first(event) and second(event)
+        if len(operands) == 3:
+            first, second, third = operands
+            return lambda event: first(event) and second(event) and third(event)
+        return lambda event: all(operand(event) for operand in operands)
+
+    def compare(self, left: ast.AST, op: ast.cmpop, right: ast.AST) -> Predicate:
+        """
+        :param left:
+        :param op:
+        :param right:
+        :return: Comparison, specialized when the right side is a constant
+        """
+        if type(op) not in COMPARISONS:
+            raise ExpressionError(f"Unsupported comparison: {type(op).__name__}, use ==, !=, <, <=, >, >=, in or not in")
+        is_constant, constant = self.constant(right)
+        left_path = self.field_path(left)
+        if is_constant and left_path:
+            self.paths[left_path] = None
+            get = _getter(left_path)
+            if isinstance(op, ast.Eq):
+                return lambda event: get(event) == constant
+            if isinstance(op, ast.NotEq):
+                return lambda event: get(event) != constant
+            if isinstance(op, ast.In | ast.NotIn):
+                if not isinstance(constant, frozenset | tuple | str):
+                    raise ExpressionError(f"'in' needs a collection or a string: {ast.unparse(right)}")
+                negate = isinstance(op, ast.NotIn)
+
+                def contains(event: dict[str, Any]) -> bool:
+                    try:
+                        return (get(event) in constant) != negate
+                    except TypeError:
+                        return negate
+
+                return contains
+            ordering = ORDERINGS[type(op)]
+
+            def compare_constant(event: dict[str, Any]) -> bool:
+                try:
+                    return ordering(get(event), constant)
+                except TypeError:
+                    return False
+
+            return compare_constant
+        left_value = self.value(left)
+        right_value = self.value(right)
+        comparison = COMPARISONS[type(op)]
+
+        def compare_values(event: dict[str, Any]) -> bool:
+            try:
+                return comparison(left_value(event), right_value(event))
+            except TypeError:
+                return False
+
+        return compare_values
+
+
+def _conjuncts(node: ast.AST) -> list[ast.AST]:
+    """
+    :param node:
+    :return: Terms every matching event must pass, splitting the top level 'and' and chained comparisons
+    """
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+        return [term for value in node.values for term in _conjuncts(value)]
+    if isinstance(node, ast.Compare) and len(node.ops) > 1:
+        operands = [node.left, *node.comparators]
+        return [
+            ast.Compare(left=left, ops=[op], comparators=[right])
+            for left, op, right in zip(operands, node.ops, node.comparators, strict=False)
+        ]
+    return [node]
+
+
+def _needles(terms: list[ast.AST]) -> tuple[bytes, ...]:
+    """
+    Byte substrings present on the raw line of every event matching all the terms.
+    'field == "text"' gives '"field":"text"', as long as the text can't be escaped differently on the JSON line.
+    Any other comparison that a missing field can't pass gives the key alone, '"field":'.
+    :param terms:
+    :return: Most selective needles first
+    """
+    values: dict[bytes, None] = {}
+    keys: dict[str, None] = {}
+    for term in terms:
+        if not (isinstance(term, ast.Compare) and len(term.ops) == 1):
+            continue
+        op = term.ops[0]
+        left, right = term.left, term.comparators[0]
+        if isinstance(op, ast.Eq) and not _Compiler.field_path(left):
+            left, right = right, left
+        path = _Compiler.field_path(left)
+        is_constant, constant = _Compiler.constant(right)
+        if not path or not is_constant or not SAFE_NEEDLE_TEXT.fullmatch(path[-1]):
+            continue
+        key = path[-1]
+        if isinstance(op, ast.Eq) and isinstance(constant, str) and SAFE_NEEDLE_TEXT.fullmatch(constant):
+            values[f'"{key}":"{constant}"'.encode()] = None
+        elif (
+                isinstance(op, ast.Eq) and constant is not None or
+                isinstance(op, ast.NotEq) and constant is None or
+                type(op) in ORDERINGS or
+                isinstance(op, ast.In) and isinstance(constant, frozenset | tuple) and None not in constant
+        ):
+            keys[key] = None
+    covered = {needle.split(b'":', 1)[0][1:].decode() for needle in values}
+    return (*values, *(f'"{key}":'.encode() for key in keys if key not in covered))
+
+
+def _event_types(terms: list[ast.AST]) -> tuple[str, ...] | None:
+    """
+    :param terms:
+    :return: The only event types the terms accept, None if any
+    """
+    event_types = None
+    for term in terms:
+        if not (isinstance(term, ast.Compare) and len(term.ops) == 1):
+            continue
+        op = term.ops[0]
+        left, right = term.left, term.comparators[0]
+        if isinstance(op, ast.Eq) and _Compiler.field_path(right) == ('event_type',):
+            left, right = right, left
+        if _Compiler.field_path(left) != ('event_type',):
+            continue
+        is_constant, constant = _Compiler.constant(right)
+        if not is_constant:
+            continue
+        if isinstance(op, ast.Eq):
+            accepted = {constant}
+        elif isinstance(op, ast.In) and isinstance(constant, frozenset | tuple):
+            accepted = set(constant)
+        else:
+            continue
+        accepted = {event_type for event_type in accepted if isinstance(event_type, str)}
+        event_types = accepted if event_types is None else event_types & accepted
+    return tuple(sorted(event_types)) if event_types is not None else None
+
+
+def compile_expression(expression: str) -> CompiledExpression:
+    """
+    Parse and compile a filter expression
+    :param expression: See the module documentation for the syntax
+    :return:
+    :raise ExpressionError: The expression is not valid
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval').body
+    except SyntaxError as se:
+        raise ExpressionError(f"Invalid expression '{expression}': {se.msg}") from se
+    compiler = _Compiler()
+    predicate = compiler.compile(tree)
+    terms = _conjuncts(tree)
+    return CompiledExpression(
+        predicate=predicate,
+        needles=_needles(terms),
+        fields=tuple('.'.join(path) for path in compiler.paths),
+        event_types=_event_types(terms)
+    )
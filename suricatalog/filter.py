@@ -1,18 +1,57 @@
 """
 Common filtering logic
 """
+import dataclasses
+import time
 from abc import ABC, abstractmethod
+from collections.abc import Iterable
 from datetime import datetime
 from typing import Any
 
-from suricatalog.time import DEFAULT_TIMESTAMP_10M_AGO, parse_timestamp, to_utc
+from suricatalog.domains import DEFAULT_DOMAIN_FIELDS, DomainSet
+from suricatalog.expression import CompiledExpression, compile_expression
+from suricatalog.ioc import DEFAULT_IOC_FIELDS, IocMatcher, field_value
+from suricatalog.ipset import IpSet
+from suricatalog.time import DEFAULT_TIMESTAMP_10M_AGO, TimestampBound
+
+DEFAULT_REORDER_EVERY = 16
+PROBE_SIZE = 64
+MIN_RATE = 1e-6
 
 
 class BaseFilter(ABC):
     """
     Abstract filter
+
+    Subclasses can declare byte 'needles': substrings that must all be present on the raw JSON line
+    for the event to have any chance of being accepted. The reader checks them before parsing the line,
+    so they must never reject an event that accept() would take. Write them as compact JSON, like
+    Suricata does (b'"event_type":"alert"'), the reader also matches them with a space after the ':'.
+
+    Subclasses can also declare the dotted 'fields' paths accept() reads (like 'dns.rcode'). When events
+    get projected to a few fields, these are kept too, so a projected event is still accepted. None means
+    the filter may look at any field, and disables projection.
+
+    Finally, 'event_types' lists the only event types accept() may take, None if it takes any type.
+    The columnar cache uses it to skip whole partitions.
+
+    The reader filters events in batches with accept_batch(), which calls accept() on each event. Subclasses
+    can override it when a whole list can be checked faster than one event at a time.
     """
 
+    needles: tuple[bytes, ...] = ()
+    fields: tuple[str, ...] | None = None
+    event_types: tuple[str, ...] | None = None
+
+    @property
+    def min_timestamp(self) -> datetime | None:
+        """
+        Events with a timestamp older or equal than this one are never accepted.
+        The reader uses it to skip the beginning of time ordered eve files.
+        :return: None if the filter accepts events of any age
+        """
+        return None
+
     @abstractmethod
     def accept(self, data: dict[Any, Any]) -> bool:
         """
@@ -22,12 +61,23 @@ class BaseFilter(ABC):
         """
         raise NotImplementedError()
 
+    def accept_batch(self, events: list[dict[Any, Any]]) -> list[dict[Any, Any]]:
+        """
+        Filter a batch of events
+        :param events:
+        :return: The accepted events, in the same order. May be the same list if all of them were accepted
+        """
+        accept = self.accept
+        return [data for data in events if accept(data)]
+
 
 class AlwaysTrueFilter(BaseFilter):
     """
     This filter is always true
     """
 
+    fields = ()
+
     def accept(self, data: dict[Any, Any]) -> bool:
         """
         Always true implementation
@@ -36,17 +86,448 @@ class AlwaysTrueFilter(BaseFilter):
         """
         return True
 
+    def accept_batch(self, events: list[dict[Any, Any]]) -> list[dict[Any, Any]]:
+        """
+        Every event is accepted
+        :param events:
+        :return:
+        """
+        return events
+
+
+class EventTypeFilter(BaseFilter):
+    """
+    Accept only the events of some types, on top of another filter
+    """
+
+    def __init__(self, data_filter: BaseFilter, event_types: Iterable[str]):
+        """
+        :param data_filter: Filter applied after the event type check
+        :param event_types: Accepted event types
+        """
+        self.data_filter = data_filter
+        if data_filter.event_types is not None:
+            event_types = [event_type for event_type in event_types if event_type in data_filter.event_types]
+        self.event_types = tuple(event_types)
+        self.needles = data_filter.needles
+        if len(self.event_types) == 1:
+            needle = f'"event_type":"{self.event_types[0]}"'.encode()
+            if needle not in self.needles:
+                self.needles += (needle,)
+        self.fields = data_filter.fields
+        if self.fields is not None and 'event_type' not in self.fields:
+            self.fields += ('event_type',)
+
+    @property
+    def min_timestamp(self) -> datetime | None:
+        """
+        Same as the wrapped filter
+        :return:
+        """
+        return self.data_filter.min_timestamp
+
+    def accept(self, data: dict[Any, Any]) -> bool:
+        """
+        Check the event type, then the wrapped filter
+        :param data:
+        :return:
+        """
+        return data.get('event_type') in self.event_types and self.data_filter.accept(data)
+
+    def accept_batch(self, events: list[dict[Any, Any]]) -> list[dict[Any, Any]]:
+        """
+        Check the event types of the whole batch, then hand the survivors to the wrapped filter
+        :param events:
+        :return:
+        """
+        event_types = self.event_types
+        return self.data_filter.accept_batch([data for data in events if data.get('event_type') in event_types])
+
+
+class ExpressionFilter(BaseFilter):
+    """
+    Accept the events matching an expression, like 'event_type == "alert" and alert.severity <= 2'.
+    See suricatalog.expression for the syntax. Optionally on top of another filter
+    """
+
+    def __init__(self, expression: str, data_filter: BaseFilter | None = None, compiled: CompiledExpression | None = None):
+        """
+        :param expression: Compiled once, here, unless it is passed already compiled
+        :param data_filter: Filter applied after the expression
+        :param compiled: The expression, already compiled with compile_expression(), to wrap many filters with it
+        :raise ExpressionError: The expression is not valid
+        """
+        if compiled is None:
+            compiled = compile_expression(expression)
+        self.expression = expression
+        self.data_filter = data_filter if data_filter else AlwaysTrueFilter()
+        self.predicate = compiled.predicate
+        self.needles = compiled.needles + tuple(
+            needle for needle in self.data_filter.needles if needle not in compiled.needles
+        )
+        self.fields = None
+        if self.data_filter.fields is not None:
+            self.fields = compiled.fields + tuple(
+                field for field in self.data_filter.fields if field not in compiled.fields
+            )
+        self.event_types = compiled.event_types
+        if self.data_filter.event_types is not None:
+            self.event_types = tuple(
+                event_type for event_type in self.data_filter.event_types
+                if self.event_types is None or event_type in self.event_types
+            )
+
+    def __str__(self) -> str:
+        return self.expression
+
+    def __getstate__(self) -> dict[str, Any]:
+        """
+        The compiled predicate is made of closures that can't be pickled, for the worker processes.
+        Drop it, the expression is compiled again on the other side
+        :return:
+        """
+        state = self.__dict__.copy()
+        del state['predicate']
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """
+        Restore the filter and compile the expression again
+        :param state:
+        :return:
+        """
+        self.__dict__.update(state)
+        self.predicate = compile_expression(self.expression).predicate
+
+    @property
+    def min_timestamp(self) -> datetime | None:
+        """
+        Same as the wrapped filter
+        :return:
+        """
+        return self.data_filter.min_timestamp
+
+    def accept(self, data: dict[Any, Any]) -> bool:
+        """
+        Check the expression, then the wrapped filter
+        :param data:
+        :return:
+        """
+        return bool(self.predicate(data)) and self.data_filter.accept(data)
+
+    def accept_batch(self, events: list[dict[Any, Any]]) -> list[dict[Any, Any]]:
+        """
+        Check the expression on the whole batch, then hand the survivors to the wrapped filter
+        :param events:
+        :return:
+        """
+        predicate = self.predicate
+        return self.data_filter.accept_batch([data for data in events if predicate(data)])
+
+
+@dataclasses.dataclass
+class FilterStats:
+    """
+    How a filter inside a combinator did on the recent samples: events checked, events accepted and time spent
+    """
+    seen: float = 0.0
+    passed: float = 0.0
+    seconds: float = 0.0
+
+    @property
+    def pass_rate(self) -> float:
+        """
+        :return: Fraction of the checked events that were accepted, 0 before checking any
+        """
+        return self.passed / self.seen if self.seen else 0.0
+
+    @property
+    def cost(self) -> float:
+        """
+        :return: Seconds per checked event, 0 before checking any
+        """
+        return self.seconds / self.seen if self.seen else 0.0
+
+    def decay(self) -> None:
+        """
+        Halve the history, so the statistics follow changes on the traffic
+        :return:
+        """
+        self.seen /= 2
+        self.passed /= 2
+        self.seconds /= 2
+
+
+class CompositeFilter(BaseFilter, ABC):
+    """
+    Combination of other filters that learns in which order to run them.
+    Every reorder_every batches, each filter runs on the same sample of up to PROBE_SIZE events of the batch,
+    measuring how many it accepts and how long it takes. Sampling all of them on the same events, instead of
+    timing each filter on what the previous ones left, keeps a filter from looking useless just because it runs
+    after a very selective one. The filters are then sorted by rank(), so the cheapest filter most likely to settle
+    the result runs first. accept() uses the order learned by accept_batch().
+    """
+
+    def __init__(self, *filters: BaseFilter, reorder_every: int = DEFAULT_REORDER_EVERY):
+        """
+        :param filters: Initial order
+        :param reorder_every: Number of batches between samples
+        """
+        if not filters:
+            raise ValueError(f"{type(self).__name__} needs at least one filter")
+        if reorder_every < 1:
+            raise ValueError(f"Invalid reorder interval: {reorder_every}")
+        self.children: list[tuple[BaseFilter, FilterStats]] = [(data_filter, FilterStats()) for data_filter in filters]
+        self.reorder_every = reorder_every
+        self.batches = 0
+        self.reorders = 0
+
+    @property
+    def filters(self) -> list[BaseFilter]:
+        """
+        :return: Filters, in their current order
+        """
+        return [data_filter for data_filter, _ in self.children]
+
+    @staticmethod
+    @abstractmethod
+    def rank(stats: FilterStats) -> float:
+        """
+        :param stats:
+        :return: Filters with a lower rank run first
+        """
+        raise NotImplementedError()
+
+    def __probe__(self, events: list[dict[Any, Any]]) -> None:
+        """
+        Count a batch. When it is time, measure all the filters on a sample of it and reorder them
+        :param events:
+        :return:
+        """
+        self.batches += 1
+        if (self.batches - 1) % self.reorder_every or not events:
+            return
+        sample = events[::max(1, len(events) // PROBE_SIZE)][:PROBE_SIZE]
+        for data_filter, stats in self.children:
+            stats.decay()
+            start = time.perf_counter()
+            accepted = data_filter.accept_batch(sample)
+            stats.seconds += time.perf_counter() - start
+            stats.seen += len(sample)
+            stats.passed += len(accepted)
+        ranked = sorted(self.children, key=lambda child: self.rank(child[1]))
+        if ranked != self.children:
+            self.children = ranked
+            self.reorders += 1
+
+    def stats_report(self, indent: int = 0) -> str:
+        """
+        Statistics of the filters, in their current order, nested combinators included
+        :param indent:
+        :return:
+        """
+        padding = ' ' * indent
+        lines = [f"{padding}{type(self).__name__}: {self.batches} batches, {self.reorders} reorders"]
+        for data_filter, stats in self.children:
+            lines.append(
+                f"{padding}  - {type(data_filter).__name__}: accepted {stats.pass_rate:.1%} of the samples, "
+                f"{stats.cost * 1e9:.0f} ns per event"
+            )
+            if isinstance(data_filter, CompositeFilter):
+                lines.append(data_filter.stats_report(indent + 4))
+        return '\n'.join(lines)
+
+
+class AndFilter(CompositeFilter):
+    """
+    Accept the events accepted by all the filters.
+    Cheap filters that reject most events run first: lowest cost / rejection rate.
+    """
+
+    def __init__(self, *filters: BaseFilter, reorder_every: int = DEFAULT_REORDER_EVERY):
+        """
+        :param filters:
+        :param reorder_every: Number of batches between samples
+        """
+        super().__init__(*filters, reorder_every=reorder_every)
+        needles: dict[bytes, None] = {}
+        for data_filter in filters:
+            needles.update(dict.fromkeys(data_filter.needles))
+        self.needles = tuple(needles)
+        if any(data_filter.fields is None for data_filter in filters):
+            self.fields = None
+        else:
+            self.fields = tuple(dict.fromkeys(field for data_filter in filters for field in data_filter.fields))
+        self.event_types = None
+        for data_filter in filters:
+            if data_filter.event_types is not None:
+                self.event_types = tuple(
+                    event_type for event_type in data_filter.event_types
+                    if self.event_types is None or event_type in self.event_types
+                )
+
+    @staticmethod
+    def rank(stats: FilterStats) -> float:
+        """
+        :param stats:
+        :return: Cost per rejected event
+        """
+        return stats.cost / max(1.0 - stats.pass_rate, MIN_RATE)
+
+    @property
+    def min_timestamp(self) -> datetime | None:
+        """
+        The newest of the filters
+        :return:
+        """
+        timestamps = [data_filter.min_timestamp for data_filter in self.filters if data_filter.min_timestamp]
+        return max(timestamps) if timestamps else None
+
+    def accept(self, data: dict[Any, Any]) -> bool:
+        """
+        :param data:
+        :return:
+        """
+        return all(data_filter.accept(data) for data_filter, _ in self.children)
+
+    def accept_batch(self, events: list[dict[Any, Any]]) -> list[dict[Any, Any]]:
+        """
+        Each filter only gets the events accepted by the previous ones
+        :param events:
+        :return:
+        """
+        self.__probe__(events)
+        for data_filter, _ in self.children:
+            if not events:
+                break
+            events = data_filter.accept_batch(events)
+        return events
+
+
+class OrFilter(CompositeFilter):
+    """
+    Accept the events accepted by any of the filters.
+    Cheap filters that accept most events run first: lowest cost / acceptance rate.
+    """
+
+    def __init__(self, *filters: BaseFilter, reorder_every: int = DEFAULT_REORDER_EVERY):
+        """
+        :param filters:
+        :param reorder_every: Number of batches between samples
+        """
+        super().__init__(*filters, reorder_every=reorder_every)
+        self.needles = tuple(
+            needle for needle in filters[0].needles if all(needle in data_filter.needles for data_filter in filters)
+        )
+        if any(data_filter.fields is None for data_filter in filters):
+            self.fields = None
+        else:
+            self.fields = tuple(dict.fromkeys(field for data_filter in filters for field in data_filter.fields))
+        if any(data_filter.event_types is None for data_filter in filters):
+            self.event_types = None
+        else:
+            self.event_types = tuple(
+                dict.fromkeys(event_type for data_filter in filters for event_type in data_filter.event_types)
+            )
+
+    @staticmethod
+    def rank(stats: FilterStats) -> float:
+        """
+        :param stats:
+        :return: Cost per accepted event
+        """
+        return stats.cost / max(stats.pass_rate, MIN_RATE)
+
+    @property
+    def min_timestamp(self) -> datetime | None:
+        """
+        The oldest of the filters, None if any of them takes events of any age
+        :return:
+        """
+        timestamps = [data_filter.min_timestamp for data_filter in self.filters]
+        return None if None in timestamps else min(timestamps)
+
+    def accept(self, data: dict[Any, Any]) -> bool:
+        """
+        :param data:
+        :return:
+        """
+        return any(data_filter.accept(data) for data_filter, _ in self.children)
+
+    def accept_batch(self, events: list[dict[Any, Any]]) -> list[dict[Any, Any]]:
+        """
+        Each filter only gets the events rejected by the previous ones
+        :param events:
+        :return:
+        """
+        self.__probe__(events)
+        accepted: set[int] = set()
+        pending = events
+        for data_filter, _ in self.children:
+            if not pending:
+                break
+            taken = {id(data) for data in data_filter.accept_batch(pending)}
+            if taken:
+                accepted |= taken
+                pending = [data for data in pending if id(data) not in taken]
+        if not pending:
+            return events
+        return [data for data in events if id(data) in accepted]
+
+
+class NotFilter(CompositeFilter):
+    """
+    Accept the events rejected by a filter
+    """
+
+    def __init__(self, data_filter: BaseFilter):
+        """
+        :param data_filter: Negated filter
+        """
+        super().__init__(data_filter)
+        self.fields = data_filter.fields
+
+    @staticmethod
+    def rank(stats: FilterStats) -> float:
+        """
+        Only one filter, nothing to reorder
+        :param stats:
+        :return:
+        """
+        return 0.0
+
+    def accept(self, data: dict[Any, Any]) -> bool:
+        """
+        :param data:
+        :return:
+        """
+        return not self.children[0][0].accept(data)
+
+    def accept_batch(self, events: list[dict[Any, Any]]) -> list[dict[Any, Any]]:
+        """
+        :param events:
+        :return:
+        """
+        self.__probe__(events)
+        taken = {id(data) for data in self.children[0][0].accept_batch(events)}
+        return [data for data in events if id(data) not in taken]
+
 
 class OnlyAlertsFilter(BaseFilter):
     """
     Filter only alerts
     """
 
+    needles = (b'"event_type":"alert"',)
+    fields = ('timestamp', 'event_type')
+    event_types = ('alert',)
+
     def __init__(self):
         """
         Constructor
         """
         self._timestamp = DEFAULT_TIMESTAMP_10M_AGO
+        self._bound = TimestampBound(self._timestamp)
 
     @property
     def timestamp(self):
@@ -65,10 +546,17 @@ class OnlyAlertsFilter(BaseFilter):
         """
         if not timestamp:
             raise ValueError("Missing timestamp")
-        if not self.timestamp.tzinfo:
-            raise ValueError(f"{timestamp} has not TimeZone information")
+        self._bound = TimestampBound(timestamp)
         self._timestamp = timestamp
 
+    @property
+    def min_timestamp(self) -> datetime | None:
+        """
+        Older alerts are filtered out
+        :return:
+        """
+        return self._timestamp
+
     def accept(self, data: dict[Any, Any]) -> bool:
         """
         Filter events based on time and only alerts
@@ -76,8 +564,7 @@ class OnlyAlertsFilter(BaseFilter):
         :return:
         """
         try:
-            event_timestamp = parse_timestamp(data['timestamp'])
-            if event_timestamp <= self._timestamp:
+            if not self._bound.is_newer(data['timestamp']):
                 return False
             return bool('event_type' in data and data['event_type'] == 'alert')
         except ValueError:
@@ -89,6 +576,9 @@ class NXDomainFilter(BaseFilter):
     Filter for DNS code
     """
 
+    needles = (b'"NXDOMAIN"',)
+    fields = ('dns.rcode',)
+
     def accept(self, data: dict[Any, Any]) -> bool:
         """
         tail -f eve.json|jq -c 'select(.dns.rcode=="NXDOMAIN")'
@@ -101,6 +591,10 @@ class WithPrintablePayloadFilter(BaseFilter):
     Show only records with a printable payload
     """
 
+    needles = (b'"event_type":"alert"', b'"payload')
+    fields = ('event_type', 'payload', 'payload_printable')
+    event_types = ('alert',)
+
     def accept(self, data: dict[Any, Any]) -> bool:
         """
         cat ~/SuricataLog/test/eve.json | jq -r -c 'select(.event_type=="alert")|.payload'|base64 --decode
@@ -121,8 +615,11 @@ class TimestampFilter(BaseFilter):
     Filter for events based on timestamp
     """
 
+    fields = ('timestamp',)
+
     def __init__(self):
         self._timestamp = DEFAULT_TIMESTAMP_10M_AGO
+        self._bound = TimestampBound(self._timestamp)
 
     @property
     def timestamp(self):
@@ -139,10 +636,17 @@ class TimestampFilter(BaseFilter):
         """
         if not timestamp:
             raise ValueError("Missing timestamp")
-        if not timestamp.tzinfo:
-            raise ValueError(f"{timestamp} has not TimeZone information")
+        self._bound = TimestampBound(timestamp)
         self._timestamp = timestamp
 
+    @property
+    def min_timestamp(self) -> datetime | None:
+        """
+        Older events are filtered out
+        :return:
+        """
+        return self._timestamp
+
     def accept(self, data: dict[Any, Any]) -> bool:
         """
         Filter events on a given timestamp
@@ -150,17 +654,9 @@ class TimestampFilter(BaseFilter):
         :return:
         """
         try:
-            event_timestamp = parse_timestamp(data['timestamp'])
-            if not event_timestamp.tzinfo:
-                event_timestamp = to_utc(event_timestamp)
-            if event_timestamp <= self._timestamp:
-                return False
-        except TypeError as te:
-            if not self._timestamp.tzinfo:
-                raise TypeError(f"today timestamp={self._timestamp} has not TimeZone information.") from te
+            return self._bound.is_newer(data['timestamp'])
         except ValueError:
             return False
-        return True
 
 
 class WithPayloadFilter(BaseFilter):
@@ -168,6 +664,10 @@ class WithPayloadFilter(BaseFilter):
     Filter records with any payload
     """
 
+    needles = (b'"event_type":"alert"', b'"payload"')
+    fields = ('event_type', 'payload')
+    event_types = ('alert',)
+
     def accept(self, data: dict[Any, Any]) -> bool:
         """
         cat ~/SuricataLog/test/eve.json | jq -r -c 'select(.event_type=="alert")|.payload'|base64 --decode
@@ -180,3 +680,95 @@ class WithPayloadFilter(BaseFilter):
             if payload:
                 return True
         return False
+
+
+class IpSetFilter(BaseFilter):
+    """
+    Accept the events with an address inside a set of networks, like a blocklist
+    """
+
+    def __init__(self, networks: IpSet | Iterable[str], ip_fields: Iterable[str] = ('src_ip', 'dest_ip')):
+        """
+        :param networks: IpSet, or CIDRs and addresses to build one
+        :param ip_fields: Top level fields checked, an event is accepted if any of them is in the set
+        :raise ValueError: One of the networks is not valid
+        """
+        self.networks = networks if isinstance(networks, IpSet) else IpSet(networks)
+        self.ip_fields = tuple(ip_fields)
+        self.fields = self.ip_fields
+
+    def __str__(self) -> str:
+        return f"{' or '.join(self.ip_fields)} in {self.networks}"
+
+    def accept(self, data: dict[Any, Any]) -> bool:
+        """
+        :param data:
+        :return:
+        """
+        networks = self.networks
+        return any(data.get(field) in networks for field in self.ip_fields)
+
+    def accept_batch(self, events: list[dict[Any, Any]]) -> list[dict[Any, Any]]:
+        """
+        Same as accept(), specialized for the usual pair of fields
+        :param events:
+        :return:
+        """
+        if len(self.ip_fields) != 2:
+            return super().accept_batch(events)
+        networks = self.networks
+        first, second = self.ip_fields
+        return [data for data in events if data.get(first) in networks or data.get(second) in networks]
+
+
+class IocFilter(BaseFilter):
+    """
+    Accept the events with an indicator of compromise on any of the text fields, see suricatalog.ioc
+    """
+
+    def __init__(self, matcher: IocMatcher | Iterable[str], ioc_fields: Iterable[str] = DEFAULT_IOC_FIELDS):
+        """
+        :param matcher: IocMatcher, or indicators to build one
+        :param ioc_fields: Dotted paths of the fields searched
+        """
+        self.matcher = matcher if isinstance(matcher, IocMatcher) else IocMatcher(matcher)
+        self.fields = tuple(ioc_fields)
+        self.paths = tuple(tuple(field.split('.')) for field in self.fields)
+
+    def accept(self, data: dict[Any, Any]) -> bool:
+        """
+        :param data:
+        :return:
+        """
+        search = self.matcher.search
+        for path in self.paths:
+            value = field_value(data, path)
+            if value.__class__ is str and search(value.lower()):
+                return True
+        return False
+
+
+class DomainFilter(BaseFilter):
+    """
+    Accept the events with a host name on a set of domains, or under any of them, like a blocklist
+    """
+
+    def __init__(self, domains: DomainSet | Iterable[str], domain_fields: Iterable[str] = DEFAULT_DOMAIN_FIELDS):
+        """
+        :param domains: DomainSet, or domains to build one
+        :param domain_fields: Dotted paths of the fields with host names
+        """
+        self.domains = domains if isinstance(domains, DomainSet) else DomainSet(domains)
+        self.fields = tuple(domain_fields)
+        self.paths = tuple(tuple(field.split('.')) for field in self.fields)
+
+    def __str__(self) -> str:
+        return f"{' or '.join(self.fields)} under {self.domains}"
+
+    def accept(self, data: dict[Any, Any]) -> bool:
+        """
+        :param data:
+        :return:
+        """
+        domains = self.domains
+        return any(field_value(data, path) in domains for path in self.paths)
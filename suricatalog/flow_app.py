@@ -11,9 +11,10 @@ from textual.driver import Driver
 from textual.widgets import DataTable, Footer, Header
 from textual.worker import get_current_worker
 
+from suricatalog.checkpoint import Checkpoint
 from suricatalog.clipboard import copy_from_table
 from suricatalog.filter import BaseFilter
-from suricatalog.log import EveLogHandler
+from suricatalog.log import EveLogHandler, notify_malformed
 from suricatalog.report import AggregatedFlowProtoReport
 
 
@@ -34,7 +35,9 @@ class FlowApp(App):
             css_path: CSSPathType | None = None,
             watch_css: bool = False,
             data_filter: BaseFilter = None,
-            eve: list[Path] = None
+            eve: list[Path] = None,
+            eve_lh: EveLogHandler = None,
+            checkpoint: Checkpoint = None
     ):
         """
         Constructor
@@ -43,10 +46,14 @@ class FlowApp(App):
         :param watch_css:
         :param data_filter:
         :param eve:
+        :param eve_lh: Reader for the eve files, a default one is used if missing
+        :param checkpoint: If set, resume the report from it and only read new data. Saved once done
         """
         super().__init__(driver_class, css_path, watch_css)
         self.data_filter = data_filter
         self.eve = eve
+        self.eve_lh = eve_lh if eve_lh else EveLogHandler()
+        self.checkpoint = checkpoint
 
     def action_quit_app(self) -> None:
         """
@@ -111,22 +118,26 @@ class FlowApp(App):
         :return:
         """
         alerts_tbl = self.query_one(DataTable)
-        afr = AggregatedFlowProtoReport()
-        eve_lh = EveLogHandler()
-        cnt = 0
-        for event in eve_lh.get_events(
-                eve_files=self.eve,
-                data_filter=self.data_filter):
-            if not self.data_filter.accept(event):
-                continue
-            await afr.ingest_data(event)
-            cnt += 1
+        if self.checkpoint and self.checkpoint.state:
+            afr = AggregatedFlowProtoReport.from_state(self.checkpoint.state)
+        else:
+            afr = AggregatedFlowProtoReport()
+        cnt = self.eve_lh.aggregate(
+            afr,
+            eve_files=self.eve,
+            data_filter=self.data_filter,
+            checkpoint=self.checkpoint
+        )
+        if self.checkpoint:
+            self.checkpoint.state = afr.to_state()
+            self.checkpoint.save()
         alerts_tbl.loading = False
         self.notify(
             message=f"Aggregated {cnt} events",
             title="Aggregated events",
             severity="information" if cnt > 0 else "error",
         )
+        notify_malformed(self, self.eve_lh)
         self.update_flow_table(afr=afr)
 
     def sort_reverse(self, sort_type: str):
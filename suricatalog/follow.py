@@ -0,0 +1,173 @@
+"""
+Follow a live eve.json file, like 'tail -F'
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+MIN_POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.5
+# From /usr/include/linux/inotify.h
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+class FileWatcher:
+    """
+    Wait for changes on the directory of a file. Uses inotify when available (Linux),
+    otherwise polls with an interval that grows while the file is idle.
+    """
+
+    def __init__(self, eve_file: Path | str, use_inotify: bool = True):
+        """
+        :param eve_file: File to watch, its parent directory is watched to catch rotations
+        :param use_inotify: Set to False to always poll
+        """
+        self.interval = MIN_POLL_INTERVAL
+        self.inotify_fd = -1
+        if use_inotify:
+            self.inotify_fd = FileWatcher.__inotify_watch__(Path(eve_file).resolve().parent)
+
+    @staticmethod
+    def __inotify_watch__(directory: Path) -> int:
+        """
+        Watch a directory with inotify
+        :param directory:
+        :return: inotify file descriptor, -1 if inotify is not available
+        """
+        library = ctypes.util.find_library('c')
+        if not library:
+            return -1
+        try:
+            libc = ctypes.CDLL(library, use_errno=True)
+            inotify_fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return -1
+        if inotify_fd < 0:
+            return -1
+        if libc.inotify_add_watch(inotify_fd, os.fsencode(directory), IN_WATCH_MASK) < 0:
+            os.close(inotify_fd)
+            return -1
+        return inotify_fd
+
+    def reset(self) -> None:
+        """
+        New data arrived, poll again quickly
+        :return:
+        """
+        self.interval = MIN_POLL_INTERVAL
+
+    def wait(self) -> None:
+        """
+        Block until the directory changes or the poll interval expires.
+        Never waits more than MAX_POLL_INTERVAL, so callers can check if they must stop.
+        :return:
+        """
+        if self.inotify_fd >= 0:
+            readable, _, _ = select.select([self.inotify_fd], [], [], MAX_POLL_INTERVAL)
+            if readable:
+                try:
+                    while os.read(self.inotify_fd, 64 * 1024):
+                        pass
+                except BlockingIOError:
+                    pass
+            return
+        select.select([], [], [], self.interval)
+        self.interval = min(self.interval * 2, MAX_POLL_INTERVAL)
+
+    def close(self) -> None:
+        """
+        Release the inotify descriptor
+        :return:
+        """
+        if self.inotify_fd >= 0:
+            os.close(self.inotify_fd)
+            self.inotify_fd = -1
+
+
+def follow_lines(
+        eve_file: Path | str,
+        block_size: int,
+        stop: Callable[[], bool],
+        on_idle: Callable[[], None] | None = None,
+        use_inotify: bool = True,
+        start: int = 0
+) -> Iterator[bytes]:
+    """
+    Yield the lines of an eve file, then keep yielding new lines as they are appended.
+    Survives logrotate: a new inode on the path (rename) is picked up once the old file is drained,
+    and a file shorter than the current offset (copytruncate) is read again from the start.
+    A partially written last line is held back until its newline arrives.
+    :param eve_file:
+    :param block_size: Size in bytes of each read
+    :param stop: Called between reads and waits, following ends when it returns True
+    :param on_idle: Called every time there is no more data to read, before waiting
+    :param use_inotify:
+    :param start: Offset where reading of the first file starts, must be at the beginning of a line
+    :return: Non-empty lines, without the trailing newline
+    """
+    watcher = FileWatcher(eve_file, use_inotify)
+    eve = None
+    try:
+        while not eve and not stop():
+            try:
+                eve = open(eve_file, 'rb')  # noqa: SIM115, closed on the finally block
+            except FileNotFoundError:
+                watcher.wait()
+        if not eve:
+            return
+        identity = os.fstat(eve.fileno())
+        offset = eve.seek(start)
+        remainder = b''
+        while not stop():
+            block = eve.read(block_size)
+            if block:
+                offset += len(block)
+                lines = block.split(b'\n')
+                if remainder:
+                    lines[0] = remainder + lines[0]
+                remainder = lines.pop()
+                yield from filter(None, lines)
+                watcher.reset()
+                continue
+            try:
+                current = os.stat(eve_file)
+            except FileNotFoundError:
+                current = None
+            if current and (current.st_ino, current.st_dev) != (identity.st_ino, identity.st_dev):
+                # Rotated by rename, the old file was fully read above
+                try:
+                    rotated = open(eve_file, 'rb')  # noqa: SIM115, closed on the finally block
+                except FileNotFoundError:
+                    rotated = None
+                if rotated:
+                    if remainder:
+                        yield remainder
+                    eve.close()
+                    eve = rotated
+                    identity = os.fstat(eve.fileno())
+                    offset = 0
+                    remainder = b''
+                    continue
+            if os.fstat(eve.fileno()).st_size < offset:
+                # Rotated with copytruncate
+                eve.seek(0)
+                offset = 0
+                remainder = b''
+                continue
+            if on_idle:
+                on_idle()
+            watcher.wait()
+    finally:
+        if eve:
+            eve.close()
+        watcher.close()
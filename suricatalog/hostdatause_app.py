@@ -11,9 +11,11 @@ from textual.driver import Driver
 from textual.widgets import Digits, Footer, Header
 
 from suricatalog import BASEDIR
+from suricatalog.checkpoint import Checkpoint
 from suricatalog.clipboard import copy_from_digits
 from suricatalog.filter import BaseFilter
-from suricatalog.log import EveLogHandler
+from suricatalog.ipset import IpSet
+from suricatalog.log import EveLogHandler, notify_malformed
 from suricatalog.report import HostDataUseReport
 
 
@@ -33,24 +35,29 @@ class HostDataUse(App):
             driver_class: type[Driver] | None = None,
             css_path: CSSPathType | None = None,
             watch_css: bool = False,
-            ip_address: str = None,
+            ip_address: str | IpSet = None,
             data_filter: BaseFilter = None,
-            eve: list[Path] = None
-
+            eve: list[Path] = None,
+            eve_lh: EveLogHandler = None,
+            checkpoint: Checkpoint = None
     ):
         """
         Constructor
         :param driver_class:
         :param css_path:
         :param watch_css:
-        :param ip_address:
+        :param ip_address: Destination address, or set of networks
         :param data_filter:
         :param eve:
+        :param eve_lh: Reader for the eve files, a default one is used if missing
+        :param checkpoint: If set, resume the report from it and only read new data. Saved once done
         """
         super().__init__(driver_class, css_path, watch_css)
-        self.ip_address = ip_address
+        self.ip_address = IpSet([ip_address]) if isinstance(ip_address, str) else ip_address
         self.data_filter: BaseFilter = data_filter
         self.eve = eve
+        self.eve_lh = eve_lh if eve_lh else EveLogHandler()
+        self.checkpoint = checkpoint
 
     def action_quit_app(self) -> None:
         """
@@ -96,12 +103,21 @@ class HostDataUse(App):
         Initialize TUI components with data
         :return:
         """
-        host_data_user_report = HostDataUseReport()
-        eve_lh = EveLogHandler()
-        for event in eve_lh.get_events(
-                eve_files=self.eve,
-                data_filter=self.data_filter):
-            await host_data_user_report.ingest_data(event, self.ip_address)
+        if self.checkpoint and self.checkpoint.state:
+            host_data_user_report = HostDataUseReport.from_state(self.checkpoint.state)
+        else:
+            host_data_user_report = HostDataUseReport()
+        self.eve_lh.aggregate(
+            host_data_user_report,
+            eve_files=self.eve,
+            data_filter=self.data_filter,
+            checkpoint=self.checkpoint,
+            dest=self.ip_address
+        )
+        if self.checkpoint:
+            self.checkpoint.state = host_data_user_report.to_state()
+            self.checkpoint.save()
         digits = self.query_one('#netflow', Digits)
         digits.update(f"{host_data_user_report.bytes:n} bytes")
         digits.loading = False
+        notify_malformed(self, self.eve_lh)
@@ -0,0 +1,281 @@
+"""
+SQLite index of eve events, so queries over archived logs don't scan every file.
+
+Each event is stored as its raw JSON line, next to the columns most investigations search by
+(timestamp, event type, source and destination IP, flow id and alert signature id), all of them indexed.
+Files are loaded incrementally: a file that grew only gets its new lines added.
+"""
+import contextlib
+import logging
+import os
+import sqlite3
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+from suricatalog import DEFAULT_LOG_DIR
+from suricatalog.checkpoint import HEAD_SIZE, head_hash, last_newline_offset
+from suricatalog.filter import BaseFilter
+from suricatalog.log import (
+    MalformedLines,
+    detect_compression,
+    loads_line,
+    project,
+    read_lines,
+)
+from suricatalog.time import timestamp_micros
+
+DEFAULT_INDEX_FILE = DEFAULT_LOG_DIR / "suricatalog-index.db"
+INSERT_BATCH_SIZE = 10_000
+INT64_MAX = 2 ** 63 - 1
+SEARCH_COLUMNS = ('event_type', 'src_ip', 'dest_ip', 'flow_id', 'signature_id')
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    identity TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    head TEXT NOT NULL,
+    head_size INTEGER NOT NULL,
+    offset INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    epoch REAL,
+    event_type TEXT,
+    src_ip TEXT,
+    dest_ip TEXT,
+    flow_id INTEGER,
+    signature_id INTEGER,
+    raw BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_file_id ON events(file_id);
+CREATE INDEX IF NOT EXISTS events_epoch ON events(epoch);
+CREATE INDEX IF NOT EXISTS events_event_type ON events(event_type, epoch);
+CREATE INDEX IF NOT EXISTS events_src_ip ON events(src_ip);
+CREATE INDEX IF NOT EXISTS events_dest_ip ON events(dest_ip);
+CREATE INDEX IF NOT EXISTS events_flow_id ON events(flow_id);
+CREATE INDEX IF NOT EXISTS events_signature_id ON events(signature_id);
+"""
+
+
+def _event_row(file_id: int, event: dict[str, Any], raw: bytes) -> tuple[Any, ...]:
+    """
+    Extract the indexed columns of an event
+    :param file_id:
+    :param event:
+    :param raw: JSON line of the event
+    :return:
+    """
+    try:
+        epoch = timestamp_micros(event['timestamp']) / 1_000_000
+    except (KeyError, ValueError, TypeError, AttributeError):
+        epoch = None
+    flow_id = event.get('flow_id')
+    if not isinstance(flow_id, int) or abs(flow_id) > INT64_MAX:
+        flow_id = None
+    alert = event.get('alert')
+    signature_id = alert.get('signature_id') if isinstance(alert, dict) else None
+    if not isinstance(signature_id, int) or abs(signature_id) > INT64_MAX:
+        signature_id = None
+    return (
+        file_id,
+        epoch,
+        event.get('event_type'),
+        event.get('src_ip'),
+        event.get('dest_ip'),
+        flow_id,
+        signature_id,
+        raw
+    )
+
+
+class EveIndex:
+    """
+    SQLite database, in WAL mode, with the events of one or more eve files
+    """
+
+    def __init__(self, index_file: Path | str = DEFAULT_INDEX_FILE):
+        """
+        :param index_file: Created on first use
+        """
+        self.index_file = Path(index_file)
+
+    @contextlib.contextmanager
+    def __connect__(self) -> Iterator[sqlite3.Connection]:
+        """
+        Open the database, creating the schema if needed. Connections are not shared, so the index can be used
+        from any thread
+        :return:
+        """
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.index_file, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            yield conn
+        finally:
+            conn.close()
+
+    def update(self, eve_file: Path | str, malformed: MalformedLines | None = None) -> int:
+        """
+        Add the events of a file that are not on the index yet. A file that was replaced (different first
+        bytes, or smaller) is loaded again from the start. Compressed files are loaded once.
+        :param eve_file:
+        :param malformed: Counts the lines that are not valid JSON. If missing, they are summarized at the end
+        :return: Number of events added
+        """
+        if malformed is None:
+            malformed = MalformedLines(logging.getLogger(__name__))
+            try:
+                return self.update(eve_file, malformed)
+            finally:
+                malformed.summary()
+        stat = os.stat(eve_file)
+        identity = f"{stat.st_dev}:{stat.st_ino}"
+        compressed = detect_compression(eve_file) is not None
+        with self.__connect__() as conn, conn:
+            row = conn.execute(
+                "SELECT id, size, mtime_ns, head, head_size, offset FROM files WHERE identity = ?", (identity,)
+            ).fetchone()
+            if row:
+                file_id, size, mtime_ns, head, head_size, offset = row
+                if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+                    return 0
+                if compressed or stat.st_size < size or head_hash(eve_file, head_size) != head:
+                    conn.execute("DELETE FROM events WHERE file_id = ?", (file_id,))
+                    offset = 0
+            else:
+                file_id = conn.execute(
+                    "INSERT INTO files (identity, path, size, mtime_ns, head, head_size, offset) VALUES (?, ?, -1, -1, '', 0, 0)",
+                    (identity, Path(eve_file).as_posix())
+                ).lastrowid
+                offset = 0
+            if compressed:
+                end = stat.st_size
+                lines = read_lines(eve_file)
+            else:
+                end = last_newline_offset(eve_file)
+                lines = read_lines(eve_file, start=offset, end=end)
+            added = 0
+            batch = []
+            for line in lines:
+                try:
+                    event = loads_line(line)
+                except ValueError:
+                    malformed.add(line)
+                    continue
+                if not isinstance(event, dict):
+                    continue
+                batch.append(_event_row(file_id, event, line))
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    added += self.__insert__(conn, batch)
+            added += self.__insert__(conn, batch)
+            head_size = min(stat.st_size, HEAD_SIZE)
+            conn.execute(
+                "UPDATE files SET path = ?, size = ?, mtime_ns = ?, head = ?, head_size = ?, offset = ? WHERE id = ?",
+                (
+                    Path(eve_file).as_posix(),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    head_hash(eve_file, head_size),
+                    head_size,
+                    end,
+                    file_id
+                )
+            )
+        return added
+
+    @staticmethod
+    def __insert__(conn: sqlite3.Connection, batch: list[tuple[Any, ...]]) -> int:
+        """
+        Insert, and empty, a batch of event rows
+        :param conn:
+        :param batch:
+        :return: Number of rows inserted
+        """
+        conn.executemany(
+            "INSERT INTO events (file_id, epoch, event_type, src_ip, dest_ip, flow_id, signature_id, raw) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            batch
+        )
+        added = len(batch)
+        batch.clear()
+        return added
+
+    def get_events(
+            self,
+            eve_file: Path | str,
+            data_filter: BaseFilter,
+            tree: dict[str, Any] | None = None
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Events of an indexed file accepted by the filter, in file order. The event types and minimum timestamp
+        of the filter become indexed conditions, the rest of the filter runs on the matching events.
+        :param eve_file: Must have been loaded with update() first
+        :param data_filter:
+        :param tree: Projection of the events, see suricatalog.log.projection()
+        :return:
+        """
+        stat = os.stat(eve_file)
+        conditions: dict[str, Any] = {}
+        if data_filter.event_types is not None:
+            conditions['event_type'] = data_filter.event_types
+        yield from self.search(
+            identities=[f"{stat.st_dev}:{stat.st_ino}"],
+            data_filter=data_filter,
+            tree=tree,
+            **conditions
+        )
+
+    def search(
+            self,
+            *,
+            identities: Iterable[str] | None = None,
+            data_filter: BaseFilter | None = None,
+            tree: dict[str, Any] | None = None,
+            limit: int | None = None,
+            **conditions: Any
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Query the index
+        :param identities: Only events of these files ('device:inode'), None for all the files
+        :param data_filter: Its minimum timestamp is used on the query, then it must accept the events
+        :param tree: Projection of the events, see suricatalog.log.projection()
+        :param limit: Maximum number of events to return
+        :param conditions: Exact value, or list of values, for any of SEARCH_COLUMNS
+        :return:
+        """
+        clauses = []
+        params: list[Any] = []
+        if identities is not None:
+            identities = list(identities)
+            clauses.append(f"file_id IN (SELECT id FROM files WHERE identity IN ({', '.join('?' * len(identities))}))")
+            params.extend(identities)
+        for column, value in conditions.items():
+            if column not in SEARCH_COLUMNS:
+                raise ValueError(f"Cannot search by {column}, use one of {SEARCH_COLUMNS}")
+            values = list(value) if isinstance(value, list | tuple | set) else [value]
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        min_timestamp = data_filter.min_timestamp if data_filter else None
+        if min_timestamp:
+            clauses.append("epoch >= ?")
+            params.append(min_timestamp.timestamp())
+        query = "SELECT raw FROM events"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id"
+        yielded = 0
+        with self.__connect__() as conn:
+            for (raw,) in conn.execute(query, params):
+                if limit is not None and yielded >= limit:
+                    return
+                event = loads_line(raw)
+                if data_filter and not data_filter.accept(event):
+                    continue
+                yielded += 1
+                yield project(event, tree) if tree is not None else event
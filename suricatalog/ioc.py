@@ -0,0 +1,234 @@
+"""
+Indicators of compromise (domains, URL fragments, user agent tokens) matched against the text fields of the events.
+
+Tens of thousands of indicators are compiled into one Aho-Corasick automaton, so each field is scanned once, one
+character at a time, no matter how many indicators there are. Matching is case-insensitive.
+Transitions that go through failure links are remembered the first time they are taken, so after a warm-up most
+characters cost a single dictionary lookup.
+
+Building the automaton for a large feed takes seconds, from_file() keeps it on a cache directory, as JSON, keyed by the
+SHA-256 of the indicators file. The automaton is millions of small containers with no cycles, the garbage collector is
+paused while they are created.
+"""
+import gc
+import hashlib
+import logging
+import os
+import tempfile
+from collections import deque
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Self
+
+import orjson
+
+from suricatalog import DEFAULT_LOG_DIR, private_directory
+
+DEFAULT_IOC_CACHE_DIR = DEFAULT_LOG_DIR / "suricatalog-cache"
+DEFAULT_IOC_FIELDS = (
+    'payload_printable',
+    'http.hostname',
+    'http.url',
+    'http.http_user_agent',
+    'dns.rrname',
+    'tls.sni',
+)
+AUTOMATON_VERSION = 1
+MAX_REMEMBERED_TRANSITIONS = 256
+
+
+def field_value(event: dict[str, Any], path: tuple[str, ...]) -> Any:
+    """
+    :param event:
+    :param path: Keys, from the top of the event
+    :return: Value of the field, None if it is missing
+    """
+    value: Any = event
+    for key in path:
+        if value.__class__ is not dict:
+            return None
+        value = value.get(key)
+    return value
+
+
+class IocMatcher:
+    """
+    Aho-Corasick automaton over a list of indicators
+    """
+
+    def __init__(self, indicators: Iterable[str]):
+        """
+        :param indicators: Empty ones are skipped, duplicates (ignoring case) kept once
+        """
+        self.indicators: list[str] = list(dict.fromkeys(
+            indicator.strip().lower() for indicator in indicators if indicator.strip()
+        ))
+        self.goto: list[dict[str, int]] = [{}]
+        outputs: list[list[int]] = [[]]
+        for idx, indicator in enumerate(self.indicators):
+            state = 0
+            for char in indicator:
+                following = self.goto[state].get(char)
+                if following is None:
+                    following = self.goto[state][char] = len(self.goto)
+                    self.goto.append({})
+                    outputs.append([])
+                state = following
+            outputs[state].append(idx)
+        self.fail = [0] * len(self.goto)
+        pending = deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, following in self.goto[state].items():
+                pending.append(following)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[following] = target if target != following else 0
+                outputs[following].extend(outputs[self.fail[following]])
+        self.outputs: list[tuple[int, ...]] = [tuple(output) for output in outputs]
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> Self:
+        """
+        Rebuild an automaton saved with to_state(), without compiling the indicators again
+        :param state:
+        :return:
+        """
+        if state.get('version') != AUTOMATON_VERSION:
+            raise ValueError(f"Unsupported automaton version: {state.get('version')}")
+        matcher = cls.__new__(cls)
+        matcher.indicators = state['indicators']
+        matcher.goto = state['goto']
+        matcher.fail = state['fail']
+        matcher.outputs = [tuple(output) for output in state['outputs']]
+        return matcher
+
+    def to_state(self) -> dict[str, Any]:
+        """
+        :return: Serializable automaton
+        """
+        return {
+            'version': AUTOMATON_VERSION,
+            'indicators': self.indicators,
+            'goto': self.goto,
+            'fail': self.fail,
+            'outputs': self.outputs,
+        }
+
+    @classmethod
+    def from_file(
+            cls,
+            indicators_file: Path | str,
+            cache_dir: Path | str | None = DEFAULT_IOC_CACHE_DIR,
+            logger: logging.Logger | None = None
+    ) -> Self:
+        """
+        Read one indicator per line, skipping empty lines and lines starting with '#'
+        :param indicators_file:
+        :param cache_dir: Where compiled automatons are kept between runs, None to always compile
+        :param logger:
+        :return:
+        """
+        logger = logger if logger else logging.getLogger(__name__)
+        content = Path(indicators_file).read_bytes()
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            return cls.__load__(content, cache_dir, logger)
+        finally:
+            if collecting:
+                gc.enable()
+
+    @classmethod
+    def __load__(cls, content: bytes, cache_dir: Path | str | None, logger: logging.Logger) -> Self:
+        """
+        :param content: Indicators file
+        :param cache_dir:
+        :param logger:
+        :return: Cached automaton, compiled and saved if missing
+        """
+        cache_file = None
+        if cache_dir:
+            digest = hashlib.sha256(content + f"v{AUTOMATON_VERSION}".encode()).hexdigest()
+            cache_file = Path(cache_dir) / f"ioc-{digest}.json"
+            try:
+                Path(cache_dir).mkdir(mode=0o700, parents=True, exist_ok=True)
+            except OSError as err:
+                logger.warning("Could not create the cache '%s': %s", cache_dir, err)
+                cache_file = None
+            else:
+                if not private_directory(cache_dir):
+                    logger.warning(
+                        "Not caching the automaton on '%s', it must belong to you and nobody else can write on it",
+                        cache_dir
+                    )
+                    cache_file = None
+        if cache_file:
+            try:
+                return cls.from_state(orjson.loads(cache_file.read_bytes()))
+            except FileNotFoundError:
+                pass
+            except (ValueError, KeyError, TypeError) as err:
+                logger.warning("Ignoring invalid cached automaton '%s': %s", cache_file, err)
+        lines = content.decode('utf-8').splitlines()
+        matcher = cls(line for line in lines if not line.lstrip().startswith('#'))
+        if cache_file:
+            try:
+                with tempfile.NamedTemporaryFile(dir=cache_file.parent, prefix=cache_file.name, delete=False) as tmp:
+                    tmp.write(orjson.dumps(matcher.to_state()))
+                os.replace(tmp.name, cache_file)
+            except OSError as err:
+                logger.warning("Could not cache the automaton on '%s': %s", cache_file, err)
+        return matcher
+
+    def __transition__(self, state: int, char: str) -> int:
+        """
+        Follow the failure links, remembering where they lead to
+        :param state:
+        :param char:
+        :return:
+        """
+        goto = self.goto
+        origin = state
+        while state and char not in goto[state]:
+            state = self.fail[state]
+        following = goto[state].get(char, 0)
+        if len(goto[origin]) < MAX_REMEMBERED_TRANSITIONS:
+            goto[origin][char] = following
+        return following
+
+    def search(self, text: str) -> bool:
+        """
+        :param text: Lower case text
+        :return: True as soon as any indicator is found
+        """
+        goto = self.goto
+        outputs = self.outputs
+        state = 0
+        for char in text:
+            following = goto[state].get(char)
+            state = following if following is not None else self.__transition__(state, char)
+            if outputs[state]:
+                return True
+        return False
+
+    def find(self, text: str) -> set[int]:
+        """
+        :param text: Lower case text
+        :return: Positions on self.indicators of all the indicators found
+        """
+        goto = self.goto
+        outputs = self.outputs
+        found: set[int] = set()
+        state = 0
+        for char in text:
+            following = goto[state].get(char)
+            state = following if following is not None else self.__transition__(state, char)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+    def __len__(self) -> int:
+        return len(self.indicators)
@@ -0,0 +1,138 @@
+"""
+Sets of IPv4 and IPv6 networks, like the CIDR lists of threat feeds and asset inventories.
+
+Networks are compiled into sorted arrays of non overlapping [first, last] integer intervals, one pair of arrays per IP
+version, so checking an address is a binary search (about 20 comparisons for a million networks) instead of a scan
+over ipaddress.ip_network objects. Eve files repeat the same few addresses over and over, parsed addresses are cached.
+"""
+from bisect import bisect_right
+from collections.abc import Iterable
+from functools import lru_cache
+from ipaddress import (
+    IPv4Address,
+    IPv4Network,
+    IPv6Address,
+    IPv6Network,
+    ip_address,
+    ip_network,
+)
+from pathlib import Path
+from typing import Self
+
+ADDRESS_CACHE_SIZE = 64 * 1024
+NETWORK_CACHE_SIZE = 64
+NAME_NETWORKS = 3
+
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def parse_address(candidate: str) -> tuple[int, int] | None:
+    """
+    :param candidate: IPv4 or IPv6 address, like '10.0.0.1'
+    :return: IP version and address as an integer, None if it is not an address
+    """
+    try:
+        address = ip_address(candidate)
+    except ValueError:
+        return None
+    return address.version, int(address)
+
+
+@lru_cache(maxsize=NETWORK_CACHE_SIZE)
+def single_network(network: str) -> 'IpSet':
+    """
+    :param network: Address or CIDR, like '10.0.0.1'
+    :return: Set with only that network, built once for callers that pass the same address on every event
+    :raise ValueError: The network is not valid
+    """
+    return IpSet([network])
+
+
+class IpSet:
+    """
+    Set of networks, see the module documentation
+    """
+
+    def __init__(
+            self,
+            networks: Iterable[str | IPv4Network | IPv6Network | IPv4Address | IPv6Address],
+            name: str | None = None
+    ):
+        """
+        :param networks: CIDRs like '10.0.0.0/8' or '2001:db8::/32', or addresses. Host bits are ignored
+        :param name: Description of the set, defaults to the first networks
+        :raise ValueError: One of the networks is not valid
+        """
+        intervals: dict[int, list[tuple[int, int]]] = {4: [], 6: []}
+        names = []
+        for network in networks:
+            if not isinstance(network, IPv4Network | IPv6Network):
+                try:
+                    network = ip_network(network.strip() if isinstance(network, str) else network, strict=False)
+                except ValueError as ve:
+                    raise ValueError(f"Invalid network: {network}") from ve
+            intervals[network.version].append((int(network.network_address), int(network.broadcast_address)))
+            if len(names) <= NAME_NETWORKS:
+                names.append(str(network))
+        self.firsts: dict[int, list[int]] = {}
+        self.lasts: dict[int, list[int]] = {}
+        for version, pairs in intervals.items():
+            firsts: list[int] = []
+            lasts: list[int] = []
+            for first, last in sorted(pairs):
+                if lasts and first <= lasts[-1] + 1:
+                    lasts[-1] = max(lasts[-1], last)
+                else:
+                    firsts.append(first)
+                    lasts.append(last)
+            self.firsts[version] = firsts
+            self.lasts[version] = lasts
+        if name is None:
+            name = ', '.join(names[:NAME_NETWORKS]) + (', ...' if len(names) > NAME_NETWORKS else '')
+        self.name = name
+
+    @classmethod
+    def from_file(cls, networks_file: Path | str) -> Self:
+        """
+        Read one network per line. Empty lines, and anything after a '#', are skipped
+        :param networks_file:
+        :return:
+        :raise ValueError: One of the networks is not valid
+        """
+        with open(networks_file, encoding='utf-8') as networks:
+            lines = [line.split('#', 1)[0].strip() for line in networks]
+        return cls((line for line in lines if line), name=str(networks_file))
+
+    @classmethod
+    def parse(cls, candidate: str) -> Self:
+        """
+        Networks from a command line argument: a file with one network per line, or comma separated networks
+        :param candidate:
+        :return:
+        :raise ValueError: The file or one of the networks is not valid
+        """
+        if Path(candidate).is_file():
+            return cls.from_file(candidate)
+        return cls(candidate.split(','))
+
+    def __contains__(self, candidate: object) -> bool:
+        """
+        :param candidate: Address, as written on the eve events
+        :return: True if the address belongs to any of the networks. False if it is not an address
+        """
+        if not isinstance(candidate, str):
+            return False
+        parsed = parse_address(candidate)
+        if parsed is None:
+            return False
+        version, address = parsed
+        idx = bisect_right(self.firsts[version], address) - 1
+        return idx >= 0 and address <= self.lasts[version][idx]
+
+    def __len__(self) -> int:
+        """
+        :return: Number of intervals left once overlapping and adjacent networks are merged
+        """
+        return len(self.firsts[4]) + len(self.firsts[6])
+
+    def __str__(self) -> str:
+        return self.name
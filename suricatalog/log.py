@@ -1,16 +1,728 @@
 """
 Eve log file contents logic
 """
+import bz2
+import contextlib
+import gzip
+import heapq
+import io
 import json
 import logging
+import lzma
+import mmap
+import multiprocessing
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
+from datetime import datetime, timedelta
+from itertools import chain, islice
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO
 
 import orjson
 from orjson import JSONDecodeError as OJSONDecodeError
 
-from suricatalog.filter import BaseFilter
+from suricatalog.checkpoint import Checkpoint, last_newline_offset
+from suricatalog.dedup import DEDUP_FIELDS, Deduplicator
+from suricatalog.filter import BaseFilter, CompositeFilter, EventTypeFilter
+from suricatalog.follow import follow_lines
+from suricatalog.stream import (
+    DEFAULT_QUEUE_SIZE,
+    OVERFLOW_POLICIES,
+    UnixStreamReader,
+    is_unix_source,
+    unix_socket_path,
+)
+from suricatalog.time import timestamp_micros
+
+if TYPE_CHECKING:
+    from textual.app import App
+
+    from suricatalog.cache import EveCache
+    from suricatalog.index import EveIndex
 
 DEFAULT_EVE_JSON = [Path("/var/log/suricata/eve.json")]
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+DEFAULT_RANGE_SIZE = 32 * 1024 * 1024
+DEFAULT_BATCH_SIZE = 1024
+DECOMPRESS_QUEUE_DEPTH = 4
+DEFAULT_SEEK_SLACK = timedelta(minutes=1)
+SEEK_WINDOW = 64 * 1024
+MISSING_TIMESTAMP_KEY = -(1 << 63)
+TIMESTAMP_PATTERN = re.compile(rb'"timestamp":\s*"([^"]+)"')
+MALFORMED_SUMMARY_INTERVAL = 60.0
+MALFORMED_PREVIEW_SIZE = 120
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(lineno)d - %(message)s"
+COMPRESSION_MAGIC = {
+    'gzip': b'\x1f\x8b',
+    'bzip2': b'BZh',
+    'xz': b'\xfd7zXZ\x00',
+    'zstd': b'\x28\xb5\x2f\xfd',
+}
+
+
+def detect_compression(eve_file: Path | str) -> str | None:
+    """
+    Detect the compression of an eve file from its magic bytes
+    :param eve_file:
+    :return: One of COMPRESSION_MAGIC keys, None for a plain file
+    """
+    with open(eve_file, 'rb') as eve:
+        head = eve.read(8)
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def open_eve(eve_file: Path | str) -> BinaryIO:
+    """
+    Open an eve file for binary reading, decompressing it on the fly if needed
+    :param eve_file:
+    :return:
+    """
+    compression = detect_compression(eve_file)
+    if compression == 'gzip':
+        return gzip.open(eve_file, 'rb')
+    if compression == 'bzip2':
+        return bz2.open(eve_file, 'rb')
+    if compression == 'xz':
+        return lzma.open(eve_file, 'rb')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError as ie:
+            raise ImportError(f"Please install 'zstandard' to read {eve_file}: pip install SuricataLog[zstd]") from ie
+        return zstandard.ZstdDecompressor().stream_reader(open(eve_file, 'rb'), closefd=True)
+    return open(eve_file, 'rb')
+
+
+def _threaded_blocks(eve: BinaryIO, block_size: int) -> Iterator[bytes]:
+    """
+    Decompress blocks on a helper thread, so decompression overlaps with the parsing done by the caller.
+    The gzip, bz2, lzma and zstd decompressors release the GIL, and the queue between both threads is
+    bounded to DECOMPRESS_QUEUE_DEPTH blocks.
+    :param eve: Compressed stream
+    :param block_size:
+    :return:
+    """
+    blocks: queue.Queue = queue.Queue(maxsize=DECOMPRESS_QUEUE_DEPTH)
+    stop = threading.Event()
+
+    def offer(item: bytes | Exception) -> None:
+        while not stop.is_set():
+            try:
+                blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def decompress() -> None:
+        try:
+            while not stop.is_set():
+                block = eve.read(block_size)
+                offer(block)
+                if not block:
+                    return
+        except (OSError, EOFError, lzma.LZMAError) as exc:
+            offer(exc)
+        except Exception as exc:  # zstandard.ZstdError and friends, reported as I/O errors
+            offer(OSError(f"Cannot decompress: {exc}"))
+
+    decompressor = threading.Thread(target=decompress, name="eve-decompress", daemon=True)
+    decompressor.start()
+    try:
+        while True:
+            block = blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                break
+            yield block
+    finally:
+        stop.set()
+        decompressor.join()
+
+
+def read_lines(
+        eve_file: Path | str,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        start: int = 0,
+        end: int | None = None
+) -> Iterator[bytes]:
+    """
+    Read an eve file in large binary blocks and split them into lines, without decoding to str.
+    A partial line at the end of a block is carried over and completed with the next block.
+    The last line of the file is returned even if it has no trailing newline.
+    Compressed files (gzip, bzip2, xz, zstd) are decompressed on the fly, only a few blocks at a time.
+    :param eve_file:
+    :param block_size: Size in bytes of each read
+    :param start: Byte offset where reading starts, must be at the beginning of a line. Plain files only
+    :param end: Byte offset where reading stops, must be right after a newline. None reads to the end. Plain files only
+    :return: Non-empty lines, without the trailing newline
+    """
+    remainder = b''
+    with open_eve(eve_file) as eve:
+        if isinstance(eve, io.BufferedReader):
+            if start:
+                eve.seek(start)
+            blocks = _plain_blocks(eve, block_size, start, end)
+        else:
+            if start or end is not None:
+                raise ValueError(f"Cannot read a byte range from compressed file {eve_file}")
+            blocks = _threaded_blocks(eve, block_size)
+        try:
+            for block in blocks:
+                lines = block.split(b'\n')
+                if remainder:
+                    lines[0] = remainder + lines[0]
+                remainder = lines.pop()
+                yield from filter(None, lines)
+        finally:
+            # If the caller stopped early, stop the decompressor thread before its stream is closed
+            blocks.close()
+    if remainder:
+        yield remainder
+
+
+def _plain_blocks(eve: BinaryIO, block_size: int, start: int, end: int | None) -> Iterator[bytes]:
+    """
+    Read blocks from an uncompressed file, stopping at the end offset
+    :param eve:
+    :param block_size:
+    :param start:
+    :param end:
+    :return:
+    """
+    left = end - start if end is not None else -1
+    while left:
+        block = eve.read(block_size if left < 0 else min(block_size, left))
+        if not block:
+            break
+        if left > 0:
+            left -= len(block)
+        yield block
+
+
+def mmap_lines(
+        eve_file: Path | str,
+        needles: tuple[bytes, ...] = (),
+        start: int = 0,
+        end: int | None = None
+) -> Iterator[memoryview]:
+    """
+    Memory map an uncompressed eve file and yield its lines as memoryview slices of the mapping, orjson parses
+    them without any copy. Only the [start, end) range is mapped, so range workers don't map the whole file.
+    With needles, the mapping is searched for the first needle and only the lines around each hit are
+    checked for the rest; lines without it are never looked at from Python.
+    :param eve_file: Uncompressed eve file
+    :param needles: Byte substrings every line must contain, see BaseFilter.needles
+    :param start: Byte offset where reading starts, must be at the beginning of a line
+    :param end: Byte offset where reading stops, must be right after a newline. None reads to the end
+    :return: Non-empty lines, without the trailing newline
+    """
+    with open(eve_file, 'rb') as eve:
+        size = os.fstat(eve.fileno()).st_size
+        end = size if end is None else min(end, size)
+        if start >= end:
+            return
+        offset = start - start % mmap.ALLOCATIONGRANULARITY
+        mapping = mmap.mmap(eve.fileno(), end - offset, access=mmap.ACCESS_READ, offset=offset)
+    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+        mapping.madvise(mmap.MADV_SEQUENTIAL)
+    view = memoryview(mapping)
+    try:
+        if needles:
+            spans = _needle_spans(mapping, needles, start - offset, end - offset)
+        else:
+            spans = _line_spans(mapping, start - offset, end - offset)
+        for line_start, line_end in spans:
+            yield view[line_start:line_end]
+    finally:
+        view.release()
+        # If the caller kept some lines the mapping stays open, and goes away with them
+        with contextlib.suppress(BufferError):
+            mapping.close()
+
+
+def _line_spans(mapping: mmap.mmap, start: int, end: int) -> Iterator[tuple[int, int]]:
+    """
+    Offsets of every non-empty line of a mapping
+    :param mapping:
+    :param start:
+    :param end:
+    :return:
+    """
+    position = start
+    while position < end:
+        newline = mapping.find(b'\n', position, end)
+        if newline < 0:
+            newline = end
+        if newline > position:
+            yield position, newline
+        position = newline + 1
+
+
+def _needle_spans(mapping: mmap.mmap, needles: tuple[bytes, ...], start: int, end: int) -> Iterator[tuple[int, int]]:
+    """
+    Offsets of the lines of a mapping containing all the needles, in their compact or spaced form
+    :param mapping:
+    :param needles:
+    :param start:
+    :param end:
+    :return:
+    """
+    forms = [tuple({needle, needle.replace(b'":', b'": ')}) for needle in needles]
+    first, others = forms[0], forms[1:]
+    hits = [mapping.find(form, start, end) for form in first]
+    position = start
+    while True:
+        found = [hit for hit in hits if hit >= 0]
+        if not found:
+            return
+        hit = min(found)
+        line_start = max(mapping.rfind(b'\n', position, hit) + 1, position)
+        line_end = mapping.find(b'\n', hit, end)
+        if line_end < 0:
+            line_end = end
+        if all(any(mapping.find(form, line_start, line_end) >= 0 for form in needle) for needle in others):
+            yield line_start, line_end
+        position = line_end + 1
+        hits = [
+            mapping.find(form, position, end) if 0 <= hit < position else hit
+            for hit, form in zip(hits, first, strict=True)
+        ]
+
+
+def split_ranges(
+        eve_file: Path | str,
+        range_size: int = DEFAULT_RANGE_SIZE,
+        start: int = 0
+) -> list[tuple[int, int]]:
+    """
+    Split an eve file into byte ranges of roughly range_size bytes, each one ending right after a newline
+    :param eve_file:
+    :param range_size:
+    :param start: Offset of the first range, must be at the beginning of a line
+    :return: List of (start, end) offsets covering the file from start to the end
+    """
+    ranges = []
+    size = os.path.getsize(eve_file)
+    with open(eve_file, 'rb') as eve:
+        while start < size:
+            end = start + range_size
+            if end < size:
+                eve.seek(end)
+                eve.readline()
+                end = eve.tell()
+            else:
+                end = size
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def find_timestamp_offset(
+        eve_file: Path | str,
+        timestamp: datetime,
+        slack: timedelta = DEFAULT_SEEK_SLACK,
+        window: int = SEEK_WINDOW
+) -> int:
+    """
+    Binary search on the byte offsets of a time ordered eve file, to find where events newer than timestamp start.
+    Each probe seeks, resyncs on the next newline and only parses the 'timestamp' fields of the next window bytes,
+    keeping the newest one; events logged late (like flows) don't throw the search off.
+    :param eve_file: Uncompressed eve file
+    :param timestamp: Oldest timestamp of interest
+    :param slack: Tolerance for events that are written out of order, the search looks for timestamp - slack
+    :param window: Bytes read on each probe
+    :return: Offset of the beginning of a line. All the events before it are older than timestamp - slack
+    """
+    target = timestamp_micros(timestamp - slack)
+    size = os.path.getsize(eve_file)
+    with open(eve_file, 'rb') as eve:
+
+        def probe(position: int) -> tuple[int, bool]:
+            eve.seek(position)
+            if position:
+                eve.readline()
+            line_start = eve.tell()
+            newest = None
+            for match in TIMESTAMP_PATTERN.finditer(eve.read(window)):
+                try:
+                    event_timestamp = timestamp_micros(match.group(1).decode('utf-8'))
+                except (ValueError, UnicodeDecodeError):
+                    continue
+                if newest is None or event_timestamp > newest:
+                    newest = event_timestamp
+            return line_start, newest is None or newest >= target
+
+        if probe(0)[1]:
+            return 0
+        low, high = 1, size
+        while low < high:
+            middle = (low + high) // 2
+            if probe(middle)[1]:
+                high = middle
+            else:
+                low = middle + 1
+        return probe(low - 1)[0]
+
+
+def prefilter(
+        lines: Iterator[bytes],
+        needles: tuple[bytes, ...]
+) -> Iterator[bytes]:
+    """
+    Drop raw lines that do not contain every one of the needles, before they get parsed.
+    Needles are written for compact JSON, a line written with a space after ':' also matches.
+    :param lines:
+    :param needles: Byte substrings declared by a filter, see BaseFilter.needles
+    :return: Lines that may be accepted by the filter
+    """
+    for needle in needles:
+        lines = _with_needle(lines, needle)
+    return lines
+
+
+def _with_needle(lines: Iterator[bytes], needle: bytes) -> Iterator[bytes]:
+    """
+    Keep only the lines containing the needle, in its compact or spaced form
+    :param lines:
+    :param needle:
+    :return:
+    """
+    spaced = needle.replace(b'":', b'": ')
+    if spaced == needle:
+        return (line for line in lines if needle in line)
+    return (line for line in lines if needle in line or spaced in line)
+
+
+def projection(fields: Iterable[str] | None, data_filter: BaseFilter) -> dict[str, Any] | None:
+    """
+    Turn dotted field paths into a tree of keys to keep, like {'netflow': {'bytes': None}}.
+    The fields read by the filter are added, so projected events can be filtered again.
+    :param fields: Dotted paths, a path to an object keeps all of it
+    :param data_filter:
+    :return: None if nothing can be dropped
+    """
+    if fields is None or data_filter.fields is None:
+        return None
+    tree: dict[str, Any] = {}
+    for field in (*fields, *data_filter.fields):
+        node = tree
+        *parents, leaf = field.split('.')
+        for key in parents:
+            if key in node and node[key] is None:
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[leaf] = None
+    return tree
+
+
+def project(event: dict[str, Any], tree: dict[str, Any]) -> dict[str, Any]:
+    """
+    Copy only the keys of an event present on a projection tree. Missing keys are left out.
+    :param event:
+    :param tree: See projection()
+    :return:
+    """
+    projected = {}
+    for key, subtree in tree.items():
+        if key in event:
+            value = event[key]
+            if subtree is not None and isinstance(value, dict):
+                value = project(value, subtree)
+            projected[key] = value
+    return projected
+
+
+def merge_key(event: dict[str, Any]) -> int:
+    """
+    Sort key of the merge mode: microseconds since the epoch, so sensors with different UTC offsets interleave
+    correctly. Events without a valid timestamp go first.
+    :param event:
+    :return:
+    """
+    try:
+        return timestamp_micros(event['timestamp'])
+    except (KeyError, ValueError):
+        return MISSING_TIMESTAMP_KEY
+
+
+def setup_logger(log_file: Path | str | None = None) -> logging.Logger:
+    """
+    Configure the logger of this module. Safe to call many times: the handler added by a previous call is
+    reused if it writes to the same place, replaced otherwise, so messages are never duplicated.
+    :param log_file: If set, and its directory exists, logs are written to this file. Otherwise to stderr
+    :return:
+    """
+    logger = logging.getLogger(__name__)
+    log_file = Path(log_file).absolute() if log_file else None
+    if log_file and not log_file.parent.is_dir():
+        log_file = None
+    target = str(log_file) if log_file else None
+    for handler in list(logger.handlers):
+        if handler.get_name() != __name__:
+            continue
+        if getattr(handler, 'baseFilename', None) == target:
+            return logger
+        logger.removeHandler(handler)
+        handler.close()
+    log_handler = logging.FileHandler(filename=log_file) if log_file else logging.StreamHandler()
+    log_handler.set_name(__name__)
+    log_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(log_handler)
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def loads_line(line: bytes | memoryview) -> Any:
+    """
+    Parse a JSON line with orjson. Only lines that look like a complete object get a second chance with the json
+    module (for the few documents orjson rejects, like NaN), so truncated lines and binary garbage fail fast.
+    :param line:
+    :return:
+    :raise ValueError: The line is not valid JSON
+    """
+    try:
+        return orjson.loads(line)
+    except OJSONDecodeError:
+        line = bytes(line).strip()
+        if not (line.startswith(b'{') and line.endswith(b'}')):
+            raise
+        return json.loads(line)
+
+
+class MalformedLines:
+    """
+    Policy for the lines that are not valid JSON: they are counted and skipped, and optionally appended to a
+    quarantine file for later inspection. Instead of one log message per line, the first bad line is logged and
+    then a summary at most every summary_interval seconds, so a burst of garbage does not flood the log.
+    """
+
+    def __init__(
+            self,
+            logger: logging.Logger | None = None,
+            quarantine_file: Path | str | None = None,
+            summary_interval: float = MALFORMED_SUMMARY_INTERVAL
+    ):
+        """
+        :param logger: Where the summaries go
+        :param quarantine_file: Append the bad lines to this file. None only counts them
+        :param summary_interval: Minimum seconds between two summaries
+        """
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.quarantine_file = Path(quarantine_file) if quarantine_file else None
+        self.summary_interval = summary_interval
+        self.count = 0
+        self.reported = 0
+        self.last_summary = float('-inf')
+        self.quarantine = None
+
+    def add(self, line: bytes) -> None:
+        """
+        Record a line that could not be parsed
+        :param line:
+        :return:
+        """
+        self.count += 1
+        if self.quarantine_file:
+            if not self.quarantine:
+                self.quarantine = self.quarantine_file.open('ab')
+            self.quarantine.write(line)
+            if not line.endswith(b'\n'):
+                self.quarantine.write(b'\n')
+        now = time.monotonic()
+        if now - self.last_summary >= self.summary_interval:
+            self.last_summary = now
+            self.reported = self.count
+            self.logger.warning(
+                "Skipped %d lines that are not valid JSON so far, the last one: %r",
+                self.count,
+                bytes(line[:MALFORMED_PREVIEW_SIZE])
+            )
+
+    def summary(self) -> None:
+        """
+        Log the lines skipped since the last summary, and close the quarantine file
+        :return:
+        """
+        if self.count > self.reported:
+            self.reported = self.count
+            self.logger.warning(
+                "Skipped %d lines that are not valid JSON%s",
+                self.count,
+                f", quarantined in '{self.quarantine_file}'" if self.quarantine_file else ""
+            )
+        if self.quarantine:
+            self.quarantine.close()
+            self.quarantine = None
+
+
+def parse_batches(
+        lines: Iterable[bytes | memoryview],
+        data_filter: BaseFilter,
+        on_malformed: Callable[[bytes], None],
+        tree: dict[str, Any] | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[list[dict[str, Any]]]:
+    """
+    Parse raw eve lines, batch_size at a time, and keep the ones accepted by the filter (see BaseFilter.accept_batch)
+    :param lines: Raw lines, as bytes or memoryview
+    :param data_filter:
+    :param on_malformed: Called with each line that is not valid JSON, like MalformedLines.add
+    :param tree: Projection applied to the events, see projection()
+    :param batch_size: Number of lines parsed together. Batches may come out smaller once filtered, never empty
+    :return:
+    """
+    lines = iter(lines)
+    while True:
+        events = []
+        parsed = 0
+        for line in islice(lines, batch_size):
+            parsed += 1
+            try:
+                data = loads_line(line)
+            except ValueError:
+                on_malformed(bytes(line))
+                continue
+            # The tree keeps the fields the filter reads, so events can be projected before they are filtered
+            # and the whole documents of a batch are not kept around
+            events.append(project(data, tree) if tree is not None and isinstance(data, dict) else data)
+        if not parsed:
+            return
+        if events:
+            events = data_filter.accept_batch(events)
+        if events:
+            yield events
+
+
+def parse_events(
+        lines: Iterable[bytes | memoryview],
+        data_filter: BaseFilter,
+        on_malformed: Callable[[bytes], None],
+        tree: dict[str, Any] | None = None
+) -> Iterator[dict[str, Any]]:
+    """
+    Parse raw eve lines and keep the ones accepted by the filter, one event at a time (see parse_batches)
+    :param lines: Raw lines, as bytes or memoryview
+    :param data_filter:
+    :param on_malformed: Called with each line that is not valid JSON, like MalformedLines.add
+    :param tree: Projection applied to the accepted events, see projection()
+    :return:
+    """
+    for batch in parse_batches(lines, data_filter, on_malformed, tree):
+        yield from batch
+
+
+def batched(events: Iterable[dict[str, Any]], batch_size: int) -> Iterator[list[dict[str, Any]]]:
+    """
+    Group events in lists of batch_size, the last one may be smaller
+    :param events:
+    :param batch_size:
+    :return:
+    """
+    events = iter(events)
+    while batch := list(islice(events, batch_size)):
+        yield batch
+
+
+def _parse_range(
+        eve_file: Path | str,
+        start: int,
+        end: int,
+        data_filter: BaseFilter,
+        block_size: int,
+        use_mmap: bool = False,
+        tree: dict[str, Any] | None = None
+) -> tuple[list[dict[str, Any]], list[bytes]]:
+    """
+    Worker side of the parallel reader: parse and filter one byte range of an eve file
+    :param eve_file:
+    :param start:
+    :param end:
+    :param data_filter:
+    :param block_size:
+    :param use_mmap: Map the range instead of reading it in blocks
+    :param tree: Projection applied before the events are sent back to the parent process
+    :return: Accepted events, in file order, and the lines that are not valid JSON
+    """
+    malformed: list[bytes] = []
+    events = []
+    lines = _range_lines(eve_file, start, end, data_filter, block_size, use_mmap)
+    for batch in parse_batches(lines, data_filter, malformed.append, tree):
+        events.extend(batch)
+    return events, malformed
+
+
+def _range_lines(
+        eve_file: Path | str,
+        start: int,
+        end: int,
+        data_filter: BaseFilter,
+        block_size: int,
+        use_mmap: bool
+) -> Iterator[bytes | memoryview]:
+    """
+    Lines of one byte range of an eve file that contain all the needles of the filter
+    :param eve_file:
+    :param start:
+    :param end:
+    :param data_filter:
+    :param block_size:
+    :param use_mmap: Map the range instead of reading it in blocks
+    :return:
+    """
+    if use_mmap:
+        return mmap_lines(eve_file, data_filter.needles, start, end)
+    return prefilter(read_lines(eve_file, block_size, start, end), data_filter.needles)
+
+
+def _aggregate_range(
+        eve_file: Path | str,
+        start: int,
+        end: int,
+        data_filter: BaseFilter,
+        block_size: int,
+        use_mmap: bool,
+        tree: dict[str, Any] | None,
+        factory: Callable[[], Any],
+        ingest_args: dict[str, Any]
+) -> tuple[Any, int, list[bytes]]:
+    """
+    Worker side of the parallel aggregation: feed one byte range of an eve file to a new partial report
+    :param eve_file:
+    :param start:
+    :param end:
+    :param data_filter:
+    :param block_size:
+    :param use_mmap: Map the range instead of reading it in blocks
+    :param tree: Projection applied before the events are ingested
+    :param factory: Creates the empty report
+    :param ingest_args: Extra keyword arguments of ingest_batch()
+    :return: Partial report, number of events ingested and the lines that are not valid JSON
+    """
+    report = factory()
+    malformed: list[bytes] = []
+    count = 0
+    lines = _range_lines(eve_file, start, end, data_filter, block_size, use_mmap)
+    for batch in parse_batches(lines, data_filter, malformed.append, tree):
+        report.ingest_batch(batch, **ingest_args)
+        count += len(batch)
+    return report, count, malformed
 
 
 class EveLogHandler:
@@ -20,60 +732,527 @@ class EveLogHandler:
 
     def __init__(
             self,
-            log_file: Path | str | None = None
+            log_file: Path | str | None = None,
+            block_size: int = DEFAULT_BLOCK_SIZE,
+            workers: int = 1,
+            ordered: bool = True,
+            range_size: int = DEFAULT_RANGE_SIZE,
+            follow: bool = False,
+            seek_slack: timedelta | None = DEFAULT_SEEK_SLACK,
+            use_mmap: bool = False,
+            cache: "EveCache | None" = None,
+            index: "EveIndex | None" = None,
+            merge: bool = False,
+            quarantine_file: Path | str | None = None,
+            dedup: Deduplicator | None = None,
+            stream_queue_size: int = DEFAULT_QUEUE_SIZE,
+            stream_overflow: str = 'drop'
     ):
         """
         :param log_file: If set logs will be written to a file
+        :param block_size: Size in bytes of each read from the eve files
+        :param workers: Number of processes used to parse each file. 1 parses on the calling thread
+        :param ordered: If False, events from parallel workers are yielded as soon as a range is ready
+        :param range_size: Approximate size in bytes of the file ranges handed to each worker
+        :param follow: Keep reading the last eve file as it grows, like 'tail -F'
+        :param seek_slack: If the filter has a minimum timestamp, binary search each uncompressed file for it,
+        tolerating events out of order by this much. None reads the files from the start
+        :param use_mmap: Memory map uncompressed files instead of reading them in blocks. Faster, but a file
+        truncated while it is mapped (logrotate copytruncate) kills the process with SIGBUS
+        :param cache: Read the files from this columnar cache, when they have a fresh entry there
+        :param index: Load the files into this SQLite index (only the data not loaded yet), then query it
+        :param merge: Interleave the events of all the files by timestamp, instead of one file after the other
+        :param quarantine_file: Append the lines that are not valid JSON to this file, instead of only counting them
+        :param dedup: Drop the events already seen, like the ones of a file passed twice or copied under another name
+        :param stream_queue_size: For unix socket sources, maximum number of received chunks waiting to be parsed
+        :param stream_overflow: For unix socket sources, 'drop' or 'sample' the lines when parsing falls behind
         """
-        fmt = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(lineno)d - %(message)s")
-        log_handler = None
-        if log_file:
-            if isinstance(log_file, str):
-                log_file = Path(log_file)
-            if log_file.parent.exists() and log_file.parent.is_dir():
-                log_handler = logging.FileHandler(filename=log_file)
-        if not log_handler:  # Still no log_handler
-            log_handler = logging.StreamHandler()
-        log_handler.setFormatter(fmt)
-        self.logger = logging.getLogger(__name__)
-        self.logger.addHandler(log_handler)
-        self.logger.setLevel(logging.INFO)
+        self.logger = setup_logger(log_file)
+        self.malformed = MalformedLines(self.logger, quarantine_file)
+        if workers < 1:
+            raise ValueError(f"Invalid number of workers: {workers}")
+        self.block_size = block_size
+        self.workers = workers
+        self.ordered = ordered
+        self.range_size = range_size
+        self.follow = follow
+        self.seek_slack = seek_slack
+        self.use_mmap = use_mmap
+        self.cache = cache
+        self.index = index
+        self.merge = merge
+        self.dedup = dedup
+        if stream_overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid stream overflow policy: {stream_overflow}")
+        self.stream_queue_size = stream_queue_size
+        self.stream_overflow = stream_overflow
 
     def get_events(
             self,
             *,
             eve_files=None,
             data_filter: BaseFilter,
+            stop: Callable[[], bool] | None = None,
+            on_idle: Callable[[], None] | None = None,
+            checkpoint: Checkpoint | None = None,
+            fields: Iterable[str] | None = None,
+            event_types: Iterable[str] | None = None
     ) -> dict:
         """
         Get alerts from a JSON even file. Assumed each line is a valid
-        JSON document, otherwise reader will crash
+        JSON document, otherwise the line is skipped and counted on 'malformed' (see MalformedLines).
+        Lines are read as raw bytes and handed to orjson directly, skipping the str decoding step.
+        With use_mmap, uncompressed files are memory mapped and lines are handed over as views of the mapping.
+        Lines missing any of the filter needles are discarded before parsing.
+        Compressed files are detected by their magic bytes and decompressed on the fly.
+        If more than one worker was requested, each uncompressed file is split into newline aligned ranges
+        that are parsed and filtered on a pool of processes.
+        If the filter rejects events older than a timestamp, uncompressed files are read starting from a
+        position found with a binary search on the event timestamps.
+        In follow mode the last file is not closed at the end, new events are yielded as they get written.
+        With a checkpoint, each file is read from where the previous run stopped up to its last complete line,
+        and the checkpoint is updated once a file was fully consumed.
+        With fields, accepted events are cut down to those dotted paths plus the ones the filter reads, before
+        they are handed over (or sent back from the workers), so big blobs like payloads are not kept around.
+        Files with a fresh entry on the columnar cache are read from it instead, except with a checkpoint or
+        when followed. Events from the cache come grouped by day and event type.
+        With an index, files are brought up to date on it and their events are queried, by event type and
+        timestamp, from the index instead (again, except with a checkpoint or when followed).
+        In merge mode the files are read at the same time and their events interleaved by timestamp (the
+        cache is not used, its events are not in time order).
+        With dedup, events already seen on this or a previous call are dropped, see suricatalog.dedup.
+        Sources like 'unix:///var/run/suricata/eve.sock' listen on that socket for Suricata's unix_stream output
+        until stop() returns True, see suricatalog.stream.
+        Events are read, parsed and filtered in batches (see get_event_batches), this is a thin wrapper over it.
         :param eve_files:
         :param data_filter: Filter events based on several criteria
+        :param stop: In follow mode, or reading a unix socket, return True to stop waiting for new events
+        :param on_idle: In follow mode, or reading a unix socket, called when all the available events were yielded
+        :param checkpoint: Resume from, and record, the offsets of a previous run
+        :param fields: Dotted paths of the fields the caller needs, like the 'fields' of the reports. None keeps all
+        :param event_types: Only return events of these types, like the 'event_types' of the reports. None for any
         :return: Dictionary with events
         """
+        for batch in self.get_event_batches(
+                eve_files=eve_files,
+                data_filter=data_filter,
+                stop=stop,
+                on_idle=on_idle,
+                checkpoint=checkpoint,
+                fields=fields,
+                event_types=event_types
+        ):
+            yield from batch
+
+    def get_event_batches(
+            self,
+            *,
+            eve_files=None,
+            data_filter: BaseFilter,
+            stop: Callable[[], bool] | None = None,
+            on_idle: Callable[[], None] | None = None,
+            checkpoint: Checkpoint | None = None,
+            fields: Iterable[str] | None = None,
+            event_types: Iterable[str] | None = None,
+            batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> Iterator[list[dict[str, Any]]]:
+        """
+        Same events as get_events(), in lists of up to batch_size events, so callers can process them with
+        BaseFilter.accept_batch() or the ingest_batch() of the reports, without a Python call per event.
+        Batches are never empty. Followed files are read one event per batch, so new events show up right away.
+        :param eve_files:
+        :param data_filter: Filter events based on several criteria
+        :param stop: In follow mode, or reading a unix socket, return True to stop waiting for new events
+        :param on_idle: In follow mode, or reading a unix socket, called when all the available events were yielded
+        :param checkpoint: Resume from, and record, the offsets of a previous run
+        :param fields: Dotted paths of the fields the caller needs, like the 'fields' of the reports. None keeps all
+        :param event_types: Only return events of these types, like the 'event_types' of the reports. None for any
+        :param batch_size: Maximum number of events on each batch
+        :return:
+        """
         if not isinstance(data_filter, BaseFilter):
             raise ValueError("Invalid 'data_filter' passed.")
         if eve_files is None:
             eve_files = DEFAULT_EVE_JSON
+        composite = data_filter if isinstance(data_filter, CompositeFilter) else None
+        if event_types is not None:
+            data_filter = EventTypeFilter(data_filter, event_types)
+        if self.merge and fields is not None:
+            fields = (*fields, 'timestamp')
+        if self.dedup and fields is not None:
+            fields = (*fields, *DEDUP_FIELDS)
+        tree = projection(fields, data_filter)
+        duplicates = self.dedup.duplicates if self.dedup else 0
+
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        try:
+            streams = [
+                self.__get_file_batches__(
+                    eve_file,
+                    data_filter,
+                    tree,
+                    batch_size,
+                    executor=executor,
+                    follow=self.follow and idx == len(eve_files) - 1,
+                    stop=stop,
+                    on_idle=on_idle,
+                    checkpoint=checkpoint
+                ) for idx, eve_file in enumerate(eve_files)
+            ]
+            if self.merge:
+                batches = batched(
+                    heapq.merge(*[chain.from_iterable(stream) for stream in streams], key=merge_key), batch_size
+                )
+            else:
+                batches = chain.from_iterable(streams)
+            for batch in batches:
+                if self.dedup and not (batch := self.dedup.unique_batch(batch)):
+                    continue
+                yield batch
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+            self.malformed.summary()
+            if self.dedup and self.dedup.duplicates > duplicates:
+                self.logger.info("Dropped %d duplicated events", self.dedup.duplicates - duplicates)
+            if composite and self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Filter statistics:\n%s", composite.stats_report())
 
-        for eve_file in eve_files:
+    def aggregate(
+            self,
+            report: Any,
+            *,
+            eve_files=None,
+            data_filter: BaseFilter,
+            checkpoint: Checkpoint | None = None,
+            factory: Callable[[], Any] | None = None,
+            **ingest_args: Any
+    ) -> int:
+        """
+        Feed the events of the files to the ingest_batch() of a report (see suricatalog.report), asking only for the
+        'fields' and 'event_types' of the report.
+        With more than one worker, each range of an uncompressed file is ingested on the workers into a partial report,
+        and the partial reports are merged into this one with merge(): only the small partial reports are sent back,
+        never the events. Followed, merged, deduplicated or indexed reads, compressed or cached files and unix sockets
+        are read with get_event_batches() instead.
+        :param report: Updated in place
+        :param eve_files:
+        :param data_filter: Filter events based on several criteria
+        :param checkpoint: Resume from, and record, the offsets of a previous run
+        :param factory: Creates the empty partial reports on the workers, like functools.partial(IocReport,
+        matcher=matcher). Defaults to the class of the report
+        :param ingest_args: Extra keyword arguments of ingest_batch(), like dest for HostDataUseReport
+        :return: Number of events ingested
+        """
+        if not isinstance(data_filter, BaseFilter):
+            raise ValueError("Invalid 'data_filter' passed.")
+        if eve_files is None:
+            eve_files = DEFAULT_EVE_JSON
+        count = 0
+        serial_files = list(eve_files)
+        if self.workers > 1 and not (self.follow or self.merge or self.dedup or self.index):
+            serial_files = []
+            range_filter = data_filter
+            if report.event_types is not None:
+                range_filter = EventTypeFilter(data_filter, report.event_types)
+            tree = projection(report.fields, range_filter)
+            executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
             try:
-                with open(eve_file, encoding='utf-8') as eve:
-                    for line in eve:
-                        try:
-                            data = orjson.loads(
-                                line
-                            )
-                            if data_filter.accept(data):
-                                yield data
-                        except OJSONDecodeError:
-                            try:
-                                data = json.loads(line)
-                                if data_filter.accept(data):
-                                    yield data
-                            except json.JSONDecodeError:
-                                self.logger.exception("I cannot use data: '%s'. Ignoring it.", line)
-                                continue  # Try to read the next record
-            except (FileNotFoundError, FileExistsError, UnicodeDecodeError):
-                self.logger.exception("I cannot use file '%s'. Ignoring it.", eve_file)
+                for eve_file in eve_files:
+                    if not self.__aggregates_on_workers__(eve_file, checkpoint):
+                        serial_files.append(eve_file)
+                        continue
+                    count += self.__aggregate_ranges__(
+                        executor,
+                        report,
+                        eve_file,
+                        range_filter,
+                        tree,
+                        checkpoint,
+                        factory if factory else type(report),
+                        ingest_args
+                    )
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.malformed.summary()
+        if serial_files:
+            for batch in self.get_event_batches(
+                    eve_files=serial_files,
+                    data_filter=data_filter,
+                    checkpoint=checkpoint,
+                    fields=report.fields,
+                    event_types=report.event_types):
+                report.ingest_batch(batch, **ingest_args)
+                count += len(batch)
+        return count
+
+    def __aggregates_on_workers__(self, eve_file: Path | str, checkpoint: Checkpoint | None) -> bool:
+        """
+        :param eve_file:
+        :param checkpoint:
+        :return: True if the file can be split into ranges, and it would not be read from the cache
+        """
+        try:
+            return (
+                not is_unix_source(eve_file)
+                and os.path.isfile(eve_file)
+                and not detect_compression(eve_file)
+                and not (self.cache and not checkpoint and self.cache.lookup(eve_file))
+            )
+        except OSError:
+            return False
+
+    def __aggregate_ranges__(
+            self,
+            executor: ProcessPoolExecutor,
+            report: Any,
+            eve_file: Path | str,
+            data_filter: BaseFilter,
+            tree: dict[str, Any] | None,
+            checkpoint: Checkpoint | None,
+            factory: Callable[[], Any],
+            ingest_args: dict[str, Any]
+    ) -> int:
+        """
+        Ingest the ranges of a single uncompressed file on the process pool, see aggregate()
+        :param executor:
+        :param report:
+        :param eve_file:
+        :param data_filter:
+        :param tree: Projection done by the workers
+        :param checkpoint:
+        :param factory:
+        :param ingest_args:
+        :return: Number of events ingested
+        """
+        end = None
+        if checkpoint:
+            start = checkpoint.start_offset(eve_file)
+            if start is None:
+                self.logger.debug("'%s' was already processed, skipping it", eve_file)
+                return 0
+            end = last_newline_offset(eve_file)
+        else:
+            start = self.__get_start_offset__(eve_file, data_filter)
+        futures = [
+            executor.submit(
+                _aggregate_range,
+                eve_file,
+                first,
+                last if end is None else min(last, end),
+                data_filter,
+                self.block_size,
+                self.use_mmap,
+                tree,
+                factory,
+                ingest_args
+            ) for first, last in split_ranges(eve_file, self.range_size, start) if end is None or first < end
+        ]
+        count = 0
+        for done in as_completed(futures):
+            partial, ingested, malformed = done.result()
+            report.merge(partial)
+            count += ingested
+            for line in malformed:
+                self.malformed.add(line)
+        if checkpoint:
+            checkpoint.update(eve_file, end)
+        return count
+
+    def __get_file_batches__(
+            self,
+            eve_file: Path | str,
+            data_filter: BaseFilter,
+            tree: dict[str, Any] | None,
+            batch_size: int,
+            *,
+            executor: ProcessPoolExecutor | None,
+            follow: bool,
+            stop: Callable[[], bool] | None,
+            on_idle: Callable[[], None] | None,
+            checkpoint: Checkpoint | None
+    ) -> Iterator[list[dict[str, Any]]]:
+        """
+        Batches of events of a single file, using the best reader available for it. Errors are logged and end the file.
+        :param eve_file:
+        :param data_filter:
+        :param tree: Projection of the events
+        :param batch_size:
+        :param executor: Process pool for the parallel reader, if any
+        :param follow: Keep reading the file as it grows
+        :param stop:
+        :param on_idle:
+        :param checkpoint:
+        :return:
+        """
+        try:
+            if is_unix_source(eve_file):
+                reader = UnixStreamReader(
+                    unix_socket_path(eve_file),
+                    queue_size=self.stream_queue_size,
+                    overflow=self.stream_overflow,
+                    logger=self.logger,
+                    malformed=self.malformed.add
+                )
+                for lines in reader.chunks(stop if stop else lambda: False, on_idle):
+                    yield from parse_batches(
+                        prefilter(lines, data_filter.needles), data_filter, self.malformed.add, tree, batch_size
+                    )
+            elif checkpoint:
+                yield from self.__get_checkpoint_batches__(checkpoint, eve_file, data_filter, tree, batch_size)
+            elif follow:
+                lines = follow_lines(
+                    eve_file,
+                    self.block_size,
+                    stop=stop if stop else lambda: False,
+                    on_idle=on_idle,
+                    start=self.__get_start_offset__(eve_file, data_filter)
+                )
+                yield from parse_batches(
+                    prefilter(lines, data_filter.needles), data_filter, self.malformed.add, tree, batch_size=1
+                )
+            elif self.index:
+                self.index.update(eve_file, self.malformed)
+                yield from batched(self.index.get_events(eve_file, data_filter, tree), batch_size)
+            elif self.cache and not self.merge and (entry := self.cache.lookup(eve_file)):
+                yield from batched(entry.get_events(data_filter, tree), batch_size)
+            elif executor and not detect_compression(eve_file):
+                yield from self.__get_parallel_batches__(executor, eve_file, data_filter, tree, batch_size)
+            else:
+                start = self.__get_start_offset__(eve_file, data_filter)
+                yield from parse_batches(
+                    self.__read_lines__(eve_file, data_filter.needles, start),
+                    data_filter,
+                    self.malformed.add,
+                    tree,
+                    batch_size
+                )
+        except (OSError, EOFError, ImportError, lzma.LZMAError):
+            self.logger.exception("I cannot use file '%s'. Ignoring it.", eve_file)
+
+    def __read_lines__(
+            self,
+            eve_file: Path | str,
+            needles: tuple[bytes, ...],
+            start: int = 0,
+            end: int | None = None
+    ) -> Iterator[bytes | memoryview]:
+        """
+        Lines of a file that contain all the needles, memory mapped if requested and the file is not compressed
+        :param eve_file:
+        :param needles:
+        :param start:
+        :param end:
+        :return:
+        """
+        if self.use_mmap and not detect_compression(eve_file):
+            return mmap_lines(eve_file, needles, start, end)
+        return prefilter(read_lines(eve_file, self.block_size, start, end), needles)
+
+    def __get_start_offset__(self, eve_file: Path | str, data_filter: BaseFilter) -> int:
+        """
+        Where to start reading a file, skipping the events too old for the filter
+        :param eve_file:
+        :param data_filter:
+        :return:
+        """
+        min_timestamp = data_filter.min_timestamp
+        if min_timestamp is None or self.seek_slack is None or detect_compression(eve_file):
+            return 0
+        start = find_timestamp_offset(eve_file, min_timestamp, self.seek_slack)
+        if start:
+            self.logger.debug("Skipped %d bytes of '%s' older than %s", start, eve_file, min_timestamp)
+        return start
+
+    def __get_checkpoint_batches__(
+            self,
+            checkpoint: Checkpoint,
+            eve_file: Path | str,
+            data_filter: BaseFilter,
+            tree: dict[str, Any] | None = None,
+            batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> Iterator[list[dict[str, Any]]]:
+        """
+        Read only the part of a file that was not processed on a previous run
+        :param checkpoint:
+        :param eve_file:
+        :param data_filter:
+        :param tree: Projection of the events
+        :param batch_size:
+        :return:
+        """
+        start = checkpoint.start_offset(eve_file)
+        if start is None:
+            self.logger.debug("'%s' was already processed, skipping it", eve_file)
+            return
+        if detect_compression(eve_file):
+            end = None
+            lines = self.__read_lines__(eve_file, data_filter.needles)
+        else:
+            end = last_newline_offset(eve_file)
+            lines = self.__read_lines__(eve_file, data_filter.needles, start, end)
+        yield from parse_batches(lines, data_filter, self.malformed.add, tree, batch_size)
+        checkpoint.update(eve_file, end)
+
+    def __get_parallel_batches__(
+            self,
+            executor: ProcessPoolExecutor,
+            eve_file: Path | str,
+            data_filter: BaseFilter,
+            tree: dict[str, Any] | None = None,
+            batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> Iterator[list[dict[str, Any]]]:
+        """
+        Parse the ranges of a single file on the process pool. At most two ranges per worker are in flight,
+        so memory stays bounded even if the caller consumes events slowly.
+        :param executor:
+        :param eve_file:
+        :param data_filter:
+        :param tree: Projection done by the workers
+        :param batch_size:
+        :return:
+        """
+        ranges = iter(split_ranges(eve_file, self.range_size, self.__get_start_offset__(eve_file, data_filter)))
+        in_flight: deque[Future] = deque()
+
+        def submit_next() -> None:
+            for start, end in ranges:
+                in_flight.append(
+                    executor.submit(_parse_range, eve_file, start, end, data_filter, self.block_size, self.use_mmap, tree)
+                )
+                return
+
+        for _ in range(self.workers * 2):
+            submit_next()
+        while in_flight:
+            if self.ordered:
+                done = in_flight.popleft()
+            else:
+                done = next(iter(wait(in_flight, return_when=FIRST_COMPLETED).done))
+                in_flight.remove(done)
+            submit_next()
+            events, malformed = done.result()
+            for line in malformed:
+                self.malformed.add(line)
+            for idx in range(0, len(events), batch_size):
+                yield events[idx:idx + batch_size]
+
+
+def notify_malformed(app: "App", eve_lh: EveLogHandler) -> None:
+    """
+    Tell the user of an application how many lines were skipped because they are not valid JSON, if any
+    :param app: Notified with App.notify()
+    :param eve_lh: Reader the application used
+    :return:
+    """
+    if eve_lh.malformed.count:
+        app.notify(
+            message=f"{eve_lh.malformed.count:,} lines skipped, they are not valid JSON",
+            title="Malformed lines",
+            severity="warning"
+        )
@@ -12,7 +12,7 @@ from textual.widgets import Footer, Header, RichLog
 
 from suricatalog.clipboard import copy_from_richlog
 from suricatalog.filter import BaseFilter
-from suricatalog.log import EveLogHandler
+from suricatalog.log import EveLogHandler, notify_malformed
 from suricatalog.screens import ErrorScreen
 
 
@@ -32,7 +32,8 @@ class OneShotApp(App):
             css_path: CSSPathType | None = None,
             watch_css: bool = False,
             eve: list[Path] = None,
-            data_filter: BaseFilter = None
+            data_filter: BaseFilter = None,
+            eve_lh: EveLogHandler = None
     ):
         """
         Constructor
@@ -41,10 +42,12 @@ class OneShotApp(App):
         :param watch_css:
         :param eve:
         :param data_filter:
+        :param eve_lh: Reader for the eve files, a default one is used if missing
         """
         super().__init__(driver_class, css_path, watch_css)
         self.data_filter = data_filter
         self.eve = eve
+        self.eve_lh = eve_lh if eve_lh else EveLogHandler()
         self.loaded = 0
 
     def action_quit_app(self) -> None:
@@ -93,8 +96,7 @@ class OneShotApp(App):
         :return:
         """
         try:
-            eve_lh = EveLogHandler()
-            for single_alert in eve_lh.get_events(eve_files=self.eve, data_filter=self.data_filter):
+            for single_alert in self.eve_lh.get_events(eve_files=self.eve, data_filter=self.data_filter):
                 log.loading = False
                 log.write(single_alert)
                 self.loaded += 1
@@ -126,3 +128,4 @@ class OneShotApp(App):
             timeout=15,
             message=f"Number of messages loaded: {self.loaded}"
         )
+        notify_malformed(self, self.eve_lh)
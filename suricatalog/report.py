@@ -1,9 +1,49 @@
 """
-Collection of canned reports
-
+Collection of canned reports.
+Each report declares in 'fields' the dotted paths ingest_data() reads, and in 'event_types' the only event types
+it uses (None for any). Pass them to EveLogHandler.get_events to receive only the events and fields needed.
+Reports take whole batches of events with ingest_batch(), like the ones from EveLogHandler.get_event_batches;
+ingest_data() is a thin wrapper for a single event.
+Partial reports, of different files, ranges of a file or sensors, are combined with merge(); to_state() and
+from_state() give a compact serializable state, for checkpoints or to send reports between processes.
 """
 import dataclasses
-from typing import Any
+import heapq
+from collections.abc import Iterable
+from typing import Any, ClassVar, Self
+
+from suricatalog.ioc import DEFAULT_IOC_FIELDS, IocMatcher, field_value
+from suricatalog.ipset import IpSet, single_network
+from suricatalog.sketch import (
+    DEFAULT_COUNTERS,
+    DEFAULT_PRECISION,
+    HeavyHitters,
+    HyperLogLog,
+    hash64,
+)
+
+TOP_VALUE_FIELDS = {
+    'useragent': 'http.http_user_agent',
+    'signature': 'alert.signature',
+    'ja3': 'tls.ja3.hash',
+    'dns': 'dns.rrname',
+    'talker': 'src_ip',
+}
+DISTINCT_REPORTS = {
+    'sources_per_port': ('dest_port', 'src_ip'),
+    'destinations_per_host': ('src_ip', 'dest_ip'),
+}
+
+
+def merge_counts(counts: dict[Any, int], other: dict[Any, int]) -> None:
+    """
+    Add the counters of other to counts, in place
+    :param counts:
+    :param other:
+    :return:
+    """
+    for key, count in other.items():
+        counts[key] = counts.get(key, 0) + count
 
 
 @dataclasses.dataclass
@@ -11,6 +51,8 @@ class AggregatedFlowProtoReport:
     """
     FLow protocol report details
     """
+    fields: ClassVar[tuple[str, ...]] = ('event_type', 'proto', 'dest_port')
+    event_types: ClassVar[tuple[str, ...]] = ('flow',)
     port_proto_count: dict[tuple[str, int], int] = dataclasses.field(default_factory=dict)
 
     async def ingest_data(self, data: dict[Any, Any]) -> None:
@@ -32,12 +74,44 @@ class AggregatedFlowProtoReport:
         :param data:
         :return:
         """
-        if 'event_type' in data and data['event_type'] == 'flow' and 'dest_port' in data and 'proto' in data:
-            port = data['dest_port'] if data['dest_port'] else ""
-            proto_and_dest_port = (data['proto'], port)
-            if proto_and_dest_port not in self.port_proto_count:
-                self.port_proto_count[proto_and_dest_port] = 0
-            self.port_proto_count[proto_and_dest_port] += 1
+        self.ingest_batch((data,))
+
+    def ingest_batch(self, events: Iterable[dict[Any, Any]]) -> None:
+        """
+        Count the flows of a batch of events, see ingest_data()
+        :param events:
+        :return:
+        """
+        port_proto_count = self.port_proto_count
+        for data in events:
+            if data.get('event_type') == 'flow' and 'dest_port' in data and 'proto' in data:
+                proto_and_dest_port = (data['proto'], data['dest_port'] if data['dest_port'] else "")
+                port_proto_count[proto_and_dest_port] = port_proto_count.get(proto_and_dest_port, 0) + 1
+
+    def to_state(self) -> dict[str, Any]:
+        """
+        Serializable state of the report
+        :return:
+        """
+        return {'port_proto_count': [[proto, port, count] for (proto, port), count in self.port_proto_count.items()]}
+
+    def merge(self, other: Self) -> Self:
+        """
+        Add the flows counted by another report
+        :param other:
+        :return: This report
+        """
+        merge_counts(self.port_proto_count, other.port_proto_count)
+        return self
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> Self:
+        """
+        Rebuild a report from its serialized state
+        :param state:
+        :return:
+        """
+        return cls(port_proto_count={(proto, port): count for proto, port, count in state['port_proto_count']})
 
 
 @dataclasses.dataclass
@@ -45,27 +119,170 @@ class HostDataUseReport:
     """
     Host data usage report
     """
+    fields: ClassVar[tuple[str, ...]] = ('event_type', 'dest_ip', 'netflow.bytes')
+    event_types: ClassVar[tuple[str, ...]] = ('netflow',)
     bytes: int = 0
 
-    async def ingest_data(self, data: dict[Any, Any], dest: str) -> None:
+    async def ingest_data(self, data: dict[Any, Any], dest: str | IpSet) -> None:
         """
         tail -n500000 /var/log/suricata/eve.json | \
         jq -s 'map(select(.event_type=="netflow" and .dest_ip=="224.0.0.251").netflow.bytes)|add'| /bin/numfmt --to=iec
         1.6M
         :param data:
-        :param dest:
+        :param dest: Destination address, or set of networks
+        :return:
+        """
+        self.ingest_batch((data,), dest)
+
+    def ingest_batch(self, events: Iterable[dict[Any, Any]], dest: str | IpSet) -> None:
+        """
+        Add the netflow bytes of a batch of events, see ingest_data()
+        :param events:
+        :param dest: Destination address, or set of networks
+        :return:
+        """
+        if not isinstance(dest, IpSet):
+            dest = single_network(dest)
+        self.bytes += sum(
+            data['netflow']['bytes']
+            for data in events
+            if data.get('event_type') == 'netflow' and data.get('dest_ip') in dest
+        )
+
+    def to_state(self) -> dict[str, Any]:
+        """
+        Serializable state of the report
+        :return:
+        """
+        return {'bytes': self.bytes}
+
+    def merge(self, other: Self) -> Self:
+        """
+        Add the bytes counted by another report, for the same destination
+        :param other:
+        :return: This report
+        """
+        self.bytes += other.bytes
+        return self
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> Self:
+        """
+        Rebuild a report from its serialized state
+        :param state:
         :return:
         """
-        if 'event_type' in data and data['event_type'] == 'netflow' and 'dest_ip' in data and dest == data['dest_ip']:
-            self.bytes += data['netflow']['bytes']
+        return cls(bytes=state['bytes'])
 
 
-class TopUserAgents:
+@dataclasses.dataclass
+class TopValues:
     """
-    Replicate tutorial top user agents query with jq.
+    Most frequent values of a field, like the signatures or the talkers, on bounded memory (see suricatalog.sketch).
+    Counts are exact until there are more distinct values than counters, then 'hitters.error' tells how far off they
+    may be. Pass factory=functools.partial(TopValues, field=..., counters=...) to EveLogHandler.aggregate()
     """
+    event_types: ClassVar[tuple[str, ...] | None] = None
+    field: str = TOP_VALUE_FIELDS['useragent']
+    counters: int | None = DEFAULT_COUNTERS
+    hitters: HeavyHitters = dataclasses.field(init=False)
+
+    def __post_init__(self):
+        """
+        :raise ValueError: Invalid number of counters
+        """
+        self.hitters = HeavyHitters(self.counters)
+        self.path = tuple(self.field.split('.'))
 
-    agents: dict[str, int] = {}
+    @property
+    def fields(self) -> tuple[str, ...]:
+        """
+        :return: The counted field
+        """
+        return (self.field,)
+
+    async def ingest_data(self, data: dict[Any, Any]) -> None:
+        """
+        cat eve.json | jq -s '[.[]|.alert.signature|select(. != null)]|group_by(.)|map({key:.[0],value:(.|length)})|from_entries'
+        :param data:
+        :return:
+        """
+        self.ingest_batch((data,))
+
+    def ingest_batch(self, events: Iterable[dict[Any, Any]]) -> None:
+        """
+        Count the values of a batch of events, see ingest_data(). Events without the field, or with an empty value,
+        are not counted
+        :param events:
+        :return:
+        """
+        path = self.path
+        counts: dict[str, int] = {}
+        for data in events:
+            value = field_value(data, path)
+            if value.__class__ is str and value:
+                counts[value] = counts.get(value, 0) + 1
+        self.hitters.add_counts(counts)
+
+    def top(self, limit: int | None = None) -> dict[str, int]:
+        """
+        :param limit: Maximum number of values, None for all of them
+        :return: Values and their counts, most frequent first
+        """
+        return dict(self.hitters.top(limit))
+
+    def merge(self, other: Self) -> Self:
+        """
+        Add the values counted by another report, of the same field
+        :param other:
+        :return: This report
+        """
+        self.hitters.merge(other.hitters)
+        return self
+
+    def to_state(self) -> dict[str, Any]:
+        """
+        Serializable state of the report
+        :return:
+        """
+        return {'field': self.field, 'hitters': self.hitters.to_state()}
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> Self:
+        """
+        Rebuild a report from its serialized state
+        :param state:
+        :return:
+        """
+        hitters = HeavyHitters.from_state(state['hitters'])
+        report = cls(field=state['field'], counters=hitters.capacity)
+        report.hitters = hitters
+        return report
+
+    @classmethod
+    def from_checkpoint(cls, state: dict[str, Any], field: str, counters: int | None) -> Self:
+        """
+        Resume a report saved on a checkpoint, with the budget asked for now
+        :param state: State saved on the checkpoint
+        :param field: Field to count, it must be the saved one
+        :param counters: Memory budget, applied to the saved counts if it changed
+        :return:
+        :raise ValueError: The checkpoint counts another field, or the budget is invalid
+        """
+        report = cls.from_state(state)
+        if report.field != field:
+            raise ValueError(f"Checkpoint counts {report.field}, not {field}. Use another checkpoint file")
+        if report.counters != counters:
+            report.hitters.resize(counters)
+            report.counters = counters
+        return report
+
+
+@dataclasses.dataclass
+class TopUserAgents(TopValues):
+    """
+    Replicate tutorial top user agents query with jq.
+    """
 
     async def ingest_data(self, data: dict[Any, Any]) -> None:
         """
@@ -97,9 +314,220 @@ class TopUserAgents:
         :param data:
         :return:
         """
-        if 'event_type' in data and 'http' in data and 'http_user_agent' in data['http']:
-            agent = data['http']['http_user_agent']
-            if agent:
-                if agent not in self.agents:
-                    self.agents[agent] = 0
-                self.agents[agent] += 1
+        self.ingest_batch((data,))
+
+    @property
+    def agents(self) -> dict[str, int]:
+        """
+        :return: User agents and their counts, most frequent first
+        """
+        return self.top()
+
+
+@dataclasses.dataclass
+class DistinctCountReport:
+    """
+    Distinct values of a field for each value of another one, like the sources that hit each destination port (scans)
+    or the destinations each host talked to (spread), on fixed memory per key (see suricatalog.sketch.HyperLogLog).
+    Pass factory=functools.partial(DistinctCountReport, key_field=..., value_field=..., precision=...) to
+    EveLogHandler.aggregate()
+    """
+    event_types: ClassVar[tuple[str, ...]] = ('flow',)
+    key_field: str = 'dest_port'
+    value_field: str = 'src_ip'
+    precision: int = DEFAULT_PRECISION
+    counters: dict[Any, HyperLogLog] = dataclasses.field(default_factory=dict)
+
+    def __post_init__(self):
+        """
+        :raise ValueError: Invalid precision
+        """
+        HyperLogLog(self.precision)
+        self.key_path = tuple(self.key_field.split('.'))
+        self.value_path = tuple(self.value_field.split('.'))
+
+    @property
+    def fields(self) -> tuple[str, ...]:
+        """
+        :return: Key and value fields
+        """
+        return self.key_field, self.value_field
+
+    async def ingest_data(self, data: dict[Any, Any]) -> None:
+        """
+        jq -s 'map(select(.event_type=="flow"))|group_by(.dest_port)|map({key:"\\(.[0].dest_port)",value:(map(.src_ip)|unique|length)})|from_entries'
+        :param data:
+        :return:
+        """
+        self.ingest_batch((data,))
+
+    def ingest_batch(self, events: Iterable[dict[Any, Any]]) -> None:
+        """
+        Count the distinct values of a batch of events, see ingest_data(). Each value is hashed once per batch
+        :param events:
+        :return:
+        """
+        key_path = self.key_path
+        value_path = self.value_path
+        pairs = set()
+        for data in events:
+            if data.get('event_type') == 'flow':
+                key = field_value(data, key_path)
+                value = field_value(data, value_path)
+                if key is not None and value is not None:
+                    pairs.add((key, value))
+        hashes: dict[Any, int] = {}
+        per_key: dict[Any, list[int]] = {}
+        for key, value in pairs:
+            hashed = hashes.get(value)
+            if hashed is None:
+                hashed = hashes[value] = hash64(value)
+            per_key.setdefault(key, []).append(hashed)
+        counters = self.counters
+        for key, key_hashes in per_key.items():
+            counter = counters.get(key)
+            if counter is None:
+                counter = counters[key] = HyperLogLog(self.precision)
+            counter.add_hashes(key_hashes)
+
+    def top(self, limit: int | None = None) -> list[tuple[Any, int, float]]:
+        """
+        :param limit: Maximum number of keys, None for all of them
+        :return: Keys, their estimated number of distinct values and its relative standard error, largest first
+        """
+        counts = [(key, counter.count(), counter.error) for key, counter in self.counters.items()]
+        if limit is None:
+            return sorted(counts, key=lambda item: item[1], reverse=True)
+        return heapq.nlargest(limit, counts, key=lambda item: item[1])
+
+    def merge(self, other: Self) -> Self:
+        """
+        Add the values counted by another report, of the same fields and precision
+        :param other:
+        :return: This report
+        :raise ValueError: The precisions are not the same
+        """
+        counters = self.counters
+        for key, counter in other.counters.items():
+            if key in counters:
+                counters[key].merge(counter)
+            else:
+                counters[key] = HyperLogLog(self.precision).merge(counter)
+        return self
+
+    def to_state(self) -> dict[str, Any]:
+        """
+        Serializable state of the report
+        :return:
+        """
+        return {
+            'key_field': self.key_field,
+            'value_field': self.value_field,
+            'precision': self.precision,
+            'counters': [[key, counter.to_state()] for key, counter in self.counters.items()]
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> Self:
+        """
+        Rebuild a report from its serialized state
+        :param state:
+        :return:
+        """
+        return cls(
+            key_field=state['key_field'],
+            value_field=state['value_field'],
+            precision=state['precision'],
+            counters={key: HyperLogLog.from_state(counter) for key, counter in state['counters']}
+        )
+
+    @classmethod
+    def from_checkpoint(cls, state: dict[str, Any], key_field: str, value_field: str, precision: int) -> Self:
+        """
+        Resume a report saved on a checkpoint
+        :param state: State saved on the checkpoint
+        :param key_field: It must be the saved one
+        :param value_field: It must be the saved one
+        :param precision: It must be the saved one, estimators of different precisions can't be merged
+        :return:
+        :raise ValueError: The checkpoint counts other fields, or with another precision
+        """
+        report = cls.from_state(state)
+        if (report.key_field, report.value_field) != (key_field, value_field):
+            raise ValueError(
+                f"Checkpoint counts distinct {report.value_field} per {report.key_field}, not {value_field} per"
+                f" {key_field}. Use another checkpoint file"
+            )
+        if report.precision != precision:
+            raise ValueError(
+                f"Checkpoint was saved with precision {report.precision}, not {precision}. Use the same precision or"
+                f" another checkpoint file"
+            )
+        return report
+
+
+@dataclasses.dataclass
+class IocReport:
+    """
+    Events with indicators of compromise, counted per indicator and per field
+    """
+    fields: ClassVar[tuple[str, ...]] = DEFAULT_IOC_FIELDS
+    event_types: ClassVar[tuple[str, ...] | None] = None
+    matcher: IocMatcher
+    hits: dict[str, int] = dataclasses.field(default_factory=dict)
+    field_hits: dict[str, int] = dataclasses.field(default_factory=dict)
+
+    async def ingest_data(self, data: dict[Any, Any]) -> None:
+        """
+        grep -F -f indicators.txt eve.json, but only on the fields that matter and counting what matched
+        :param data:
+        :return:
+        """
+        self.ingest_batch((data,))
+
+    def ingest_batch(self, events: Iterable[dict[Any, Any]]) -> None:
+        """
+        Count the indicators found on a batch of events. An indicator counts once per event
+        :param events:
+        :return:
+        """
+        find = self.matcher.find
+        indicators = self.matcher.indicators
+        paths = [(field, tuple(field.split('.'))) for field in self.fields]
+        for data in events:
+            found: set[int] = set()
+            for field, path in paths:
+                value = field_value(data, path)
+                if value.__class__ is str and (matches := find(value.lower())):
+                    self.field_hits[field] = self.field_hits.get(field, 0) + 1
+                    found |= matches
+            for idx in found:
+                indicator = indicators[idx]
+                self.hits[indicator] = self.hits.get(indicator, 0) + 1
+
+    def merge(self, other: Self) -> Self:
+        """
+        Add the hits counted by another report, with the same indicators
+        :param other:
+        :return: This report
+        """
+        merge_counts(self.hits, other.hits)
+        merge_counts(self.field_hits, other.field_hits)
+        return self
+
+    def to_state(self) -> dict[str, Any]:
+        """
+        Serializable state of the report, without the indicators
+        :return:
+        """
+        return {'hits': dict(self.hits), 'field_hits': dict(self.field_hits)}
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any], matcher: IocMatcher) -> Self:
+        """
+        Rebuild a report from its serialized state
+        :param state:
+        :param matcher: Same indicators the state was counted with
+        :return:
+        """
+        return cls(matcher=matcher, hits=dict(state['hits']), field_hits=dict(state['field_hits']))
@@ -0,0 +1,36 @@
+"""
+Helpers shared by the command line scripts
+"""
+import argparse
+
+
+def positive_int(candidate: str) -> int:
+    """
+    Argument type for counts that must be at least 1, like --workers
+    :param candidate:
+    :return:
+    :raise argparse.ArgumentTypeError: Not a number, or not positive. Reported by argparse as a usage error
+    """
+    try:
+        value = int(candidate)
+    except ValueError as ve:
+        raise argparse.ArgumentTypeError(f"invalid number: {candidate!r}") from ve
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value}")
+    return value
+
+
+def probability(candidate: str) -> float:
+    """
+    Argument type for rates that must be strictly between 0 and 1, like --dedup_error_rate
+    :param candidate:
+    :return:
+    :raise argparse.ArgumentTypeError: Not a number, or out of range. Reported by argparse as a usage error
+    """
+    try:
+        value = float(candidate)
+    except ValueError as ve:
+        raise argparse.ArgumentTypeError(f"invalid number: {candidate!r}") from ve
+    if not 0 < value < 1:
+        raise argparse.ArgumentTypeError(f"must be between 0 and 1: {value}")
+    return value
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Convert eve files into the columnar cache used by eve_json and eve_log.
+Files that didn't change since they were cached are skipped.
+"""
+import argparse
+import locale
+import logging
+from pathlib import Path
+
+from suricatalog.cache import DEFAULT_CACHE_DIR, EveCache
+from suricatalog.log import DEFAULT_EVE_JSON, MalformedLines
+
+locale.setlocale(locale.LC_ALL, '')
+
+
+def main():
+    """
+    CLI entry point
+    :return:
+    """
+    fmt = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(lineno)d - %(message)s")
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(fmt)
+    logger = logging.getLogger(__name__)
+    logger.addHandler(log_handler)
+    logger.setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory of the cache. Default: {DEFAULT_CACHE_DIR}"
+    )
+    parser.add_argument(
+        "--force",
+        action='store_true',
+        default=False,
+        help="Rebuild the cache of the files even if they didn't change"
+    )
+    parser.add_argument(
+        "--quarantine",
+        type=Path,
+        help="Append the lines that are not valid JSON to this file"
+    )
+    parser.add_argument(
+        'eve_file',
+        type=Path,
+        nargs="+",
+        help=f"Path to one or more {DEFAULT_EVE_JSON[0]} file to cache. May be compressed with gzip, bzip2, xz or zstd."
+    )
+    options = parser.parse_args()
+    cache = EveCache(options.cache_dir)
+    malformed = MalformedLines(logger, options.quarantine)
+    try:
+        for eve_file in options.eve_file:
+            try:
+                entry = None if options.force else cache.lookup(eve_file)
+                if entry:
+                    logger.info("'%s' didn't change, already cached on %s", eve_file, entry.directory)
+                    continue
+                entry = cache.build(eve_file, malformed)
+                size = sum(segment.stat().st_size for segment in entry.directory.iterdir())
+                logger.info(
+                    "Cached %s events of '%s' in %d segments, %s bytes (from %s bytes)",
+                    f"{entry.manifest['events']:n}",
+                    eve_file,
+                    len(entry.manifest['segments']),
+                    f"{size:n}",
+                    f"{entry.manifest['size']:n}"
+                )
+            except OSError:
+                logger.exception("I cannot cache file '%s'. Ignoring it.", eve_file)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        malformed.summary()
+
+
+if __name__ == "__main__":
+    """
+    Entry level CLI
+    """
+    main()
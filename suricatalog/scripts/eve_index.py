@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Load eve files into a SQLite index, then optionally search it.
+Only data not loaded on a previous run is parsed. Matching events are printed as JSON lines:
+
+eve_index --src_ip 10.2.8.102 --event_type dns eve.json eve.json.1.gz
+"""
+import argparse
+import locale
+import logging
+import os
+import sys
+from pathlib import Path
+
+import orjson
+
+from suricatalog.filter import TimestampFilter
+from suricatalog.index import DEFAULT_INDEX_FILE, EveIndex
+from suricatalog.log import DEFAULT_EVE_JSON, MalformedLines
+from suricatalog.time import DEFAULT_TIMESTAMP_10Y_AGO, parse_timestamp
+
+locale.setlocale(locale.LC_ALL, '')
+
+
+def main():
+    """
+    CLI entry point
+    :return:
+    """
+    fmt = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(lineno)d - %(message)s")
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(fmt)
+    logger = logging.getLogger(__name__)
+    logger.addHandler(log_handler)
+    logger.setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        default=DEFAULT_INDEX_FILE,
+        help=f"SQLite index file. Default: {DEFAULT_INDEX_FILE}"
+    )
+    parser.add_argument(
+        "--timestamp",
+        type=parse_timestamp,
+        help=f"Only show events newer than this timestamp (like {DEFAULT_TIMESTAMP_10Y_AGO})"
+    )
+    parser.add_argument("--event_type", action='append', help="Only show events of this type. Can be repeated")
+    parser.add_argument("--src_ip", action='append', help="Only show events from this IP address. Can be repeated")
+    parser.add_argument("--dest_ip", action='append', help="Only show events to this IP address. Can be repeated")
+    parser.add_argument("--flow_id", type=int, action='append', help="Only show events of this flow. Can be repeated")
+    parser.add_argument(
+        "--signature_id",
+        type=int,
+        action='append',
+        help="Only show alerts with this signature id. Can be repeated"
+    )
+    parser.add_argument("--limit", type=int, help="Show at most this many events")
+    parser.add_argument(
+        "--quarantine",
+        type=Path,
+        help="Append the lines that are not valid JSON to this file"
+    )
+    parser.add_argument(
+        'eve_file',
+        type=Path,
+        nargs="+",
+        help=f"Path to one or more {DEFAULT_EVE_JSON[0]} file to load. May be compressed with gzip, bzip2, xz or zstd."
+    )
+    options = parser.parse_args()
+    eve_index = EveIndex(options.index)
+    malformed = MalformedLines(logger, options.quarantine)
+    identities = []
+    try:
+        for eve_file in options.eve_file:
+            try:
+                added = eve_index.update(eve_file, malformed)
+                stat = os.stat(eve_file)
+                identities.append(f"{stat.st_dev}:{stat.st_ino}")
+                logger.info("Added %s events of '%s' to %s", f"{added:n}", eve_file, options.index)
+            except OSError:
+                logger.exception("I cannot use file '%s'. Ignoring it.", eve_file)
+        conditions = {
+            column: getattr(options, column)
+            for column in ('event_type', 'src_ip', 'dest_ip', 'flow_id', 'signature_id')
+            if getattr(options, column)
+        }
+        if not conditions and not options.timestamp:
+            return
+        data_filter = None
+        if options.timestamp:
+            data_filter = TimestampFilter()
+            data_filter.timestamp = options.timestamp
+        for event in eve_index.search(
+                identities=identities,
+                data_filter=data_filter,
+                limit=options.limit,
+                **conditions
+        ):
+            sys.stdout.buffer.write(orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE))
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        malformed.summary()
+
+
+if __name__ == "__main__":
+    """
+    Entry level CLI
+    """
+    main()
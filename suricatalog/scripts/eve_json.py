@@ -6,27 +6,52 @@ This script is inspired by the examples provided on
 A few things:
 * The output uses colorized/ scrollable JSON
 * You can filter by timestamp
+* You can filter with an expression, like --where 'event_type == "alert" and alert.severity <= 2'
 
 """
 
 import argparse
+import inspect
 import sys
-from ipaddress import ip_address
+from datetime import timedelta
 from pathlib import Path
 
+from suricatalog.cache import DEFAULT_CACHE_DIR, EveCache
 from suricatalog.canned import (
     get_agents,
     get_capture,
+    get_distinct,
     get_host_data_use,
     get_one_shot_flow_table,
+    get_top_values,
 )
+from suricatalog.checkpoint import DEFAULT_CHECKPOINT_FILE, Checkpoint, CheckpointStore
+from suricatalog.dedup import DEFAULT_CAPACITY, DEFAULT_ERROR_RATE, Deduplicator
+from suricatalog.domains import DEFAULT_DOMAIN_FIELDS, DomainSet
+from suricatalog.expression import ExpressionError, compile_expression
 from suricatalog.filter import (
     AlwaysTrueFilter,
+    BaseFilter,
+    DomainFilter,
+    ExpressionFilter,
+    IocFilter,
     NXDomainFilter,
     TimestampFilter,
     WithPrintablePayloadFilter,
 )
-from suricatalog.log import DEFAULT_EVE_JSON
+from suricatalog.index import DEFAULT_INDEX_FILE, EveIndex
+from suricatalog.ioc import DEFAULT_IOC_FIELDS, IocMatcher
+from suricatalog.ipset import IpSet
+from suricatalog.log import DEFAULT_EVE_JSON, DEFAULT_SEEK_SLACK, EveLogHandler
+from suricatalog.report import DISTINCT_REPORTS, TOP_VALUE_FIELDS
+from suricatalog.scripts import positive_int, probability
+from suricatalog.sketch import (
+    DEFAULT_COUNTERS,
+    DEFAULT_PRECISION,
+    MAX_PRECISION,
+    MIN_PRECISION,
+)
+from suricatalog.stream import is_unix_source, unix_socket_path
 from suricatalog.time import DEFAULT_TIMESTAMP_10Y_AGO, parse_timestamp
 
 ALWAYS_TRUE = AlwaysTrueFilter()
@@ -47,6 +72,123 @@ def main():
         default=DEFAULT_TIMESTAMP_10Y_AGO,
         help=f"Minimum timestamp in the past to use when filtering events ({DEFAULT_TIMESTAMP_10Y_AGO})"
     )
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=1,
+        help="Number of processes used to parse each eve file. Default: 1 (no extra processes)"
+    )
+    parser.add_argument(
+        "--unordered",
+        action='store_true',
+        default=False,
+        help="With more than one worker, show events as soon as they are parsed instead of in file order"
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=(
+            "Read the eve files cached by eve_cache on this directory, if they didn't change and only you can write on it."
+            " Cached events come grouped by day and event type, not in file order (--no_cache for file order)."
+            f" Default: {DEFAULT_CACHE_DIR}"
+        )
+    )
+    parser.add_argument(
+        "--no_cache",
+        action='store_true',
+        default=False,
+        help="Always parse the eve files, even if they are cached"
+    )
+    parser.add_argument(
+        "--merge",
+        action='store_true',
+        default=False,
+        help="Interleave the events of all the eve files in timestamp order, instead of one file after the other"
+    )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        nargs='?',
+        const=DEFAULT_INDEX_FILE,
+        help=f"Query the events from a SQLite index, loading any new data first (see eve_index). Default file: {DEFAULT_INDEX_FILE}"
+    )
+    parser.add_argument(
+        "--mmap",
+        action='store_true',
+        default=False,
+        help="Memory map uncompressed eve files, faster. Do not use on files rotated with copytruncate"
+    )
+    parser.add_argument(
+        "--quarantine",
+        type=Path,
+        help="Append the lines that are not valid JSON to this file, instead of only counting them"
+    )
+    parser.add_argument(
+        "--dedup",
+        action='store_true',
+        default=False,
+        help="Drop the events seen more than once, like the same alert on a rotated file and its copy"
+    )
+    parser.add_argument(
+        "--dedup_capacity",
+        type=positive_int,
+        default=DEFAULT_CAPACITY,
+        help=f"Number of distinct events expected by --dedup, memory is fixed by it. Default: {DEFAULT_CAPACITY:,}"
+    )
+    parser.add_argument(
+        "--dedup_error_rate",
+        type=probability,
+        default=DEFAULT_ERROR_RATE,
+        help=f"Chance of --dedup dropping an event seen only once. Default: {DEFAULT_ERROR_RATE}"
+    )
+    parser.add_argument(
+        "--seek_slack",
+        type=float,
+        default=DEFAULT_SEEK_SLACK.total_seconds(),
+        help=(
+            "Seconds events may be written out of order, used to jump straight to the events newer than the"
+            f" timestamp. Negative value reads the files from the start. Default: {DEFAULT_SEEK_SLACK.total_seconds()}"
+        )
+    )
+    parser.add_argument(
+        "--where",
+        type=str,
+        help=inspect.cleandoc("""
+        Only use the events matching an expression, on top of the other filters. Dotted field paths, constants,
+        ==, !=, <, <=, >, >=, in, not in, and, or, not. Like: 'event_type == "alert" and dest_port in {443, 8443}'.
+        Without a report flag the matching events are shown""")
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        nargs='?',
+        const=DEFAULT_CHECKPOINT_FILE,
+        help=inspect.cleandoc(f"""
+        Keep the --flow, --netflow, --useragent, --top and --distinct reports in a checkpoint file, together with how much of each
+        eve file was read. Next runs only read the new data. Each --timestamp and --where keeps its own checkpoint.
+        Default file: {DEFAULT_CHECKPOINT_FILE}""")
+    )
+    parser.add_argument(
+        "--top_counters",
+        type=int,
+        default=DEFAULT_COUNTERS,
+        help=(
+            "Memory budget of --top and --useragent, number of distinct values counted at most. Beyond that counts"
+            f" are approximate, with the error bound shown. 0 counts every value exactly. Default: {DEFAULT_COUNTERS:,}"
+        )
+    )
+    parser.add_argument(
+        "--distinct_precision",
+        type=int,
+        default=DEFAULT_PRECISION,
+        choices=range(MIN_PRECISION, MAX_PRECISION + 1),
+        metavar=f"{{{MIN_PRECISION}..{MAX_PRECISION}}}",
+        help=(
+            "Memory of --distinct, at most 2 ** precision bytes per key, for a standard error of"
+            f" 1.04 / sqrt(2 ** precision). Default: {DEFAULT_PRECISION}"
+        )
+    )
     exclusive_flags = parser.add_mutually_exclusive_group()
     exclusive_flags.add_argument(
         "--nxdomain",
@@ -68,9 +210,28 @@ def main():
     )
     exclusive_flags.add_argument(
         "--netflow",
-        type=ip_address,
+        type=str,
         action='store',
-        help="Get the netflow for a given IP address"
+        help=(
+            "Get the netflow for a given IP address, comma separated networks (10.0.0.0/8,2001:db8::/32) or a file"
+            " with one network per line"
+        )
+    )
+    exclusive_flags.add_argument(
+        "--ioc",
+        type=Path,
+        help=(
+            f"Show the events with any of the indicators of a file (one per line) on {', '.join(DEFAULT_IOC_FIELDS)}."
+            " The compiled indicators are kept on --cache_dir"
+        )
+    )
+    exclusive_flags.add_argument(
+        "--domains",
+        type=Path,
+        help=(
+            f"Show the events with {', '.join(DEFAULT_DOMAIN_FIELDS)} on, or under, any of the domains of a file (one"
+            " per line, hosts files work too)"
+        )
     )
     exclusive_flags.add_argument(
         "--useragent",
@@ -78,43 +239,169 @@ def main():
         default=False,
         help="Top user agent in HTTP traffic"
     )
+    exclusive_flags.add_argument(
+        "--distinct",
+        choices=DISTINCT_REPORTS,
+        help=(
+            "Distinct values per key on flow events, on fixed memory: "
+            + ', '.join(f"{name} (distinct {value} per {key})" for name, (key, value) in DISTINCT_REPORTS.items())
+        )
+    )
+    exclusive_flags.add_argument(
+        "--top",
+        choices=TOP_VALUE_FIELDS,
+        help=f"Most frequent values of a field: {', '.join(f'{name} ({field})' for name, field in TOP_VALUE_FIELDS.items())}"
+    )
     parser.add_argument(
         'eve_file',
         type=Path,
         nargs="+",
-        help=f"Path to one or more {DEFAULT_EVE_JSON[0]} file to parse."
+        help=(
+            f"Path to one or more {DEFAULT_EVE_JSON[0]} file to parse. May be compressed with gzip, bzip2, xz or zstd."
+            " The reports need the end of the data, to read a unix socket (unix:///var/run/suricata/eve.sock) use eve_log"
+        )
     )
     options = parser.parse_args()
+    unix_sources = [str(unix_socket_path(eve_file)) for eve_file in options.eve_file if is_unix_source(eve_file)]
+    if unix_sources:
+        parser.error(f"a unix socket never ends, the reports can't read it (use eve_log): {', '.join(unix_sources)}")
     timestamp_filter = TimestampFilter()
     timestamp_filter.timestamp = options.timestamp
+    try:
+        where = compile_expression(options.where) if options.where else None
+    except ExpressionError as ee:
+        parser.error(str(ee))
+
+    def matching(data_filter: BaseFilter) -> BaseFilter:
+        return ExpressionFilter(options.where, data_filter, compiled=where) if where else data_filter
+
+    def load_checkpoint(name: str, timestamp_bound: bool = True) -> Checkpoint | None:
+        # Anything that changes the events of a report is part of its checkpoint name
+        if not checkpoints:
+            return None
+        if timestamp_bound and options.timestamp != DEFAULT_TIMESTAMP_10Y_AGO:
+            name = f"{name}-since-{options.timestamp.isoformat()}"
+        if where:
+            name = f"{name}-where-{options.where}"
+        try:
+            return checkpoints.load(name)
+        except ValueError as ve:
+            parser.error(f"--checkpoint: {ve}")
+
+    eve_lh = EveLogHandler(
+        workers=options.workers,
+        ordered=not options.unordered,
+        seek_slack=timedelta(seconds=options.seek_slack) if options.seek_slack >= 0 else None,
+        use_mmap=options.mmap,
+        cache=None if options.no_cache else EveCache(options.cache_dir),
+        index=EveIndex(options.index) if options.index else None,
+        merge=options.merge,
+        quarantine_file=options.quarantine,
+        dedup=Deduplicator(options.dedup_capacity, options.dedup_error_rate) if options.dedup else None
+    )
+    checkpoints = CheckpointStore(options.checkpoint) if options.checkpoint else None
+    if options.top_counters < 0:
+        parser.error(f"--top_counters: invalid number of counters: {options.top_counters}")
+    counters = options.top_counters if options.top_counters else None
     try:
         if options.nxdomain:
             eve_app = get_capture(
                 eve=options.eve_file,
-                data_filter=NXDomainFilter(),
-                title="SuricataLog DNS records with NXDOMAIN"
+                data_filter=matching(NXDomainFilter()),
+                title="SuricataLog DNS records with NXDOMAIN",
+                eve_lh=eve_lh
             )
         elif options.payload:
             eve_app = get_capture(
                 eve=options.eve_file,
-                data_filter=WithPrintablePayloadFilter(),
-                title="SuricataLog Inspect Alert Data (payload)"
+                data_filter=matching(WithPrintablePayloadFilter()),
+                title="SuricataLog Inspect Alert Data (payload)",
+                eve_lh=eve_lh
             )
         elif options.flow:
             eve_app = get_one_shot_flow_table(
                 eve=options.eve_file,
-                data_filter=ALWAYS_TRUE
+                data_filter=matching(ALWAYS_TRUE),
+                eve_lh=eve_lh,
+                checkpoint=load_checkpoint("flow", timestamp_bound=False)
             )
         elif options.netflow:
+            try:
+                networks = IpSet.parse(options.netflow)
+            except (ValueError, OSError) as err:
+                parser.error(f"--netflow: {err}")
             eve_app = get_host_data_use(
                 eve_files=options.eve_file,
-                data_filter=timestamp_filter,
-                ip_address=options.netflow.exploded
+                data_filter=matching(timestamp_filter),
+                ip_address=networks,
+                eve_lh=eve_lh,
+                checkpoint=load_checkpoint(f"netflow-{options.netflow}")
             )
         elif options.useragent:
-            eve_app = get_agents(
-                eve_files=options.eve_file,
-                data_filter=timestamp_filter
+            try:
+                eve_app = get_agents(
+                    eve_files=options.eve_file,
+                    data_filter=matching(timestamp_filter),
+                    eve_lh=eve_lh,
+                    checkpoint=load_checkpoint("useragent"),
+                    counters=counters
+                )
+            except ValueError as ve:
+                parser.error(f"--checkpoint: {ve}")
+        elif options.top:
+            try:
+                eve_app = get_top_values(
+                    eve_files=options.eve_file,
+                    data_filter=matching(timestamp_filter),
+                    field=TOP_VALUE_FIELDS[options.top],
+                    counters=counters,
+                    eve_lh=eve_lh,
+                    checkpoint=load_checkpoint(f"top-{options.top}")
+                )
+            except ValueError as ve:
+                parser.error(f"--checkpoint: {ve}")
+        elif options.distinct:
+            key_field, value_field = DISTINCT_REPORTS[options.distinct]
+            try:
+                eve_app = get_distinct(
+                    eve_files=options.eve_file,
+                    data_filter=matching(timestamp_filter),
+                    key_field=key_field,
+                    value_field=value_field,
+                    precision=options.distinct_precision,
+                    eve_lh=eve_lh,
+                    checkpoint=load_checkpoint(f"distinct-{options.distinct}")
+                )
+            except ValueError as ve:
+                parser.error(f"--checkpoint: {ve}")
+        elif options.ioc:
+            try:
+                matcher = IocMatcher.from_file(options.ioc, cache_dir=options.cache_dir, logger=eve_lh.logger)
+            except (OSError, UnicodeDecodeError) as err:
+                parser.error(f"--ioc: {err}")
+            eve_app = get_capture(
+                eve=options.eve_file,
+                data_filter=matching(IocFilter(matcher)),
+                title=f"SuricataLog events with {len(matcher):,} indicators from {options.ioc}",
+                eve_lh=eve_lh
+            )
+        elif options.domains:
+            try:
+                domains = DomainSet.from_file(options.domains)
+            except (OSError, UnicodeDecodeError) as err:
+                parser.error(f"--domains: {err}")
+            eve_app = get_capture(
+                eve=options.eve_file,
+                data_filter=matching(DomainFilter(domains)),
+                title=f"SuricataLog events under {len(domains):,} domains from {options.domains}",
+                eve_lh=eve_lh
+            )
+        elif where:
+            eve_app = get_capture(
+                eve=options.eve_file,
+                data_filter=matching(timestamp_filter),
+                title=f"SuricataLog events where {options.where}",
+                eve_lh=eve_lh
             )
         else:
             parser.print_usage()
@@ -4,11 +4,18 @@ Show Suricata alerts in different formats
 Author: Jose Vicente Nunez (kodegeek.com@protonmail.com)
 """
 import argparse
+from datetime import timedelta
 from pathlib import Path
 
 from suricatalog.alert_apps import TableAlertApp
-from suricatalog.filter import BaseFilter, OnlyAlertsFilter
-from suricatalog.log import DEFAULT_EVE_JSON
+from suricatalog.cache import DEFAULT_CACHE_DIR, EveCache
+from suricatalog.dedup import DEFAULT_CAPACITY, DEFAULT_ERROR_RATE, Deduplicator
+from suricatalog.expression import ExpressionError
+from suricatalog.filter import BaseFilter, ExpressionFilter, OnlyAlertsFilter
+from suricatalog.index import DEFAULT_INDEX_FILE, EveIndex
+from suricatalog.log import DEFAULT_EVE_JSON, DEFAULT_SEEK_SLACK, EveLogHandler
+from suricatalog.scripts import positive_int, probability
+from suricatalog.stream import DEFAULT_QUEUE_SIZE, OVERFLOW_POLICIES
 from suricatalog.time import DEFAULT_TIMESTAMP_10Y_AGO, parse_timestamp
 
 
@@ -27,20 +34,145 @@ def main():
         default=DEFAULT_TIMESTAMP_10Y_AGO,
         help=f"Minimum timestamp in the past to use when filtering events ({DEFAULT_TIMESTAMP_10Y_AGO})"
     )
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=1,
+        help="Number of processes used to parse each eve file. Default: 1 (no extra processes)"
+    )
+    parser.add_argument(
+        "--unordered",
+        action='store_true',
+        default=False,
+        help="With more than one worker, show events as soon as they are parsed instead of in file order"
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=(
+            "Read the eve files cached by eve_cache on this directory, if they didn't change and only you can write on it."
+            " Cached events come grouped by day and event type, not in file order (--no_cache for file order)."
+            f" Default: {DEFAULT_CACHE_DIR}"
+        )
+    )
+    parser.add_argument(
+        "--no_cache",
+        action='store_true',
+        default=False,
+        help="Always parse the eve files, even if they are cached"
+    )
+    parser.add_argument(
+        "--merge",
+        action='store_true',
+        default=False,
+        help="Interleave the events of all the eve files in timestamp order, instead of one file after the other"
+    )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        nargs='?',
+        const=DEFAULT_INDEX_FILE,
+        help=f"Query the events from a SQLite index, loading any new data first (see eve_index). Default file: {DEFAULT_INDEX_FILE}"
+    )
+    parser.add_argument(
+        "--mmap",
+        action='store_true',
+        default=False,
+        help="Memory map uncompressed eve files, faster. Do not use on files rotated with copytruncate"
+    )
+    parser.add_argument(
+        "--quarantine",
+        type=Path,
+        help="Append the lines that are not valid JSON to this file, instead of only counting them"
+    )
+    parser.add_argument(
+        "--dedup",
+        action='store_true',
+        default=False,
+        help="Drop the events seen more than once, like the same alert on a rotated file and its copy"
+    )
+    parser.add_argument(
+        "--dedup_capacity",
+        type=positive_int,
+        default=DEFAULT_CAPACITY,
+        help=f"Number of distinct events expected by --dedup, memory is fixed by it. Default: {DEFAULT_CAPACITY:,}"
+    )
+    parser.add_argument(
+        "--dedup_error_rate",
+        type=probability,
+        default=DEFAULT_ERROR_RATE,
+        help=f"Chance of --dedup dropping an event seen only once. Default: {DEFAULT_ERROR_RATE}"
+    )
+    parser.add_argument(
+        "--stream_overflow",
+        choices=OVERFLOW_POLICIES,
+        default='drop',
+        help="When reading a unix socket falls behind, drop the lines that don't fit or sample them. Default: drop"
+    )
+    parser.add_argument(
+        "--stream_queue",
+        type=positive_int,
+        default=DEFAULT_QUEUE_SIZE,
+        help=f"Chunks of lines received on a unix socket that can wait to be parsed. Default: {DEFAULT_QUEUE_SIZE}"
+    )
+    parser.add_argument(
+        "--seek_slack",
+        type=float,
+        default=DEFAULT_SEEK_SLACK.total_seconds(),
+        help=(
+            "Seconds events may be written out of order, used to jump straight to the events newer than the"
+            f" timestamp. Negative value reads the files from the start. Default: {DEFAULT_SEEK_SLACK.total_seconds()}"
+        )
+    )
+    parser.add_argument(
+        "--where",
+        type=str,
+        help="Only show the alerts matching an expression, like 'alert.severity <= 2 and dest_port in {443, 8443}'"
+    )
+    parser.add_argument(
+        "--follow",
+        action='store_true',
+        default=False,
+        help="Keep showing new alerts as they get written to the last eve file, like 'tail -F'"
+    )
     parser.add_argument(
         'eve_file',
         type=Path,
         nargs="+",
-        help=f"Path to one or more {DEFAULT_EVE_JSON[0]} file to parse."
+        help=f"Path to one or more {DEFAULT_EVE_JSON[0]} file to parse. May be compressed with gzip, bzip2, xz or zstd, or a unix socket"
+             " for Suricata's unix_stream output, like unix:///var/run/suricata/eve.sock, shown until the app exits"
     )
     options = parser.parse_args()
     timestamp_filter: BaseFilter = OnlyAlertsFilter()
     timestamp_filter.timestamp = options.timestamp
+    alert_filter = timestamp_filter
+    description = f">={options.timestamp}"
+    if options.where:
+        try:
+            alert_filter = ExpressionFilter(options.where, timestamp_filter)
+        except ExpressionError as ee:
+            parser.error(str(ee))
+        description += f" and {options.where}"
     try:
         app = TableAlertApp()
-        app.title = f"SuricataLog Alerts (filter='>={options.timestamp}') for {','.join([eve.name for eve in options.eve_file])}"
-        app.set_filter(timestamp_filter)
+        app.title = f"SuricataLog Alerts (filter='{description}') for {','.join([eve.name for eve in options.eve_file])}"
+        app.set_filter(alert_filter)
         app.set_eve_files(options.eve_file)
+        app.set_eve_log_handler(EveLogHandler(
+            workers=options.workers,
+            ordered=not options.unordered,
+            follow=options.follow,
+            seek_slack=timedelta(seconds=options.seek_slack) if options.seek_slack >= 0 else None,
+            use_mmap=options.mmap,
+            cache=None if options.no_cache else EveCache(options.cache_dir),
+            index=EveIndex(options.index) if options.index else None,
+            merge=options.merge,
+            quarantine_file=options.quarantine,
+            dedup=Deduplicator(options.dedup_capacity, options.dedup_error_rate) if options.dedup else None,
+            stream_queue_size=options.stream_queue,
+            stream_overflow=options.stream_overflow
+        ))
         app.run()
     except KeyboardInterrupt:
         pass
@@ -29,7 +29,7 @@ def main():
         'eve_file',
         type=Path,
         nargs="+",
-        help=f"Path to one or more {DEFAULT_EVE_JSON[0]} file to parse."
+        help=f"Path to one or more {DEFAULT_EVE_JSON[0]} file to parse. May be compressed with gzip, bzip2, xz or zstd."
     )
     options = parser.parse_args()
     try:
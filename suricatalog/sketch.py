@@ -0,0 +1,285 @@
+"""
+Most frequent values of a field (heavy hitters) on bounded memory, for top N reports over fields with no limit on
+their distinct values, like user agents randomized by scanners.
+
+HeavyHitters is a Misra-Gries summary, the mergeable twin of Space-Saving, with at most 'capacity' counters. Once there
+are more distinct values than counters, the (capacity + 1)-th largest count is subtracted from all of them and the ones
+that reach zero are dropped. Counts become lower bounds: each value was seen between count and count + error times,
+with error <= total / (capacity + 1), and any value seen more often than error is still on the summary.
+Summaries are merged by adding their counters and dropping the smallest ones the same way, with the same guarantee
+(Agarwal et al., Mergeable Summaries), so files, workers and sensors can be counted apart.
+While there are no more distinct values than counters, the counts are exact. The error is kept as the sum of what was
+subtracted, so it stays a bound when the budget of a saved summary is changed with resize().
+
+HyperLogLog counts distinct values, like the sources that hit a port, on at most 2 ** precision bytes: the values are
+hashed and each register keeps the longest run of leading zeros seen on the hashes that land on it. The relative
+standard error is 1.04 / sqrt(2 ** precision), 1.6% with the default precision. Small sets are kept exactly, as the
+hashes themselves, until they would take half the size of the registers. Registers are merged with max(), and the hash
+is not salted per process like hash(), so the counters of workers, runs and sensors can be merged.
+"""
+import base64
+import bisect
+import dataclasses
+import hashlib
+import heapq
+import math
+from array import array
+from collections.abc import Hashable, Iterable
+from typing import Any, Self
+
+DEFAULT_COUNTERS = 4096
+DEFAULT_PRECISION = 12
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+HASH_BITS = 64
+# Bias correction for the smallest numbers of registers, the formula in count() is only valid from 128 registers
+SMALL_ALPHA = {16: 0.673, 32: 0.697, 64: 0.709}
+
+
+def hash64(value: Hashable) -> int:
+    """
+    :param value: Value, compared by its text
+    :return: 64-bit hash, the same on every process and host
+    """
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'little')
+
+
+@dataclasses.dataclass
+class HeavyHitters:
+    """
+    Misra-Gries summary, see the module documentation
+    """
+    capacity: int | None = DEFAULT_COUNTERS
+    counts: dict[Hashable, int] = dataclasses.field(default_factory=dict)
+    total: int = 0
+    # How many more times than its count a value may have been seen, the sum of what was subtracted. 0 if exact
+    error: int = 0
+
+    def __post_init__(self):
+        """
+        :raise ValueError: Capacity is not positive. Use None to count every value exactly
+        """
+        self.resize(self.capacity)
+
+    def resize(self, capacity: int | None) -> None:
+        """
+        Change the memory budget. A smaller one drops the smallest counters right away, a larger one only keeps more
+        of the values counted from now on
+        :param capacity:
+        :return:
+        :raise ValueError: Capacity is not positive. Use None to count every value exactly
+        """
+        if capacity is not None and capacity < 1:
+            raise ValueError(f"Invalid number of counters: {capacity}")
+        self.capacity = capacity
+        self.__compact__()
+
+    def update(self, values: Iterable[Hashable]) -> None:
+        """
+        Count values
+        :param values:
+        :return:
+        """
+        counts: dict[Hashable, int] = {}
+        for value in values:
+            counts[value] = counts.get(value, 0) + 1
+        self.add_counts(counts)
+
+    def add_counts(self, counts: dict[Hashable, int]) -> None:
+        """
+        Add exact counts, like the ones of a batch of events
+        :param counts:
+        :return:
+        """
+        own = self.counts
+        for value, count in counts.items():
+            own[value] = own.get(value, 0) + count
+        self.total += sum(counts.values())
+        self.__compact__()
+
+    def merge(self, other: Self) -> Self:
+        """
+        Add the values counted by another summary. The capacity of this one is kept
+        :param other:
+        :return: This summary
+        """
+        own = self.counts
+        for value, count in other.counts.items():
+            own[value] = own.get(value, 0) + count
+        self.total += other.total
+        self.error += other.error
+        self.__compact__()
+        return self
+
+    def __compact__(self) -> None:
+        """
+        Keep at most capacity counters
+        """
+        if self.capacity is None or len(self.counts) <= self.capacity:
+            return
+        threshold = heapq.nlargest(self.capacity + 1, self.counts.values())[-1]
+        self.counts = {value: count - threshold for value, count in self.counts.items() if count > threshold}
+        self.error += threshold
+
+    def top(self, limit: int | None = None) -> list[tuple[Hashable, int]]:
+        """
+        :param limit: Maximum number of values, None for all of them
+        :return: Values and their counts, most frequent first
+        """
+        if limit is None:
+            return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return heapq.nlargest(limit, self.counts.items(), key=lambda item: item[1])
+
+    def to_state(self) -> dict[str, Any]:
+        """
+        Serializable state of the summary
+        :return:
+        """
+        return {
+            'capacity': self.capacity,
+            'counts': [[value, count] for value, count in self.counts.items()],
+            'total': self.total,
+            'error': self.error
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> Self:
+        """
+        Rebuild a summary from its serialized state
+        :param state:
+        :return:
+        """
+        counts = {value: count for value, count in state['counts']}
+        return cls(capacity=state['capacity'], counts=counts, total=state['total'], error=state['error'])
+
+
+@dataclasses.dataclass
+class HyperLogLog:
+    """
+    Distinct count estimator, see the module documentation
+    """
+    precision: int = DEFAULT_PRECISION
+    # Sorted, so estimators of the same values are equal whatever the order they were seen
+    hashes: array = dataclasses.field(default_factory=lambda: array('Q'))
+    registers: bytearray | None = None
+
+    def __post_init__(self):
+        """
+        :raise ValueError: Precision out of range
+        """
+        if not MIN_PRECISION <= self.precision <= MAX_PRECISION:
+            raise ValueError(f"Invalid precision {self.precision}, it must be between {MIN_PRECISION} and {MAX_PRECISION}")
+
+    @property
+    def sparse_limit(self) -> int:
+        """
+        :return: Number of hashes kept exactly, before switching to registers
+        """
+        return (1 << self.precision) // 16
+
+    def update(self, values: Iterable[Hashable]) -> None:
+        """
+        Count values
+        :param values:
+        :return:
+        """
+        self.add_hashes(hash64(value) for value in values)
+
+    def add_hashes(self, hashes: Iterable[int]) -> None:
+        """
+        Count values already hashed with hash64()
+        :param hashes:
+        :return:
+        """
+        hashes = iter(hashes)
+        registers = self.registers
+        if registers is None:
+            own = self.hashes
+            for hashed in hashes:
+                idx = bisect.bisect_left(own, hashed)
+                if idx == len(own) or own[idx] != hashed:
+                    own.insert(idx, hashed)
+                    if len(own) > self.sparse_limit:
+                        self.__densify__()
+                        registers = self.registers
+                        break
+            else:
+                return
+        shift = HASH_BITS - self.precision
+        mask = (1 << shift) - 1
+        for hashed in hashes:
+            idx = hashed >> shift
+            rank = shift - (hashed & mask).bit_length() + 1
+            if rank > registers[idx]:
+                registers[idx] = rank
+
+    def __densify__(self) -> None:
+        """
+        Move the exact hashes to registers
+        """
+        hashes = self.hashes
+        self.hashes = array('Q')
+        self.registers = bytearray(1 << self.precision)
+        self.add_hashes(hashes)
+
+    def merge(self, other: Self) -> Self:
+        """
+        Add the values counted by another estimator
+        :param other:
+        :return: This estimator
+        :raise ValueError: The precisions are not the same
+        """
+        if other.precision != self.precision:
+            raise ValueError(f"Can't merge precision {other.precision} into {self.precision}")
+        if other.registers is None:
+            self.add_hashes(other.hashes)
+            return self
+        if self.registers is None:
+            self.__densify__()
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        """
+        :return: Estimated number of distinct values, exact for small sets
+        """
+        registers = self.registers
+        if registers is None:
+            return len(self.hashes)
+        size = len(registers)
+        total = sum(registers.count(rank) * 2.0 ** -rank for rank in range(max(registers) + 1))
+        alpha = SMALL_ALPHA.get(size) or 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / total
+        zeros = registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+        return round(estimate)
+
+    @property
+    def error(self) -> float:
+        """
+        :return: Relative standard error of count(), 0 while it is exact
+        """
+        return 0.0 if self.registers is None else 1.04 / math.sqrt(1 << self.precision)
+
+    def to_state(self) -> dict[str, Any]:
+        """
+        Serializable state of the estimator, with the registers or hashes as base64
+        :return:
+        """
+        if self.registers is None:
+            return {'precision': self.precision, 'hashes': base64.b64encode(self.hashes.tobytes()).decode('ascii')}
+        return {'precision': self.precision, 'registers': base64.b64encode(self.registers).decode('ascii')}
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> Self:
+        """
+        Rebuild an estimator from its serialized state
+        :param state:
+        :return:
+        """
+        if 'registers' in state:
+            return cls(precision=state['precision'], registers=bytearray(base64.b64decode(state['registers'])))
+        hashes = array('Q')
+        hashes.frombytes(base64.b64decode(state['hashes']))
+        return cls(precision=state['precision'], hashes=hashes)
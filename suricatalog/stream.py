@@ -0,0 +1,263 @@
+"""
+Eve events from Suricata's unix_stream output, instead of a file.
+
+Suricata connects to a unix stream socket and writes one JSON document per line, reconnecting if the socket goes away.
+The reader listens on the socket path with asyncio on a background thread, so several sensors can connect at the same
+time. Received lines wait on a bounded queue for the consumer. Suricata is never slowed down: when the consumer falls
+behind the lines that don't fit are dropped, or sampled once the queue is filling up, and counted.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import queue
+import socket
+import stat
+import threading
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+UNIX_SCHEME = 'unix:'
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_SAMPLE_EVERY = 10
+RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024
+READ_SIZE = 256 * 1024
+# Bytes kept of a line too long to be received, for the malformed lines report
+TOO_LONG_HEAD = 4096
+MAX_POLL_INTERVAL = 1.0
+SERVE_POLL_INTERVAL = 0.1
+OVERFLOW_POLICIES = ('drop', 'sample')
+
+
+def is_unix_source(eve_file: Path | str) -> bool:
+    """
+    Check if an eve source is a unix socket, like 'unix:///var/run/suricata/eve.sock'
+    :param eve_file:
+    :return:
+    """
+    return str(eve_file).startswith(UNIX_SCHEME)
+
+
+def unix_socket_path(eve_file: Path | str) -> Path:
+    """
+    Socket path of a unix source. Also works once the source went through Path(), which turns 'unix:///a' into 'unix:/a'
+    :param eve_file:
+    :return:
+    """
+    return Path('/' + str(eve_file)[len(UNIX_SCHEME):].lstrip('/'))
+
+
+class UnixStreamReader:
+    """
+    Listen on a unix stream socket and hand over the received lines in chunks, with bounded memory.
+    The queue holds at most queue_size chunks of at most READ_SIZE bytes each. With the 'drop' overflow policy
+    the chunks that don't fit are dropped. With 'sample', once the queue is three quarters full only one of
+    every sample_every lines is kept, and what still doesn't fit is dropped.
+    A line can't be longer than the queue, queue_size * READ_SIZE bytes. Longer lines are dropped as malformed.
+    """
+
+    def __init__(
+            self,
+            socket_path: Path | str,
+            queue_size: int = DEFAULT_QUEUE_SIZE,
+            overflow: str = 'drop',
+            sample_every: int = DEFAULT_SAMPLE_EVERY,
+            receive_buffer: int = RECEIVE_BUFFER_SIZE,
+            logger: logging.Logger | None = None,
+            malformed: Callable[[bytes], None] | None = None
+    ):
+        """
+        :param socket_path: Created when reading starts, removed at the end. A stale socket is replaced
+        :param queue_size: Maximum number of chunks of lines waiting for the consumer
+        :param overflow: What to do when the consumer falls behind, one of OVERFLOW_POLICIES
+        :param sample_every: With the 'sample' policy, keep one of every this many lines while the queue is filling up
+        :param receive_buffer: Size of the kernel receive buffer of each connection
+        :param logger: Where to report the dropped lines
+        :param malformed: Called by the consumer with the first TOO_LONG_HEAD bytes of every line too long to be kept
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy: {overflow}, use one of {OVERFLOW_POLICIES}")
+        if queue_size < 1 or sample_every < 1:
+            raise ValueError(f"Invalid queue size ({queue_size}) or sampling ({sample_every})")
+        self.socket_path = Path(socket_path)
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.sample_every = sample_every
+        self.receive_buffer = receive_buffer
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.malformed = malformed
+        self.max_line_size = queue_size * READ_SIZE
+        # Filled by the connections, emptied by the consumer that owns the malformed callback
+        self.too_long_heads: queue.SimpleQueue = queue.SimpleQueue()
+        self.too_long = 0
+        self.received = 0
+        self.sampled = 0
+        self.dropped = 0
+        self.connections = 0
+
+    def __bind__(self) -> socket.socket:
+        """
+        Create the listening socket, replacing a socket left behind by a previous run
+        :return:
+        """
+        with contextlib.suppress(FileNotFoundError):
+            if not stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                raise FileExistsError(f"'{self.socket_path}' exists and is not a socket")
+            os.unlink(self.socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            # Accepted connections inherit the receive buffer
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+            sock.bind(str(self.socket_path))
+            sock.listen()
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def __offer__(self, pending: queue.Queue, lines: list[bytes]) -> None:
+        """
+        Queue a chunk of lines without ever blocking, applying the overflow policy
+        :param pending:
+        :param lines:
+        :return:
+        """
+        self.received += len(lines)
+        if self.overflow == 'sample' and pending.qsize() * 4 >= self.queue_size * 3:
+            kept = lines[::self.sample_every]
+            self.sampled += len(lines) - len(kept)
+            lines = kept
+        try:
+            pending.put_nowait(lines)
+        except queue.Full:
+            if not self.dropped:
+                self.logger.warning(
+                    "Reading '%s' fell behind, dropping lines (policy: %s)", self.socket_path, self.overflow
+                )
+            self.dropped += len(lines)
+
+    def __drop_too_long__(self, head: bytes) -> None:
+        """
+        Drop a line that doesn't fit on the queue, keeping its start for the consumer
+        :param head: What was received of the line so far
+        :return:
+        """
+        if not self.too_long:
+            self.logger.warning(
+                "Dropping lines longer than %d bytes received on '%s'", self.max_line_size, self.socket_path
+            )
+        self.too_long += 1
+        self.too_long_heads.put(head[:TOO_LONG_HEAD])
+
+    def __report_too_long__(self) -> None:
+        """
+        Hand the lines dropped for being too long to the malformed callback, on the consumer thread
+        :return:
+        """
+        while not self.too_long_heads.empty():
+            head = self.too_long_heads.get_nowait()
+            if self.malformed:
+                self.malformed(head)
+
+    async def __serve__(self, sock: socket.socket, pending: queue.Queue, done: threading.Event) -> None:
+        """
+        Accept connections until done is set. Connections still open at the end are cancelled by asyncio.run()
+        :param sock:
+        :param pending:
+        :param done:
+        :return:
+        """
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            self.connections += 1
+            remainder = b''
+            # Inside a line that was too long, until its newline
+            discarding = False
+            try:
+                while block := await reader.read(READ_SIZE):
+                    lines = block.split(b'\n')
+                    if discarding:
+                        if len(lines) == 1:
+                            continue
+                        lines[0] = b''
+                        discarding = False
+                    elif remainder:
+                        lines[0] = remainder + lines[0]
+                    remainder = lines.pop()
+                    if len(remainder) > self.max_line_size:
+                        self.__drop_too_long__(remainder)
+                        remainder = b''
+                        discarding = True
+                    lines = [line for line in lines if line]
+                    if lines:
+                        self.__offer__(pending, lines)
+                if remainder:
+                    self.__offer__(pending, [remainder])
+            except ConnectionError:
+                self.logger.warning("Connection to '%s' lost", self.socket_path)
+            finally:
+                writer.close()
+
+        server = await asyncio.start_unix_server(handle, sock=sock)
+        try:
+            while not done.is_set():
+                await asyncio.sleep(SERVE_POLL_INTERVAL)
+        finally:
+            # Not waiting for the connections to close, Suricata keeps them open
+            server.close()
+
+    def chunks(
+            self,
+            stop: Callable[[], bool],
+            on_idle: Callable[[], None] | None = None
+    ) -> Iterator[list[bytes]]:
+        """
+        Listen on the socket and yield the received lines, in chunks, until stop() returns True
+        :param stop: Checked between chunks, and at least every MAX_POLL_INTERVAL seconds while nothing arrives
+        :param on_idle: Called every time there are no lines waiting
+        :return: Non-empty lines, without the trailing newline
+        """
+        sock = self.__bind__()
+        pending: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        done = threading.Event()
+        failure: list[Exception] = []
+
+        def serve() -> None:
+            try:
+                asyncio.run(self.__serve__(sock, pending, done))
+            except Exception as exc:
+                failure.append(exc)  # Raised again on the consumer side
+
+        thread = threading.Thread(target=serve, name=f"unix-{self.socket_path.name}", daemon=True)
+        thread.start()
+        try:
+            while not stop() and not failure:
+                self.__report_too_long__()
+                try:
+                    lines = pending.get_nowait()
+                except queue.Empty:
+                    if on_idle:
+                        on_idle()
+                    try:
+                        lines = pending.get(timeout=MAX_POLL_INTERVAL)
+                    except queue.Empty:
+                        continue
+                yield lines
+            if failure:
+                raise failure[0]
+        finally:
+            done.set()
+            thread.join()
+            sock.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.socket_path)
+            self.__report_too_long__()
+            if self.dropped or self.sampled:
+                self.logger.warning(
+                    "Received %d lines on '%s', %d sampled out and %d dropped because the reader fell behind",
+                    self.received,
+                    self.socket_path,
+                    self.sampled,
+                    self.dropped
+                )
@@ -1,13 +1,23 @@
 """
 Common logic to handle timestamps and dates
+
+Suricata writes fixed width timestamps with a numeric UTC offset, like 2022-02-08T09:40:29.080710-0500. Comparing
+them on every event is the hot path of the time filters, so besides parse_timestamp() there are two faster ways:
+timestamp_micros() turns a timestamp into UTC epoch microseconds with a cache of UTC offsets, and TimestampBound
+compares timestamps with a threshold as strings, rendering the threshold once in each UTC offset it runs into.
 """
-from datetime import UTC, datetime, timedelta, tzinfo
+from datetime import UTC, datetime, timedelta, timezone, tzinfo
 from timeit import default_timer as timer
 from typing import Any
 
 import pytz
 
 DEFAULT_TZ: tzinfo = datetime.now(UTC).astimezone().tzinfo
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+SURICATA_TIMESTAMP_SIZE = len('2022-02-08T09:40:29.080710-0500')
+OFFSET_START = len('2022-02-08T09:40:29.080710')
+_OFFSETS: dict[str, timedelta] = {}
 
 
 def to_utc(candidate: datetime) -> datetime:
@@ -36,14 +46,96 @@ def parse_timestamp(candidate: str | Any) -> datetime:
     """
     if isinstance(candidate, str):
         try:
-            iso_candidate = candidate.split('+', 1)[0]
-            return to_utc(datetime.fromisoformat(iso_candidate))
+            return to_utc(datetime.fromisoformat(candidate))
         except ValueError as ex:
             raise ValueError(f"Invalid date passed: {candidate}") from ex
     else:
         return to_utc(candidate)
 
 
+def utc_offset(candidate: str) -> timedelta:
+    """
+    UTC offset of a numeric suffix like '-0500', '+05:30' or 'Z'. Eve files use very few, so they are cached
+    :param candidate:
+    :return:
+    """
+    offset = _OFFSETS.get(candidate)
+    if offset is None:
+        if candidate == 'Z':
+            offset = timedelta()
+        else:
+            digits = candidate[1:].replace(':', '')
+            if candidate[:1] not in ('+', '-') or len(digits) != 4 or not digits.isdigit():
+                raise ValueError(f"Invalid UTC offset: {candidate}")
+            offset = timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+            if candidate[0] == '-':
+                offset = -offset
+        _OFFSETS[candidate] = offset
+    return offset
+
+
+def timestamp_micros(candidate: str | datetime) -> int:
+    """
+    Microseconds since the epoch, in UTC. Timestamps written by Suricata skip the time zone conversion of
+    parse_timestamp(): the local time is parsed without offset and the cached offset is subtracted.
+    :param candidate: Timestamp string, or a datetime
+    :return:
+    :raise ValueError: The timestamp is not valid
+    """
+    if isinstance(candidate, str) and len(candidate) == SURICATA_TIMESTAMP_SIZE and candidate[OFFSET_START] in '+-':
+        try:
+            local = datetime.fromisoformat(candidate[:OFFSET_START])
+            return (local - EPOCH - utc_offset(candidate[OFFSET_START:])) // ONE_MICROSECOND
+        except ValueError as ex:
+            raise ValueError(f"Invalid date passed: {candidate}") from ex
+    if not isinstance(candidate, str | datetime):
+        raise ValueError(f"Invalid date passed: {candidate}")
+    return (parse_timestamp(candidate).replace(tzinfo=None) - EPOCH) // ONE_MICROSECOND
+
+
+class TimestampBound:
+    """
+    Check if timestamps are newer than a threshold, without parsing most of them.
+    Suricata timestamps with the same UTC offset have the same width and sort like the time they represent, so
+    once the threshold is rendered in the offset of a timestamp they compare as strings. Eve files use one
+    offset, or a couple around daylight saving changes, and the rendered thresholds are kept per offset.
+    Any other timestamp goes through timestamp_micros().
+    """
+
+    def __init__(self, threshold: datetime):
+        """
+        :param threshold: Aware datetime
+        """
+        if not threshold.tzinfo:
+            raise ValueError(f"{threshold} has not TimeZone information")
+        self.threshold = threshold
+        self.micros = timestamp_micros(threshold)
+        self.rendered: dict[str, str] = {}
+
+    def __render__(self, offset: str) -> str:
+        """
+        :param offset: Like '-0500'
+        :return: The threshold as a Suricata timestamp with that offset
+        """
+        local = self.threshold.astimezone(timezone(utc_offset(offset)))
+        return local.strftime('%Y-%m-%dT%H:%M:%S.%f') + offset
+
+    def is_newer(self, candidate: str) -> bool:
+        """
+        :param candidate: Timestamp of an event
+        :return: True if the timestamp is strictly newer than the threshold
+        :raise ValueError: The timestamp is not valid
+        """
+        if isinstance(candidate, str) and len(candidate) == SURICATA_TIMESTAMP_SIZE:
+            offset = candidate[OFFSET_START:]
+            rendered = self.rendered.get(offset)
+            if rendered is None and offset[:1] in ('+', '-'):
+                rendered = self.rendered[offset] = self.__render__(offset)
+            if rendered is not None and candidate[4] == '-' and candidate[10] == 'T':
+                return candidate > rendered
+        return timestamp_micros(candidate) > self.micros
+
+
 def get_clock(start_time: float) -> str:
     """
     Get the clock time from a timestamp, as pretty string
@@ -1,6 +1,7 @@
 """
 Top user application related code
 """
+from functools import partial
 from pathlib import Path
 
 import pyperclip
@@ -10,15 +11,17 @@ from textual.driver import Driver
 from textual.widgets import Footer, Header, RichLog
 
 from suricatalog import BASEDIR
+from suricatalog.checkpoint import Checkpoint
 from suricatalog.clipboard import copy_from_richlog
 from suricatalog.filter import BaseFilter
-from suricatalog.log import EveLogHandler
-from suricatalog.report import TopUserAgents
+from suricatalog.log import EveLogHandler, notify_malformed
+from suricatalog.report import TOP_VALUE_FIELDS, TopValues
+from suricatalog.sketch import DEFAULT_COUNTERS
 
 
 class TopUserApp(App):
     """
-    Show top users
+    Show top users, or the top values of any other field
     """
     BINDINGS = [
         ("q", "quit_app", "Quit"),
@@ -33,7 +36,11 @@ class TopUserApp(App):
             css_path: CSSPathType | None = None,
             watch_css: bool = False,
             data_filter: BaseFilter = None,
-            eve: list[Path] = None
+            eve: list[Path] = None,
+            eve_lh: EveLogHandler = None,
+            checkpoint: Checkpoint = None,
+            field: str = TOP_VALUE_FIELDS['useragent'],
+            counters: int | None = DEFAULT_COUNTERS
     ):
         """
         Constructor
@@ -42,10 +49,21 @@ class TopUserApp(App):
         :param watch_css:
         :param data_filter:
         :param eve:
+        :param eve_lh: Reader for the eve files, a default one is used if missing
+        :param checkpoint: If set, resume the report from it and only read new data. Saved once done
+        :param field: Dotted path of the field counted
+        :param counters: Memory budget, number of values counted at most. None counts all of them exactly
+        :raise ValueError: The checkpoint counts another field
         """
         super().__init__(driver_class, css_path, watch_css)
         self.data_filter = data_filter
         self.eve_files = eve
+        self.eve_lh = eve_lh if eve_lh else EveLogHandler()
+        self.checkpoint = checkpoint
+        if checkpoint and checkpoint.state:
+            self.top_values = TopValues.from_checkpoint(checkpoint.state, field=field, counters=counters)
+        else:
+            self.top_values = TopValues(field=field, counters=counters)
 
     def action_quit_app(self) -> None:
         """
@@ -92,12 +110,23 @@ class TopUserApp(App):
         Populate TUI components with data
         :return:
         """
-        top_user_agents = TopUserAgents()
+        top_values = self.top_values
         log = self.query_one("#agent", RichLog)
         log.loading = False
-        eve_lh = EveLogHandler()
-        for event in eve_lh.get_events(
-                eve_files=self.eve_files,
-                data_filter=self.data_filter):
-            await top_user_agents.ingest_data(event)
-        log.write(top_user_agents.agents)
+        self.eve_lh.aggregate(
+            top_values,
+            eve_files=self.eve_files,
+            data_filter=self.data_filter,
+            checkpoint=self.checkpoint,
+            factory=partial(TopValues, field=top_values.field, counters=top_values.counters)
+        )
+        if self.checkpoint:
+            self.checkpoint.state = top_values.to_state()
+            self.checkpoint.save()
+        log.write(top_values.top())
+        if top_values.hitters.error:
+            log.write(
+                f"Approximate counts of {top_values.hitters.total:,} values: each one may have been seen up to"
+                f" {top_values.hitters.error:,} more times. Any value seen more often than that is listed"
+            )
+        notify_malformed(self, self.eve_lh)
@@ -0,0 +1,157 @@
+"""
+Unit test for the columnar cache
+"""
+
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import orjson
+
+from suricatalog.cache import _MISSING, EveCache, _decode_column, _encode_column
+from suricatalog.filter import AlwaysTrueFilter, OnlyAlertsFilter, TimestampFilter
+from suricatalog.log import EveLogHandler
+from suricatalog.report import AggregatedFlowProtoReport
+from suricatalog.time import parse_timestamp
+
+BASEDIR = Path(__file__).parent
+
+
+def sorted_events(events) -> list[bytes]:
+    """
+    Events from the cache come grouped by day and type, compare them ignoring the order
+    :param events:
+    :return:
+    """
+    return sorted(orjson.dumps(event, option=orjson.OPT_SORT_KEYS) for event in events)
+
+
+class CacheTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Cached events must be the same as the parsed ones
+    """
+
+    def test_columns(self):
+        """
+        Every kind of column survives the round trip, missing values included
+        :return:
+        """
+        columns = [
+            [1, _MISSING, -2 ** 63, 2 ** 63 - 1],
+            [2 ** 64, 1, _MISSING, 3],
+            [True, False, _MISSING, True],
+            [1.5, _MISSING, -0.0, 1e300],
+            [1, 1.0, True, "1"],
+            ["2022-02-08T09:40:29.080710-0500", _MISSING, "2024-08-24T09:33:09.000000+0530", "1999-12-31T23:59:59.999999-0000"],
+            ["2022-02-08T09:40:29.080710-0500", "2022-02-08T09:40:29-0500", "a", "a"],
+            [None, {}, [1, {"a": None}], _MISSING],
+        ]
+        for values in columns:
+            with self.subTest(values=values):
+                kind, parts = _encode_column(values)
+                self.assertListEqual(values, _decode_column(kind, parts, sys.byteorder))
+        kind, parts = _encode_column([[1], [1]])
+        first, second = _decode_column(kind, parts, sys.byteorder)
+        self.assertIsNot(first, second)
+
+    async def test_cache(self):
+        """
+        Build, read and invalidate the cache
+        :return:
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = EveCache(Path(tmp_dir) / "cache", segment_rows=500)
+            for eve_file in [BASEDIR.joinpath("eve-2.json"), BASEDIR.joinpath("eve_payload.json")]:
+                self.assertIsNone(cache.lookup(eve_file))
+                entry = cache.build(eve_file)
+                self.assertIsNotNone(cache.lookup(eve_file))
+                self.assertEqual(entry.manifest["events"], sum(segment["rows"] for segment in entry.manifest["segments"]))
+                for data_filter in [AlwaysTrueFilter(), OnlyAlertsFilter()]:
+                    with self.subTest(eve_file=eve_file.name, data_filter=data_filter):
+                        data_filter.timestamp = parse_timestamp("2022-02-08T11:40:00.000000-0500")
+                        expected = list(EveLogHandler().get_events(eve_files=[eve_file], data_filter=data_filter))
+                        events = list(EveLogHandler(cache=cache).get_events(eve_files=[eve_file], data_filter=data_filter))
+                        self.assertListEqual(sorted_events(expected), sorted_events(events))
+
+            eve_file = BASEDIR.joinpath("eve-2.json")
+            timestamp_filter = TimestampFilter()
+            timestamp_filter.timestamp = parse_timestamp("2024-01-01T00:00:00.000000-0500")
+            entry = cache.lookup(eve_file)
+            skipped = [segment for segment in entry.manifest["segments"] if segment["max_time"] <= timestamp_filter.timestamp.timestamp()]
+            self.assertTrue(skipped)
+            self.assertEqual(
+                len(list(EveLogHandler(seek_slack=None).get_events(eve_files=[eve_file], data_filter=timestamp_filter))),
+                len(list(EveLogHandler(cache=cache).get_events(eve_files=[eve_file], data_filter=timestamp_filter)))
+            )
+
+            reports = []
+            for eve_lh in [EveLogHandler(), EveLogHandler(cache=cache)]:
+                report = AggregatedFlowProtoReport()
+                for event in eve_lh.get_events(
+                        eve_files=[eve_file],
+                        data_filter=AlwaysTrueFilter(),
+                        fields=AggregatedFlowProtoReport.fields,
+                        event_types=AggregatedFlowProtoReport.event_types
+                ):
+                    self.assertSetEqual({"event_type", "proto", "dest_port"}, set(event))
+                    await report.ingest_data(event)
+                reports.append(report.port_proto_count)
+            self.assertDictEqual(reports[0], reports[1])
+
+            # A file that changes is parsed again
+            changed = Path(tmp_dir) / "eve.json"
+            changed.write_bytes(eve_file.read_bytes())
+            cache.build(changed)
+            with open(changed, "ab") as eve:
+                eve.write(b'{"event_type":"flow","proto":"TCP","dest_port":1}\n')
+            self.assertIsNone(cache.lookup(changed))
+            events = list(EveLogHandler(cache=cache).get_events(eve_files=[changed], data_filter=AlwaysTrueFilter()))
+            self.assertEqual(2402, len(events))
+
+    def test_compressed(self):
+        """
+        Compressed files can be cached too
+        :return:
+        """
+        eve_file = BASEDIR.joinpath("eve_large.json.bz2")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = EveCache(tmp_dir)
+            entry = cache.build(eve_file)
+            self.assertEqual(40231, entry.manifest["events"])
+            events = list(
+                EveLogHandler(cache=cache).get_events(
+                    eve_files=[eve_file], data_filter=AlwaysTrueFilter(), event_types=["alert"]
+                )
+            )
+            self.assertEqual(1794, len(events))
+
+    def test_private(self):
+        """
+        The cache is created only for the current user, and not used if anybody else could have written on it
+        :return:
+        """
+        eve_file = BASEDIR.joinpath("eve_payload.json")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_dir = Path(tmp_dir) / "cache"
+            cache = EveCache(cache_dir)
+            cache.build(eve_file)
+            self.assertEqual(0, stat.S_IMODE(cache_dir.stat().st_mode) & 0o077)
+            self.assertIsNotNone(cache.lookup(eve_file))
+            with patch("suricatalog.os.getuid", return_value=os.getuid() + 1):
+                self.assertIsNone(cache.lookup(eve_file))
+                with self.assertRaises(PermissionError):
+                    cache.build(eve_file)
+            cache_dir.chmod(0o777)
+            self.assertIsNone(cache.lookup(eve_file))
+            with self.assertRaises(PermissionError):
+                cache.build(eve_file)
+            events = list(EveLogHandler(cache=cache).get_events(eve_files=[eve_file], data_filter=AlwaysTrueFilter()))
+            self.assertListEqual(list(EveLogHandler().get_events(eve_files=[eve_file], data_filter=AlwaysTrueFilter())), events)
+
+
+if __name__ == "__main__":
+    unittest.main()
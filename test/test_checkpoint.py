@@ -0,0 +1,130 @@
+"""
+Unit test for checkpoints
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from suricatalog.checkpoint import CheckpointStore, last_newline_offset
+from suricatalog.filter import AlwaysTrueFilter
+from suricatalog.log import EveLogHandler
+from suricatalog.report import AggregatedFlowProtoReport
+from suricatalog.scripts import eve_json
+
+BASEDIR = Path(__file__).parent
+
+
+class CheckpointTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Re-runs must only read the data appended since the previous run
+    """
+
+    async def __run__(self, store: CheckpointStore, eve_file: Path) -> tuple[AggregatedFlowProtoReport, int]:
+        """
+        Run the flow report the same way the flow application does
+        :param store:
+        :param eve_file:
+        :return: Report and number of events read on this run
+        """
+        checkpoint = store.load("flow")
+        if checkpoint.state:
+            report = AggregatedFlowProtoReport.from_state(checkpoint.state)
+        else:
+            report = AggregatedFlowProtoReport()
+        cnt = 0
+        for event in EveLogHandler().get_events(
+            eve_files=[eve_file], data_filter=AlwaysTrueFilter(), checkpoint=checkpoint
+        ):
+            await report.ingest_data(event)
+            cnt += 1
+        checkpoint.state = report.to_state()
+        checkpoint.save()
+        return report, cnt
+
+    async def test_incremental_runs(self):
+        """
+        Grow a file between runs, with a partial line at the end
+        :return:
+        """
+        with open(BASEDIR.joinpath("eve-2.json"), "rb") as eve:
+            lines = eve.read().splitlines(keepends=True)
+        expected = AggregatedFlowProtoReport()
+        for event in EveLogHandler().get_events(
+            eve_files=[BASEDIR.joinpath("eve-2.json")], data_filter=AlwaysTrueFilter()
+        ):
+            await expected.ingest_data(event)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = CheckpointStore(Path(tmp_dir) / "checkpoints.json")
+            eve_file = Path(tmp_dir) / "eve.json"
+            half = len(lines) // 2
+            partial = lines[half][:20]
+            eve_file.write_bytes(b"".join(lines[:half]) + partial)
+            self.assertEqual(eve_file.stat().st_size - len(partial), last_newline_offset(eve_file))
+
+            _, cnt = await self.__run__(store, eve_file)
+            self.assertEqual(half, cnt)
+            with open(eve_file, "ab") as eve:
+                eve.write(lines[half][20:])
+                eve.write(b"".join(lines[half + 1:]))
+            # logrotate renames the file, it is still recognized
+            rotated = Path(tmp_dir) / "eve.json.1"
+            os.rename(eve_file, rotated)
+            report, cnt = await self.__run__(store, rotated)
+            self.assertEqual(len(lines) - half, cnt)
+            self.assertDictEqual(expected.port_proto_count, report.port_proto_count)
+
+            _, cnt = await self.__run__(store, rotated)
+            self.assertEqual(0, cnt)
+
+            # Same path, different file: read from the start
+            eve_file.write_bytes(b"".join(lines[:10]))
+            _, cnt = await self.__run__(store, eve_file)
+            self.assertEqual(10, cnt)
+
+            # Files that are gone, or were replaced, are forgotten on save
+            self.assertEqual(2, len(store.load("flow").files))
+            rotated.write_bytes(b"".join(lines[10:20]))
+            await self.__run__(store, eve_file)
+            self.assertListEqual([eve_file.absolute().as_posix()], [saved["path"] for saved in store.load("flow").files.values()])
+            eve_file.unlink()
+            checkpoint = store.load("flow")
+            checkpoint.save()
+            self.assertDictEqual({}, store.load("flow").files)
+
+    def test_eve_json(self):
+        """
+        A corrupted checkpoint file is a usage error on every report, the timestamp bound is part of the name
+        :return:
+        """
+        eve_file = str(BASEDIR.joinpath("eve-2.json"))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint_file = Path(tmp_dir) / "checkpoints.json"
+            checkpoint_file.write_text("{not json")
+            for report in [["--flow"], ["--netflow", "10.0.0.0/8"], ["--useragent"], ["--top", "signature"]]:
+                argv = ["eve_json", "--checkpoint", str(checkpoint_file), *report, eve_file]
+                with (
+                    self.subTest(report=report), patch("sys.argv", argv), contextlib.redirect_stderr(io.StringIO()),
+                    self.assertRaises(SystemExit) as exit_context
+                ):
+                    eve_json.main()
+                self.assertEqual(2, exit_context.exception.code)
+
+            checkpoint_file.unlink()
+            names = []
+            for bound in [[], ["--timestamp", "2022-01-01T00:00:00+00:00"], ["--timestamp", "2022-02-01T00:00:00+00:00"]]:
+                argv = ["eve_json", "--checkpoint", str(checkpoint_file), *bound, "--netflow", "10.0.0.0/8", eve_file]
+                with patch("sys.argv", argv), patch.object(eve_json, "get_host_data_use", Mock()) as get_host_data_use:
+                    eve_json.main()
+                names.append(get_host_data_use.call_args.kwargs["checkpoint"].name)
+            self.assertEqual(len(names), len(set(names)))
+            self.assertEqual("netflow-10.0.0.0/8", names[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Unit test for the deduplication of events
+"""
+
+import contextlib
+import io
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from suricatalog.dedup import BloomFilter, Deduplicator, event_key
+from suricatalog.filter import AlwaysTrueFilter
+from suricatalog.log import EveLogHandler
+from suricatalog.report import AggregatedFlowProtoReport
+from suricatalog.scripts import eve_json, eve_log
+
+BASEDIR = Path(__file__).parent
+
+
+class DedupTestCase(unittest.TestCase):
+    """
+    Duplicated events are dropped, distinct ones are kept
+    """
+
+    def test_bloom_filter(self):
+        """
+        No false negatives, and false positives close to the configured rate
+        :return:
+        """
+        bloom = BloomFilter(capacity=10_000, error_rate=0.01)
+        present = sum(bloom.add(("key", idx)) for idx in range(10_000))
+        self.assertLess(present, 100)
+        self.assertEqual(10_000 - present, bloom.count)
+        self.assertTrue(all(("key", idx) in bloom for idx in range(10_000)))
+        false_positives = sum(("other", idx) in bloom for idx in range(100_000))
+        self.assertLess(false_positives, 1_500)
+        with self.assertRaises(ValueError):
+            BloomFilter(capacity=0)
+        with self.assertRaises(ValueError):
+            BloomFilter(error_rate=1)
+
+    def test_dedup(self):
+        """
+        A file and its copy give the events of the file once, events that only share a timestamp are kept
+        :return:
+        """
+        eve_file = BASEDIR.joinpath("eve-2.json")
+        expected = list(EveLogHandler().get_events(eve_files=[eve_file], data_filter=AlwaysTrueFilter()))
+        keys = {event_key(event) for event in expected}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            copy = Path(tmp_dir) / "eve.json.1"
+            shutil.copy(eve_file, copy)
+            for merge in [False, True]:
+                with self.subTest(merge=merge):
+                    dedup = Deduplicator(capacity=10_000)
+                    events = list(
+                        EveLogHandler(dedup=dedup, merge=merge).get_events(
+                            eve_files=[eve_file, copy], data_filter=AlwaysTrueFilter()
+                        )
+                    )
+                    self.assertEqual(len(keys), len(events))
+                    self.assertEqual(len(expected) * 2 - len(keys), dedup.duplicates)
+
+            dedup = Deduplicator(capacity=10_000)
+            events = list(
+                EveLogHandler(dedup=dedup).get_events(
+                    eve_files=[eve_file, copy],
+                    data_filter=AlwaysTrueFilter(),
+                    fields=AggregatedFlowProtoReport.fields,
+                    event_types=AggregatedFlowProtoReport.event_types
+                )
+            )
+            self.assertEqual(len({key for key in keys if key[2] == "flow"}), len(events))
+
+        alert = {"timestamp": "2022-02-08T09:40:29.080710-0500", "flow_id": 1, "event_type": "alert"}
+        batch = [
+            {**alert, "alert": {"signature_id": 1}},
+            {**alert, "alert": {"signature_id": 2}},
+            {**alert, "alert": {"signature_id": 1}},
+        ]
+        dedup = Deduplicator(capacity=100)
+        self.assertListEqual(batch[:2], dedup.unique_batch(batch))
+        self.assertEqual(1, dedup.duplicates)
+
+    def test_options(self):
+        """
+        A capacity below 1, or an error rate outside (0, 1), is a usage error
+        :return:
+        """
+        eve_file = str(BASEDIR.joinpath("eve-2.json"))
+        for main in [eve_json.main, eve_log.main]:
+            for option, value in [
+                ("--dedup_capacity", "0"),
+                ("--dedup_capacity", "-10"),
+                ("--dedup_capacity", "many"),
+                ("--dedup_error_rate", "0"),
+                ("--dedup_error_rate", "1"),
+                ("--dedup_error_rate", "-0.1"),
+                ("--dedup_error_rate", "1.5"),
+                ("--dedup_error_rate", "nan"),
+            ]:
+                argv = ["suricatalog", "--dedup", option, value, eve_file]
+                with (
+                    self.subTest(main=main.__module__, option=option, value=value), patch("sys.argv", argv),
+                    contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit) as exit_context
+                ):
+                    main()
+                self.assertEqual(2, exit_context.exception.code)
+
+
+if __name__ == "__main__":
+    unittest.main()
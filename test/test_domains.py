@@ -0,0 +1,116 @@
+"""
+Unit test for sets of domains
+"""
+
+import json
+import random
+import string
+import tempfile
+import unittest
+from pathlib import Path
+
+from suricatalog.domains import DomainSet, split_domain
+from suricatalog.filter import DomainFilter
+from suricatalog.log import EveLogHandler
+
+BASEDIR = Path(__file__).parent
+
+
+def naive_contains(domains: set[str], name: str) -> bool:
+    """
+    :param domains: Lower case domains
+    :param name:
+    :return: True if the name, or any of its parents, is on the set. Checks every split of the labels
+    """
+    labels = name.lower().rstrip('.').split('.')
+    return any('.'.join(labels[idx:]) in domains for idx in range(len(labels)))
+
+
+class DomainSetTestCase(unittest.TestCase):
+    """
+    Lookups give the same answers as checking every parent domain on a set
+    """
+
+    def test_contains(self):
+        """
+        Subdomains, case, trailing dots, wildcards, anything that is not a name
+        :return:
+        """
+        domain_set = DomainSet(["Evil.Example", "*.bad.test", "www.evil.example", "ads.tracker.test", " ", "."])
+        self.assertEqual(3, len(domain_set))
+        for candidate, expected in {
+            "evil.example": True,
+            "WWW.EVIL.EXAMPLE.": True,
+            "a.b.c.evil.example": True,
+            "notevil.example": False,
+            "example": False,
+            "bad.test": True,
+            "x.bad.test": True,
+            "tracker.test": False,
+            "ads.tracker.test": True,
+            "": False,
+            None: False,
+            10: False,
+        }.items():
+            with self.subTest(candidate=candidate):
+                self.assertEqual(expected, candidate in domain_set)
+        self.assertListEqual(["example", "evil", "www"], split_domain(" WWW.Evil.Example. "))
+
+        rng = random.Random(42)
+
+        def random_domain() -> str:
+            labels = ["".join(rng.choice("abcdef") for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(1, 3))]
+            return ".".join(labels + [rng.choice(["com", "net", "test"])])
+
+        domains = [random_domain() for _ in range(5_000)]
+        domain_set = DomainSet(domains)
+        listed = set(domains)
+        self.assertLess(1_024, len(domain_set.keys))
+        for _ in range(5_000):
+            name = random_domain() if rng.random() < 0.5 else f"{rng.choice(string.ascii_lowercase)}.{rng.choice(domains)}"
+            self.assertEqual(naive_contains(listed, name), name in domain_set)
+
+    def test_from_file(self):
+        """
+        Plain lists and hosts files, with comments
+        :return:
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            domains_file = Path(tmp_dir) / "blocklist.txt"
+            domains_file.write_text("# Feed\nevil.example  # phishing\n\n0.0.0.0 ads.tracker.test\n")
+            domain_set = DomainSet.from_file(domains_file)
+            self.assertEqual(str(domains_file), str(domain_set))
+            self.assertEqual(2, len(domain_set))
+            self.assertIn("cdn.ads.tracker.test", domain_set)
+            self.assertNotIn("0.0.0.0", domain_set)
+
+    def test_filter(self):
+        """
+        DNS queries, TLS SNI and HTTP hosts under the domains, also on the workers, where the filter is pickled
+        :return:
+        """
+        with open(BASEDIR.joinpath("eve-2.json"), "rb") as eve:
+            events = [json.loads(line) for line in eve]
+        domains = {"bing.com", "microsoft.com"}
+        expected = [
+            event for event in events
+            if any(
+                isinstance(name, str) and naive_contains(domains, name)
+                for name in (
+                    event.get("dns", {}).get("rrname"), event.get("tls", {}).get("sni"), event.get("http", {}).get("hostname")
+                )
+            )
+        ]
+        self.assertTrue(expected)
+        data_filter = DomainFilter(domains)
+        self.assertListEqual(expected, data_filter.accept_batch(events))
+        self.assertListEqual([], DomainFilter(domains, domain_fields=["http.url"]).accept_batch(events))
+        eve_lh = EveLogHandler(workers=2, range_size=64 * 1024)
+        self.assertListEqual(
+            expected,
+            list(eve_lh.get_events(eve_files=[BASEDIR.joinpath("eve-2.json")], data_filter=data_filter))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+Unit test for filter expressions
+"""
+
+import unittest
+from pathlib import Path
+
+from suricatalog.expression import ExpressionError, compile_expression
+from suricatalog.filter import AlwaysTrueFilter, ExpressionFilter, NXDomainFilter
+from suricatalog.log import EveLogHandler
+
+BASEDIR = Path(__file__).parent
+ALERT = {
+    "timestamp": "2022-02-08T09:40:29.080710-0500",
+    "event_type": "alert",
+    "src_ip": "192.168.1.2",
+    "dest_ip": "192.168.1.1",
+    "dest_port": 443,
+    "alert": {"severity": 2, "signature": "ET POLICY Dropbox.com Offsite File Backup in Use", "metadata": {"tag": ["x"]}},
+}
+
+
+class ExpressionTestCase(unittest.TestCase):
+    """
+    Expressions compile once and match like the equivalent Python code
+    """
+
+    def test_predicate(self):
+        """
+        Comparisons, boolean operators, missing fields and values of the wrong type
+        :return:
+        """
+        cases = {
+            'event_type == "alert" and alert.severity <= 2 and dest_port in {443, 8443}': True,
+            'event_type == "alert" and alert.severity < 2': False,
+            'event_type == "dns" or dest_port == 443': True,
+            'not dest_port in [80, 8080]': True,
+            'dest_port not in (443,)': False,
+            '1 <= alert.severity <= 3': True,
+            '2 >= alert.severity': True,
+            '"Dropbox" in alert.signature': True,
+            'src_ip != dest_ip': True,
+            'alert.metadata.tag == ["x"]': False,
+            'alert.metadata.tag != None': True,
+            'dns.rcode == "NXDOMAIN"': False,
+            'dns.rcode != "NXDOMAIN"': True,
+            'dns.rcode in {"NXDOMAIN"}': False,
+            'dns.rcode not in {"NXDOMAIN"}': True,
+            'alert.signature > 3': False,
+            'flow_id <= -1': False,
+            'alert': True,
+            'payload': False,
+        }
+        for expression, expected in cases.items():
+            with self.subTest(expression=expression):
+                self.assertEqual(expected, bool(compile_expression(expression).predicate(ALERT)))
+
+    def test_invalid(self):
+        """
+        Anything outside the subset is rejected up front
+        :return:
+        """
+        for expression in [
+            'event_type = "alert"',
+            '__import__("os").system("true")',
+            'alert.severity + 1 > 2',
+            'event_type is None',
+            'dest_port in {len}',
+            'dest_port in 443',
+            'x[0] == 1',
+            'lambda: 1',
+        ]:
+            with self.subTest(expression=expression), self.assertRaises(ExpressionError):
+                compile_expression(expression)
+
+    def test_derived(self):
+        """
+        Needles, fields and event types, only from the terms every match must pass
+        :return:
+        """
+        compiled = compile_expression('event_type == "alert" and alert.severity <= 2 and dest_port in {443, 8443}')
+        self.assertTupleEqual((b'"event_type":"alert"', b'"severity":', b'"dest_port":'), compiled.needles)
+        self.assertTupleEqual(('event_type', 'alert.severity', 'dest_port'), compiled.fields)
+        self.assertTupleEqual(('alert',), compiled.event_types)
+
+        compiled = compile_expression('event_type in {"dns", "alert"} and ("x" == dns.rrname or dns.rcode == "a\\"b")')
+        self.assertTupleEqual((b'"event_type":',), compiled.needles)
+        self.assertTupleEqual(('alert', 'dns'), compiled.event_types)
+
+        compiled = compile_expression('event_type != "flow" and dns.rcode != "NOERROR" and dns.rrname == "a/b"')
+        self.assertTupleEqual((b'"rrname":',), compiled.needles)
+        self.assertIsNone(compiled.event_types)
+
+    def test_filter(self):
+        """
+        The filter gives the same events as the Python code, on its own and on top of another filter
+        :return:
+        """
+        eve_file = BASEDIR.joinpath("eve-2.json")
+        events = list(EveLogHandler().get_events(eve_files=[eve_file], data_filter=AlwaysTrueFilter()))
+        expression = 'event_type == "alert" and alert.severity >= 3 and src_port in {25, 465}'
+        expected = [
+            event for event in events
+            if event['event_type'] == 'alert' and event['alert']['severity'] >= 3 and event.get('src_port') in {25, 465}
+        ]
+        self.assertTrue(expected)
+        data_filter = ExpressionFilter(expression)
+        self.assertListEqual(expected, data_filter.accept_batch(events))
+        self.assertListEqual(expected, [event for event in events if data_filter.accept(event)])
+        self.assertListEqual(expected, list(EveLogHandler().get_events(eve_files=[eve_file], data_filter=data_filter)))
+
+        data_filter = ExpressionFilter('dns.rrname != None', NXDomainFilter())
+        self.assertTupleEqual((b'"rrname":', b'"NXDOMAIN"'), data_filter.needles)
+        self.assertTupleEqual(('dns.rrname', 'dns.rcode'), data_filter.fields)
+        expected = [event for event in events if NXDomainFilter().accept(event) and event['dns'].get('rrname')]
+        self.assertListEqual(expected, data_filter.accept_batch(events))
+        precompiled = ExpressionFilter('dns.rrname != None', NXDomainFilter(), compiled=compile_expression('dns.rrname != None'))
+        self.assertTupleEqual(data_filter.needles, precompiled.needles)
+        self.assertListEqual(expected, precompiled.accept_batch(events))
+
+    def test_filter_parallel(self):
+        """
+        The filter survives the trip to the worker processes and gives the same events as the serial run
+        :return:
+        """
+        eve_files = [BASEDIR.joinpath("eve-2.json"), BASEDIR.joinpath("eve_payload.json")]
+        for data_filter in [
+            ExpressionFilter('event_type == "alert" and alert.severity >= 2'),
+            ExpressionFilter('dns.rrname != None', NXDomainFilter()),
+        ]:
+            with self.subTest(data_filter=str(data_filter)):
+                expected = list(EveLogHandler().get_events(eve_files=eve_files, data_filter=data_filter))
+                self.assertTrue(expected)
+                parallel = list(
+                    EveLogHandler(workers=2, range_size=100_000).get_events(eve_files=eve_files, data_filter=data_filter)
+                )
+                self.assertListEqual(expected, parallel)
+
+
+if __name__ == "__main__":
+    unittest.main()
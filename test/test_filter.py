@@ -3,17 +3,41 @@ Unit tests for payloads
 """
 
 import json
+import time
 import unittest
+from typing import Any
 from unittest import TestCase
 
 from suricatalog.filter import (
+    AlwaysTrueFilter,
+    AndFilter,
+    BaseFilter,
+    EventTypeFilter,
+    ExpressionFilter,
+    NotFilter,
     NXDomainFilter,
+    OnlyAlertsFilter,
+    OrFilter,
     WithPayloadFilter,
     WithPrintablePayloadFilter,
 )
+from suricatalog.log import prefilter
+from suricatalog.time import DEFAULT_TIMESTAMP_10Y_AGO
 from test.test_log import BASEDIR
 
 
+class SlowFilter(BaseFilter):
+    """
+    Accepts everything, slowly
+    """
+
+    fields = ()
+
+    def accept(self, data: dict[Any, Any]) -> bool:
+        time.sleep(0.00001)
+        return True
+
+
 class FilterTestCase(TestCase):
     """
     Unit test for filters
@@ -280,6 +304,76 @@ class FilterTestCase(TestCase):
         )
         self.assertFalse(data_filter.accept(payload))
 
+    def test_needles(self):
+        """
+        Needles must never drop a raw line the filter accepts, nor event_types an event type.
+        Filtering a batch accepts the same events
+        :return:
+        """
+        only_alerts = OnlyAlertsFilter()
+        only_alerts.timestamp = DEFAULT_TIMESTAMP_10Y_AGO
+        filters = [
+            AlwaysTrueFilter(),
+            only_alerts,
+            NXDomainFilter(),
+            WithPayloadFilter(),
+            WithPrintablePayloadFilter(),
+            EventTypeFilter(AlwaysTrueFilter(), ["flow"]),
+            EventTypeFilter(only_alerts, ["alert", "dns"]),
+            AndFilter(only_alerts, WithPayloadFilter(), reorder_every=1),
+            AndFilter(NotFilter(NXDomainFilter()), ExpressionFilter('event_type == "dns"'), reorder_every=1),
+            OrFilter(NXDomainFilter(), WithPrintablePayloadFilter(), reorder_every=1),
+            OrFilter(OnlyAlertsFilter(), WithPayloadFilter(), reorder_every=1),
+            NotFilter(only_alerts),
+        ]
+        for eve_file in ["eve-2.json", "eve_payload.json"]:
+            with open(BASEDIR.joinpath(eve_file), "rb") as eve:
+                lines = eve.read().splitlines()
+            for data_filter in filters:
+                with self.subTest(eve_file=eve_file, data_filter=data_filter):
+                    accepted = [line for line in lines if data_filter.accept(json.loads(line))]
+                    self.assertListEqual(
+                        [json.loads(line) for line in accepted],
+                        data_filter.accept_batch([json.loads(line) for line in lines])
+                    )
+                    survivors = list(prefilter(iter(lines), data_filter.needles))
+                    for line in accepted:
+                        self.assertIn(line, survivors)
+                    if data_filter.event_types is not None:
+                        for line in accepted:
+                            self.assertIn(json.loads(line)["event_type"], data_filter.event_types)
+
+    def test_combinators(self):
+        """
+        The cheap and selective filters end up first, without changing the result
+        :return:
+        """
+        with open(BASEDIR.joinpath("eve-2.json"), "rb") as eve:
+            events = [json.loads(line) for line in eve]
+        alerts = [event for event in events if event["event_type"] == "alert"]
+        nxdomain = NXDomainFilter()
+        and_filter = AndFilter(SlowFilter(), AlwaysTrueFilter(), nxdomain, reorder_every=2)
+        or_filter = OrFilter(SlowFilter(), ExpressionFilter('event_type == "alert"'), reorder_every=2)
+        for batch in range(0, len(events), 100):
+            self.assertListEqual(
+                nxdomain.accept_batch(events[batch:batch + 100]), and_filter.accept_batch(events[batch:batch + 100])
+            )
+            self.assertListEqual(events[batch:batch + 100], or_filter.accept_batch(events[batch:batch + 100]))
+        self.assertIs(nxdomain, and_filter.filters[0])
+        self.assertIsInstance(and_filter.filters[-1], SlowFilter)
+        self.assertIsInstance(or_filter.filters[0], ExpressionFilter)
+        self.assertTrue(all(and_filter.accept(event) == nxdomain.accept(event) for event in events))
+        self.assertEqual(("alert",), AndFilter(AlwaysTrueFilter(), OnlyAlertsFilter()).event_types)
+        self.assertIsNone(OrFilter(AlwaysTrueFilter(), OnlyAlertsFilter()).event_types)
+        self.assertEqual(len(events) - len(alerts), len(NotFilter(ExpressionFilter('event_type == "alert"')).accept_batch(events)))
+
+        report = AndFilter(NotFilter(nxdomain), and_filter).stats_report()
+        self.assertIn("NotFilter", report)
+        self.assertIn("    AndFilter", report)
+        self.assertIn("SlowFilter: accepted 100.0% of the samples", report)
+        with self.assertRaises(ValueError):
+            AndFilter()
+
 
 if __name__ == "__main__":
     unittest.main()
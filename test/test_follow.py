@@ -0,0 +1,107 @@
+"""
+Unit test for follow mode
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from suricatalog.filter import AlwaysTrueFilter
+from suricatalog.follow import follow_lines
+from suricatalog.log import EveLogHandler
+
+
+class FollowTestCase(unittest.TestCase):
+    """
+    Follow a file while it gets written and rotated
+    """
+
+    def __follow__(self, use_inotify: bool):
+        """
+        Write, rename and truncate a file while following it
+        :param use_inotify:
+        :return:
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            eve_file = Path(tmp_dir) / "eve.json"
+            eve_file.write_bytes(b'{"n":1}\n{"n":2}\n{"n":')
+
+            def writer():
+                time.sleep(0.2)
+                with open(eve_file, "ab") as eve:
+                    eve.write(b'3}\n{"n":4}\n')
+                time.sleep(0.2)
+                # logrotate 'create' style: rename, then a new file on the same path
+                os.rename(eve_file, Path(tmp_dir) / "eve.json.1")
+                eve_file.write_bytes(b'{"n":5}\n')
+                time.sleep(0.2)
+                # logrotate 'copytruncate' style
+                with open(eve_file, "r+b") as eve:
+                    eve.truncate(0)
+                time.sleep(0.2)
+                with open(eve_file, "ab") as eve:
+                    eve.write(b'{"n":6}\n')
+
+            write_thread = threading.Thread(target=writer)
+            write_thread.start()
+            deadline = time.monotonic() + 10
+            lines = []
+            for line in follow_lines(
+                eve_file,
+                1024,
+                stop=lambda: len(lines) >= 6 or time.monotonic() > deadline,
+                use_inotify=use_inotify,
+            ):
+                lines.append(line)
+            write_thread.join()
+            self.assertListEqual([f'{{"n":{n}}}'.encode() for n in range(1, 7)], lines)
+
+    def test_follow_inotify(self):
+        """
+        Follow using inotify, when available
+        :return:
+        """
+        self.__follow__(use_inotify=True)
+
+    def test_follow_polling(self):
+        """
+        Follow using adaptive polling
+        :return:
+        """
+        self.__follow__(use_inotify=False)
+
+    def test_get_events_follow(self):
+        """
+        The last file is followed, idle callbacks happen once the existing data was read
+        :return:
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            old_file = Path(tmp_dir) / "eve.json.1"
+            old_file.write_bytes(b'{"n":1}\n')
+            eve_file = Path(tmp_dir) / "eve.json"
+            eve_file.write_bytes(b'{"n":2}\n')
+            events = []
+            idle = []
+
+            def on_idle():
+                idle.append(len(events))
+                if len(idle) == 1:
+                    with open(eve_file, "ab") as eve:
+                        eve.write(b'{"n":3}\n')
+
+            for event in EveLogHandler(follow=True).get_events(
+                eve_files=[old_file, eve_file],
+                data_filter=AlwaysTrueFilter(),
+                stop=lambda: len(events) >= 3,
+                on_idle=on_idle,
+            ):
+                events.append(event)
+            self.assertListEqual([{"n": 1}, {"n": 2}, {"n": 3}], events)
+            self.assertEqual(2, idle[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
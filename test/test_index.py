@@ -0,0 +1,84 @@
+"""
+Unit test for the SQLite index
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from suricatalog.filter import AlwaysTrueFilter, NXDomainFilter, OnlyAlertsFilter
+from suricatalog.index import EveIndex
+from suricatalog.log import EveLogHandler
+from suricatalog.report import AggregatedFlowProtoReport
+from suricatalog.time import parse_timestamp
+
+BASEDIR = Path(__file__).parent
+
+
+class IndexTestCase(unittest.TestCase):
+    """
+    Indexed queries must return the same events as a full scan
+    """
+
+    def test_get_events(self):
+        """
+        Same events, in the same order, with and without the index
+        :return:
+        """
+        only_alerts = OnlyAlertsFilter()
+        only_alerts.timestamp = parse_timestamp("2022-02-08T11:40:00.000000-0500")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            eve_index = EveIndex(Path(tmp_dir) / "index.db")
+            eve_files = [BASEDIR.joinpath("eve-2.json"), BASEDIR.joinpath("eve_payload.json")]
+            for data_filter in [AlwaysTrueFilter(), only_alerts, NXDomainFilter()]:
+                with self.subTest(data_filter=data_filter):
+                    expected = list(
+                        EveLogHandler(seek_slack=None).get_events(eve_files=eve_files, data_filter=data_filter)
+                    )
+                    events = list(EveLogHandler(index=eve_index).get_events(eve_files=eve_files, data_filter=data_filter))
+                    self.assertListEqual(expected, events)
+            kwargs = {
+                "eve_files": eve_files,
+                "data_filter": AlwaysTrueFilter(),
+                "fields": AggregatedFlowProtoReport.fields,
+                "event_types": AggregatedFlowProtoReport.event_types
+            }
+            self.assertListEqual(
+                list(EveLogHandler().get_events(**kwargs)), list(EveLogHandler(index=eve_index).get_events(**kwargs))
+            )
+
+    def test_update_and_search(self):
+        """
+        Only new data is loaded, replaced files are loaded again
+        :return:
+        """
+        with open(BASEDIR.joinpath("eve-2.json"), "rb") as eve:
+            lines = eve.read().splitlines(keepends=True)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            eve_index = EveIndex(Path(tmp_dir) / "index.db")
+            eve_file = Path(tmp_dir) / "eve.json"
+            eve_file.write_bytes(b"".join(lines[:1000]) + lines[1000][:10])
+            self.assertEqual(1000, eve_index.update(eve_file))
+            self.assertEqual(0, eve_index.update(eve_file))
+            with open(eve_file, "ab") as eve:
+                eve.write(lines[1000][10:] + b"".join(lines[1001:]))
+            self.assertEqual(len(lines) - 1000, eve_index.update(eve_file))
+            self.assertEqual(len(lines), len(list(eve_index.search())))
+
+            dns = list(eve_index.search(src_ip="10.2.8.102", event_type=["dns"]))
+            self.assertTrue(dns)
+            self.assertTrue(all(event["src_ip"] == "10.2.8.102" and event["event_type"] == "dns" for event in dns))
+            self.assertEqual(2, len(list(eve_index.search(src_ip="10.2.8.102", limit=2))))
+            alert = next(eve_index.search(event_type="alert"))
+            matches = list(eve_index.search(signature_id=alert["alert"]["signature_id"], flow_id=alert["flow_id"]))
+            self.assertIn(alert, matches)
+            with self.assertRaises(ValueError):
+                list(eve_index.search(raw="x"))
+
+            eve_file.write_bytes(b'{"event_type":"flow"}\n')
+            self.assertEqual(1, eve_index.update(eve_file))
+            self.assertListEqual([{"event_type": "flow"}], list(eve_index.search()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Unit test for indicators of compromise
+"""
+
+import json
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from suricatalog.filter import IocFilter
+from suricatalog.ioc import DEFAULT_IOC_FIELDS, IocMatcher, field_value
+from suricatalog.report import IocReport
+
+BASEDIR = Path(__file__).parent
+
+
+def naive_find(indicators: list[str], text: str) -> set[str]:
+    """
+    :param indicators:
+    :param text:
+    :return: Indicators found on the text, one substring search at a time
+    """
+    return {indicator for indicator in indicators if indicator in text.lower()}
+
+
+class IocTestCase(unittest.TestCase):
+    """
+    The automaton finds the same indicators as substring searches
+    """
+
+    def test_matcher(self):
+        """
+        Overlapping indicators, indicators inside other indicators, case
+        :return:
+        """
+        indicators = ["he", "she", "his", "hers", "Evil.COM", "evil.com/payload", "  ", "x"]
+        matcher = IocMatcher(indicators)
+        self.assertEqual(7, len(matcher))
+        for text in ["ushers", "GET http://EVIL.com/payload.exe", "nothing to see", "", "hishe"]:
+            with self.subTest(text=text):
+                found = {matcher.indicators[idx] for idx in matcher.find(text.lower())}
+                self.assertSetEqual(naive_find(matcher.indicators, text), found)
+                self.assertEqual(bool(found), matcher.search(text.lower()))
+
+        rng = random.Random(7)
+        indicators = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 6))) for _ in range(300)]
+        matcher = IocMatcher(indicators)
+        for _ in range(200):
+            text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 40)))
+            self.assertSetEqual(naive_find(matcher.indicators, text), {matcher.indicators[idx] for idx in matcher.find(text)})
+
+    def test_cache(self):
+        """
+        The compiled automaton is saved once and loaded on the next runs
+        :return:
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            indicators_file = Path(tmp_dir) / "iocs.txt"
+            indicators_file.write_text("# Feed\nwpad.home\n\ncomodoca.com\n")
+            cache_dir = Path(tmp_dir) / "cache"
+            matcher = IocMatcher.from_file(indicators_file, cache_dir=cache_dir)
+            self.assertListEqual(["wpad.home", "comodoca.com"], matcher.indicators)
+            cached = list(cache_dir.glob("ioc-*.json"))
+            self.assertEqual(1, len(cached))
+            cached[0].write_bytes(cached[0].read_bytes().replace(b"wpad.home", b"wpad.cached"))
+            self.assertListEqual(
+                ["wpad.cached", "comodoca.com"], IocMatcher.from_file(indicators_file, cache_dir=cache_dir).indicators
+            )
+            cached[0].write_bytes(b"{}")
+            with self.assertLogs(level="WARNING"):
+                self.assertListEqual(matcher.indicators, IocMatcher.from_file(indicators_file, cache_dir=cache_dir).indicators)
+            indicators_file.write_text("other.example\n")
+            self.assertListEqual(["other.example"], IocMatcher.from_file(indicators_file, cache_dir=cache_dir).indicators)
+            self.assertEqual(2, len(list(cache_dir.glob("ioc-*.json"))))
+
+    def test_filter_and_report(self):
+        """
+        Same events and counts as substring searches over the same fields
+        :return:
+        """
+        with open(BASEDIR.joinpath("eve-2.json"), "rb") as eve:
+            events = [json.loads(line) for line in eve]
+        paths = [tuple(field.split(".")) for field in DEFAULT_IOC_FIELDS]
+        indicators = ["TTIsecurity", "bing.com", "microsoft", "not-there.example"]
+        data_filter = IocFilter(indicators)
+        expected = [
+            event for event in events
+            if any(
+                naive_find(data_filter.matcher.indicators, value)
+                for value in (field_value(event, path) for path in paths) if isinstance(value, str)
+            )
+        ]
+        self.assertTrue(expected)
+        self.assertListEqual(expected, data_filter.accept_batch(events))
+
+        report = IocReport(matcher=data_filter.matcher)
+        report.ingest_batch(events)
+        self.assertNotIn("not-there.example", report.hits)
+        self.assertEqual(
+            sum(
+                "bing.com" in " ".join(value.lower() for value in (field_value(event, path) for path in paths) if isinstance(value, str))
+                for event in events
+            ),
+            report.hits["bing.com"]
+        )
+        self.assertTrue(set(report.field_hits) <= set(DEFAULT_IOC_FIELDS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Unit test for sets of networks
+"""
+
+import json
+import random
+import tempfile
+import unittest
+from ipaddress import ip_address, ip_network
+from pathlib import Path
+
+from suricatalog.filter import IpSetFilter
+from suricatalog.ipset import IpSet, single_network
+from suricatalog.report import HostDataUseReport
+
+BASEDIR = Path(__file__).parent
+
+
+class IpSetTestCase(unittest.TestCase):
+    """
+    Lookups give the same answers as ipaddress
+    """
+
+    def test_contains(self):
+        """
+        IPv4 and IPv6, overlapping and adjacent networks, anything that is not an address
+        :return:
+        """
+        networks = ["10.0.0.0/8", "10.1.0.0/16", "192.168.1.0/25", "192.168.1.128/25", "172.16.5.4", "2001:db8::/32"]
+        ip_set = IpSet(networks)
+        self.assertEqual(4, len(ip_set))
+        for candidate, expected in {
+            "10.255.255.255": True,
+            "11.0.0.0": False,
+            "192.168.1.200": True,
+            "192.168.2.0": False,
+            "172.16.5.4": True,
+            "172.16.5.5": False,
+            "2001:db8:ffff::1": True,
+            "2001:0db8:0000:0000:0000:0000:0000:0001": True,
+            "2001:db9::": False,
+            "::ffff:10.0.0.1": False,
+            "not an address": False,
+            None: False,
+            10: False,
+        }.items():
+            with self.subTest(candidate=candidate):
+                self.assertEqual(expected, candidate in ip_set)
+        with self.assertRaises(ValueError):
+            IpSet(["10.0.0.0/33"])
+
+        rng = random.Random(42)
+        parsed = [ip_network((rng.getrandbits(32), rng.randint(8, 32)), strict=False) for _ in range(2_000)]
+        ip_set = IpSet(parsed)
+        for _ in range(2_000):
+            address = ip_address(rng.getrandbits(32))
+            self.assertEqual(any(address in network for network in parsed), str(address) in ip_set)
+
+    def test_parse(self):
+        """
+        Comma separated networks, or a file with comments
+        :return:
+        """
+        self.assertIn("10.2.3.4", IpSet.parse("192.168.0.0/16,10.0.0.0/8"))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            networks_file = Path(tmp_dir) / "blocklist.txt"
+            networks_file.write_text("# Feed\n10.0.0.0/8  # internal\n\n2001:db8::/32\n")
+            ip_set = IpSet.parse(str(networks_file))
+            self.assertEqual(str(networks_file), str(ip_set))
+            self.assertIn("2001:db8::1", ip_set)
+            self.assertNotIn("192.168.0.1", ip_set)
+
+    def test_filter(self):
+        """
+        Events with either address in the set, and netflow bytes to a network
+        :return:
+        """
+        with open(BASEDIR.joinpath("eve_udp_flow.json"), "rb") as eve:
+            events = [json.loads(line) for line in eve]
+        data_filter = IpSetFilter(["224.0.0.0/4"])
+        expected = [event for event in events if ip_address(event["dest_ip"]).is_multicast]
+        self.assertTrue(expected)
+        self.assertListEqual(expected, data_filter.accept_batch(events))
+        self.assertListEqual(expected, [event for event in events if data_filter.accept(event)])
+        self.assertListEqual([], IpSetFilter(["224.0.0.0/4"], ip_fields=["src_ip"]).accept_batch(events))
+
+        report = HostDataUseReport()
+        report.ingest_batch(events, IpSet(["224.0.0.0/4"]))
+        single = HostDataUseReport()
+        single.ingest_batch(events, "224.0.0.251")
+        self.assertEqual(153339, single.bytes)
+        self.assertIs(single_network("224.0.0.251"), single_network("224.0.0.251"))
+        self.assertLessEqual(single.bytes, report.bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
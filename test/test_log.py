@@ -3,18 +3,40 @@ Unit test for logging
 """
 
 import bz2
+import gzip
 import logging
+import lzma
 import tempfile
+import threading
 import unittest
 from datetime import datetime
 from pathlib import Path
+from unittest.mock import Mock, patch
 
 import orjson
 import pytz
 
-from suricatalog.filter import AlwaysTrueFilter, OnlyAlertsFilter, TimestampFilter
-from suricatalog.log import EveLogHandler
-from suricatalog.time import parse_timestamp, to_utc
+from suricatalog.filter import (
+    AlwaysTrueFilter,
+    NXDomainFilter,
+    OnlyAlertsFilter,
+    TimestampFilter,
+)
+from suricatalog.log import (
+    EveLogHandler,
+    detect_compression,
+    find_timestamp_offset,
+    mmap_lines,
+    notify_malformed,
+    open_eve,
+    prefilter,
+    project,
+    projection,
+    read_lines,
+    split_ranges,
+)
+from suricatalog.report import AggregatedFlowProtoReport
+from suricatalog.time import DEFAULT_TIMESTAMP_10Y_AGO, parse_timestamp, to_utc
 
 BASEDIR = Path(__file__).parent
 
@@ -198,5 +220,353 @@ class SuricataLogTestCase(unittest.TestCase):
                             self.assertIn(expected_subkey, sub_keys)
 
 
+class EveReaderTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Unit test for the binary eve reader
+    """
+
+    def test_read_lines(self):
+        """
+        Lines split across blocks must come back whole, with or without a trailing newline
+        :return:
+        """
+        eve_file = BASEDIR.joinpath("eve-2.json")
+        with open(eve_file, "rb") as eve:
+            expected = eve.read().splitlines()
+        for block_size in [1, 7, 4096, 16 * 1024 * 1024]:
+            with self.subTest(block_size=block_size):
+                self.assertListEqual(expected, list(read_lines(eve_file, block_size)))
+        with tempfile.NamedTemporaryFile(mode="wb", suffix=".json") as partial:
+            partial.write(b'{"a":1}\n\n{"b":2}')
+            partial.flush()
+            self.assertListEqual(
+                [b'{"a":1}', b'{"b":2}'], list(read_lines(partial.name, 5))
+            )
+
+    def test_get_events_binary(self):
+        """
+        Events parsed from bytes must match the ones parsed from text
+        :return:
+        """
+        eve_file = BASEDIR.joinpath("eve-2.json")
+        with open(eve_file, encoding="utf-8") as eve:
+            expected = [orjson.loads(line) for line in eve]
+        events = list(
+            EveLogHandler(block_size=1024).get_events(
+                eve_files=[eve_file], data_filter=AlwaysTrueFilter()
+            )
+        )
+        self.assertListEqual(expected, events)
+
+    def test_split_ranges(self):
+        """
+        Ranges must cover the whole file and end right after a newline
+        :return:
+        """
+        eve_file = BASEDIR.joinpath("eve-2.json")
+        with open(eve_file, "rb") as eve:
+            data = eve.read()
+        ranges = split_ranges(eve_file, 100_000)
+        self.assertGreater(len(ranges), 1)
+        self.assertEqual(0, ranges[0][0])
+        self.assertEqual(len(data), ranges[-1][1])
+        lines = []
+        for start, end in ranges:
+            self.assertEqual(b"\n", data[end - 1:end])
+            lines.extend(read_lines(eve_file, 4096, start, end))
+        self.assertListEqual(data.splitlines(), lines)
+
+    def test_get_events_parallel(self):
+        """
+        Parallel parsing must return the same events as the sequential reader
+        :return:
+        """
+        eve_files = [BASEDIR.joinpath("eve-2.json"), BASEDIR.joinpath("eve_payload.json")]
+        only_alerts_filter = OnlyAlertsFilter()
+        only_alerts_filter.timestamp = DEFAULT_TIMESTAMP_10Y_AGO
+        for data_filter in [AlwaysTrueFilter(), only_alerts_filter]:
+            expected = list(EveLogHandler().get_events(eve_files=eve_files, data_filter=data_filter))
+            ordered = list(
+                EveLogHandler(workers=2, range_size=100_000).get_events(
+                    eve_files=eve_files, data_filter=data_filter
+                )
+            )
+            self.assertListEqual(expected, ordered)
+            unordered = list(
+                EveLogHandler(workers=2, ordered=False, range_size=100_000).get_events(
+                    eve_files=eve_files, data_filter=data_filter
+                )
+            )
+            self.assertEqual(len(expected), len(unordered))
+            for event in unordered:
+                self.assertIn(event, expected)
+
+    def test_compressed(self):
+        """
+        Compressed eve files must return the same events as the plain file
+        :return:
+        """
+        eve_file = BASEDIR.joinpath("eve-2.json")
+        with open(eve_file, "rb") as eve:
+            data = eve.read()
+        expected = list(EveLogHandler().get_events(eve_files=[eve_file], data_filter=AlwaysTrueFilter()))
+        compressors = {"gzip": gzip.compress, "bzip2": bz2.compress, "xz": lzma.compress}
+        try:
+            import zstandard
+
+            compressors["zstd"] = zstandard.ZstdCompressor().compress
+        except ImportError:
+            pass
+        self.assertIsNone(detect_compression(eve_file))
+        for compression, compress in compressors.items():
+            with self.subTest(compression=compression), tempfile.NamedTemporaryFile(
+                mode="wb", suffix=".json.1"
+            ) as compressed:
+                compressed.write(compress(data))
+                compressed.flush()
+                self.assertEqual(compression, detect_compression(compressed.name))
+                events = list(
+                    EveLogHandler(block_size=10_000, workers=2).get_events(
+                        eve_files=[compressed.name], data_filter=AlwaysTrueFilter()
+                    )
+                )
+                self.assertListEqual(expected, events)
+        large = list(
+            EveLogHandler().get_events(
+                eve_files=[BASEDIR.joinpath("eve_large.json.bz2")], data_filter=AlwaysTrueFilter()
+            )
+        )
+        self.assertEqual(40231, len(large))
+
+    def test_early_close(self):
+        """
+        A compressed file read only partially stops its decompressor thread before the stream is closed
+        :return:
+        """
+        with open(BASEDIR.joinpath("eve-2.json"), "rb") as eve:
+            data = eve.read()
+        reader_alive = []
+
+        def tracking_open(eve_file):
+            stream = open_eve(eve_file)
+            close = stream.close
+
+            def checked_close():
+                reader_alive.append(any(thread.name == "eve-decompress" for thread in threading.enumerate()))
+                close()
+
+            stream.close = checked_close
+            return stream
+
+        with tempfile.NamedTemporaryFile(mode="wb", suffix=".json.gz") as compressed:
+            compressed.write(gzip.compress(data))
+            compressed.flush()
+            with patch("suricatalog.log.open_eve", tracking_open):
+                lines = read_lines(compressed.name, block_size=4096)
+                self.assertEqual(data.split(b"\n", 1)[0], next(lines))
+                lines.close()
+        self.assertListEqual([False], reader_alive)
+
+    def test_seek_timestamp(self):
+        """
+        Seeking to the first recent event must return the same events as reading the whole file
+        :return:
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            large_file = Path(tmp_dir) / "eve_large.json"
+            large_file.write_bytes(bz2.decompress(BASEDIR.joinpath("eve_large.json.bz2").read_bytes()))
+            for eve_file in [BASEDIR.joinpath("eve-2.json"), large_file]:
+                with open(eve_file, "rb") as eve:
+                    lines = eve.read().splitlines()
+                timestamp = parse_timestamp(orjson.loads(lines[len(lines) // 2])["timestamp"])
+                offset = find_timestamp_offset(eve_file, timestamp)
+                self.assertGreater(offset, 0)
+                for data_filter in [TimestampFilter(), OnlyAlertsFilter()]:
+                    data_filter.timestamp = timestamp
+                    expected = list(
+                        EveLogHandler(seek_slack=None).get_events(eve_files=[eve_file], data_filter=data_filter)
+                    )
+                    for workers in [1, 2]:
+                        with self.subTest(eve_file=eve_file.name, filter=data_filter, workers=workers):
+                            events = list(
+                                EveLogHandler(workers=workers, range_size=64 * 1024).get_events(
+                                    eve_files=[eve_file], data_filter=data_filter
+                                )
+                            )
+                            self.assertListEqual(expected, events)
+            self.assertEqual(0, find_timestamp_offset(large_file, DEFAULT_TIMESTAMP_10Y_AGO))
+
+    def test_mmap(self):
+        """
+        Memory mapped lines must match the lines read in blocks, for any range and needles
+        :return:
+        """
+        for eve_file in [BASEDIR.joinpath("eve-2.json"), BASEDIR.joinpath("eve_payload.json")]:
+            for needles in [(), (b'"event_type":"alert"',), (b'"event_type":"alert"', b'"payload"')]:
+                for start, end in split_ranges(eve_file, 100_000) + [(0, None)]:
+                    with self.subTest(eve_file=eve_file.name, needles=needles, start=start):
+                        expected = list(prefilter(read_lines(eve_file, 4096, start, end), needles))
+                        self.assertListEqual(expected, [bytes(line) for line in mmap_lines(eve_file, needles, start, end)])
+            expected = list(EveLogHandler().get_events(eve_files=[eve_file], data_filter=OnlyAlertsFilter()))
+            for workers in [1, 2]:
+                events = list(
+                    EveLogHandler(workers=workers, range_size=100_000, use_mmap=True).get_events(
+                        eve_files=[eve_file], data_filter=OnlyAlertsFilter()
+                    )
+                )
+                self.assertListEqual(expected, events)
+        with tempfile.NamedTemporaryFile(mode="wb", suffix=".json") as partial:
+            self.assertListEqual([], list(mmap_lines(partial.name)))
+            partial.write(b'{"a":1}\n\n{"b":2}')
+            partial.flush()
+            self.assertListEqual([b'{"a":1}', b'{"b":2}'], [bytes(line) for line in mmap_lines(partial.name)])
+
+    def test_projection(self):
+        """
+        Projected events keep only the requested fields, plus the ones read by the filter
+        :return:
+        """
+        self.assertIsNone(projection(None, AlwaysTrueFilter()))
+        self.assertIsNone(projection(["event_type"], FilterWithoutFields()))
+        tree = projection(["event_type", "http", "http.http_user_agent", "netflow.bytes"], NXDomainFilter())
+        self.assertDictEqual(
+            {"event_type": None, "http": None, "netflow": {"bytes": None}, "dns": {"rcode": None}}, tree
+        )
+        event = {
+            "event_type": "netflow", "payload": "big", "netflow": {"bytes": 10, "pkts": 2}, "http": {"a": 1}
+        }
+        self.assertDictEqual(
+            {"event_type": "netflow", "netflow": {"bytes": 10}, "http": {"a": 1}}, project(event, tree)
+        )
+
+        eve_file = BASEDIR.joinpath("eve-2.json")
+        data_filter = TimestampFilter()
+        data_filter.timestamp = DEFAULT_TIMESTAMP_10Y_AGO
+        fields = ["event_type", "proto", "dest_port", "flow.bytes_toserver"]
+        tree = projection(fields, data_filter)
+        expected = [
+            project(event, tree) for event in EveLogHandler().get_events(eve_files=[eve_file], data_filter=data_filter)
+        ]
+        self.assertEqual(2401, len(expected))
+        self.assertTrue(any("flow" in event for event in expected))
+        self.assertTrue(all(set(event.get("flow", {})) <= {"bytes_toserver"} for event in expected))
+        for workers in [1, 2]:
+            with self.subTest(workers=workers):
+                events = list(
+                    EveLogHandler(workers=workers, range_size=100_000).get_events(
+                        eve_files=[eve_file], data_filter=data_filter, fields=fields
+                    )
+                )
+                self.assertListEqual(expected, events)
+                self.assertTrue(all(data_filter.accept(event) for event in events))
+
+    def test_merge(self):
+        """
+        Events of several files come out in timestamp order
+        :return:
+        """
+        with open(BASEDIR.joinpath("eve-2.json"), "rb") as eve:
+            lines = sorted(eve.read().splitlines(), key=lambda line: orjson.loads(line)["timestamp"])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            eve_files = []
+            for sensor in range(3):
+                eve_file = Path(tmp_dir) / f"eve-{sensor}.json"
+                eve_file.write_bytes(b"\n".join(lines[sensor::3]) + b"\n")
+                eve_files.append(eve_file)
+            expected = [orjson.loads(line) for line in lines]
+            for eve_lh in [EveLogHandler(merge=True), EveLogHandler(merge=True, workers=2, range_size=64 * 1024)]:
+                events = list(eve_lh.get_events(eve_files=eve_files, data_filter=AlwaysTrueFilter()))
+                self.assertListEqual([event["timestamp"] for event in expected], [event["timestamp"] for event in events])
+                self.assertCountEqual(expected, events)
+            events = list(
+                EveLogHandler(merge=True).get_events(
+                    eve_files=eve_files, data_filter=AlwaysTrueFilter(), fields=["event_type"]
+                )
+            )
+            self.assertListEqual([event["timestamp"] for event in expected], [event["timestamp"] for event in events])
+
+    async def test_event_batches(self):
+        """
+        Batches hold the same events as get_events, and reports ingest them like one event at a time
+        :return:
+        """
+        eve_files = [BASEDIR.joinpath("eve-2.json"), BASEDIR.joinpath("eve_payload.json")]
+        expected = list(EveLogHandler().get_events(eve_files=eve_files, data_filter=AlwaysTrueFilter()))
+        for eve_lh in [EveLogHandler(), EveLogHandler(workers=2, range_size=100_000), EveLogHandler(merge=True)]:
+            batches = list(eve_lh.get_event_batches(eve_files=eve_files, data_filter=AlwaysTrueFilter(), batch_size=100))
+            self.assertTrue(all(0 < len(batch) <= 100 for batch in batches))
+            self.assertCountEqual(expected, [event for batch in batches for event in batch])
+
+        kwargs = {
+            "eve_files": eve_files,
+            "data_filter": AlwaysTrueFilter(),
+            "fields": AggregatedFlowProtoReport.fields,
+            "event_types": AggregatedFlowProtoReport.event_types
+        }
+        single = AggregatedFlowProtoReport()
+        for event in EveLogHandler().get_events(**kwargs):
+            await single.ingest_data(event)
+        batched = AggregatedFlowProtoReport()
+        for batch in EveLogHandler().get_event_batches(**kwargs):
+            batched.ingest_batch(batch)
+        self.assertTrue(batched.port_proto_count)
+        self.assertDictEqual(single.port_proto_count, batched.port_proto_count)
+
+    def test_malformed(self):
+        """
+        Lines that are not valid JSON are counted, quarantined and logged once, not once per line
+        :return:
+        """
+        with open(BASEDIR.joinpath("eve-2.json"), "rb") as eve:
+            lines = eve.read().splitlines(keepends=True)
+        garbage = [b"\x00\xff\xfe garbage\n", lines[1][:50] + b"\n", b'{"event_type": NaN, "value": NaN}\n']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            eve_file = Path(tmp_dir) / "eve.json"
+            eve_file.write_bytes(b"".join(lines[:100] + garbage[:2] * 500 + garbage[2:] + lines[100:]))
+            quarantine_file = Path(tmp_dir) / "quarantine.json"
+            for workers in [1, 2]:
+                with self.subTest(workers=workers), self.assertLogs("suricatalog.log", logging.WARNING) as logs:
+                    quarantine_file.unlink(missing_ok=True)
+                    eve_lh = EveLogHandler(workers=workers, range_size=64 * 1024, quarantine_file=quarantine_file)
+                    events = list(eve_lh.get_events(eve_files=[eve_file], data_filter=AlwaysTrueFilter()))
+                    self.assertEqual(len(lines) + 1, len(events))
+                    self.assertEqual(1000, eve_lh.malformed.count)
+                    self.assertEqual(b"".join(garbage[:2] * 500), quarantine_file.read_bytes())
+                    self.assertEqual(2, len(logs.records))
+                    self.assertIn("Skipped 1000 lines", logs.output[-1])
+                    app = Mock()
+                    notify_malformed(app, eve_lh)
+                    self.assertIn("1,000 lines skipped", app.notify.call_args.kwargs["message"])
+        app = Mock()
+        notify_malformed(app, EveLogHandler())
+        app.notify.assert_not_called()
+
+    def test_logger_setup(self):
+        """
+        Creating many handlers does not duplicate the log output
+        :return:
+        """
+        logger = EveLogHandler().logger
+        handlers = len(logger.handlers)
+        for _ in range(3):
+            EveLogHandler()
+        self.assertEqual(handlers, len(logger.handlers))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_file = Path(tmp_dir) / "suricatalog.log"
+            EveLogHandler(log_file=log_file)
+            EveLogHandler(log_file=str(log_file))
+            self.assertEqual(handlers, len(logger.handlers))
+            self.assertTrue(any(getattr(handler, "baseFilename", None) == str(log_file) for handler in logger.handlers))
+            EveLogHandler()
+        self.assertEqual(handlers, len(logger.handlers))
+
+
+class FilterWithoutFields(AlwaysTrueFilter):
+    """
+    Filter that may read any field
+    """
+    fields = None
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -97,7 +97,7 @@ class MiniAppsTestCase(unittest.IsolatedAsyncioTestCase):
         async with app.run_test() as pilot:
             netflow = app.query(Digits).first()
             self.assertIsNotNone(netflow)
-            self.assertEqual("0 bytes", netflow.value)
+            self.assertEqual("153339 bytes", netflow.value)
             await pilot.pause()
             await pilot.press("q")
 
@@ -3,13 +3,23 @@ Unit test for reports
 """
 
 import json
+import tempfile
 import unittest
+from functools import partial
+from pathlib import Path
 from unittest import IsolatedAsyncioTestCase
 
+from suricatalog.checkpoint import CheckpointStore
+from suricatalog.filter import AlwaysTrueFilter
+from suricatalog.ioc import IocMatcher
+from suricatalog.log import EveLogHandler
 from suricatalog.report import (
     AggregatedFlowProtoReport,
+    DistinctCountReport,
     HostDataUseReport,
+    IocReport,
     TopUserAgents,
+    TopValues,
 )
 from test.test_log import BASEDIR
 
@@ -80,3 +90,71 @@ class ReportTestCase(IsolatedAsyncioTestCase):
         self.assertIsNotNone(tua.agents)
         self.assertTrue("test" in tua.agents)
         self.assertEqual(10, len(tua.agents))
+
+
+class MergeTestCase(unittest.TestCase):
+    """
+    Partial reports merged together, or rebuilt from their state, are the same as one report of all the events
+    """
+
+    def test_merge(self):
+        """
+        Reports of each chunk of the events, merged in any order
+        :return:
+        """
+        with open(BASEDIR.joinpath("eve-2.json"), "rb") as eve:
+            events = [json.loads(line) for line in eve]
+        matcher = IocMatcher(["bing.com", "microsoft"])
+        for factory, ingest_args, from_state in [
+            (AggregatedFlowProtoReport, {}, AggregatedFlowProtoReport.from_state),
+            (HostDataUseReport, {"dest": "10.2.8.1"}, HostDataUseReport.from_state),
+            (TopUserAgents, {}, TopUserAgents.from_state),
+            (partial(TopValues, field="alert.signature"), {}, TopValues.from_state),
+            (partial(IocReport, matcher=matcher), {}, partial(IocReport.from_state, matcher=matcher)),
+            (partial(DistinctCountReport, key_field="src_ip", value_field="dest_port"), {}, DistinctCountReport.from_state),
+        ]:
+            with self.subTest(report=factory):
+                expected = factory()
+                expected.ingest_batch(events, **ingest_args)
+                partials = []
+                for idx in range(0, len(events), 700):
+                    chunk = factory()
+                    chunk.ingest_batch(events[idx:idx + 700], **ingest_args)
+                    partials.append(chunk)
+                merged = factory()
+                for chunk in reversed(partials):
+                    merged.merge(chunk)
+                self.assertEqual(expected, merged)
+                self.assertEqual(expected, from_state(json.loads(json.dumps(merged.to_state()))))
+        first = TopUserAgents()
+        first.ingest_batch(events)
+        self.assertDictEqual({}, TopUserAgents().agents)
+
+    def test_aggregate(self):
+        """
+        Ranges aggregated on the workers, with and without a checkpoint
+        :return:
+        """
+        eve_file = BASEDIR.joinpath("eve-2.json")
+        expected = AggregatedFlowProtoReport()
+        ingested = EveLogHandler().aggregate(expected, eve_files=[eve_file], data_filter=AlwaysTrueFilter())
+        self.assertEqual(sum(expected.port_proto_count.values()), ingested)
+        eve_lh = EveLogHandler(workers=2, range_size=64 * 1024)
+        report = AggregatedFlowProtoReport()
+        eve_lh.aggregate(report, eve_files=[eve_file], data_filter=AlwaysTrueFilter())
+        self.assertEqual(expected, report)
+
+        with open(eve_file, "rb") as eve:
+            lines = eve.read().splitlines(keepends=True)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = CheckpointStore(Path(tmp_dir) / "checkpoints.json")
+            growing = Path(tmp_dir) / "eve.json"
+            growing.write_bytes(b"".join(lines[:1000]) + lines[1000][:20])
+            report = AggregatedFlowProtoReport()
+            checkpoint = store.load("flow")
+            first_run = eve_lh.aggregate(report, eve_files=[growing], data_filter=AlwaysTrueFilter(), checkpoint=checkpoint)
+            self.assertEqual(sum(b'"event_type":"flow"' in line for line in lines[:1000]), first_run)
+            growing.write_bytes(b"".join(lines))
+            second_run = eve_lh.aggregate(report, eve_files=[growing], data_filter=AlwaysTrueFilter(), checkpoint=checkpoint)
+            self.assertEqual(sum(expected.port_proto_count.values()), first_run + second_run)
+            self.assertEqual(expected, report)
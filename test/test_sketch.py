@@ -0,0 +1,223 @@
+"""
+Unit test for heavy hitters and distinct counts
+"""
+
+import json
+import math
+import random
+import unittest
+from collections import Counter
+from pathlib import Path
+
+from suricatalog.report import (
+    DISTINCT_REPORTS,
+    TOP_VALUE_FIELDS,
+    DistinctCountReport,
+    TopValues,
+)
+from suricatalog.sketch import HeavyHitters, HyperLogLog
+
+BASEDIR = Path(__file__).parent
+
+
+def skewed_stream(rng: random.Random, size: int) -> list[str]:
+    """
+    A few popular values, like the user agents of real browsers, and a long tail of random ones, like scanners
+    :param rng:
+    :param size:
+    :return:
+    """
+    return [
+        f"popular-{int(rng.paretovariate(1.2))}" if rng.random() < 0.7 else f"random-{rng.getrandbits(32)}"
+        for _ in range(size)
+    ]
+
+
+class HeavyHittersTestCase(unittest.TestCase):
+    """
+    Counts stay within the guaranteed bounds, alone or merged
+    """
+
+    def assertBounds(self, expected: Counter, hitters: HeavyHitters):
+        """
+        :param expected: Exact counts
+        :param hitters:
+        :return:
+        """
+        self.assertEqual(expected.total(), hitters.total)
+        self.assertLessEqual(len(hitters.counts), hitters.capacity)
+        self.assertLessEqual(hitters.error, hitters.total / (hitters.capacity + 1))
+        for value, count in expected.items():
+            estimate = hitters.counts.get(value, 0)
+            self.assertLessEqual(estimate, count)
+            self.assertLessEqual(count, estimate + hitters.error)
+            if count > hitters.error:
+                self.assertIn(value, hitters.counts)
+
+    def test_bounds(self):
+        """
+        Single summary, one value or a batch at a time, and exact while it fits
+        :return:
+        """
+        rng = random.Random(42)
+        values = skewed_stream(rng, 20_000)
+        hitters = HeavyHitters(capacity=100)
+        for idx in range(0, len(values), 1_000):
+            hitters.update(values[idx:idx + 1_000])
+        self.assertBounds(Counter(values), hitters)
+        self.assertGreater(hitters.error, 0)
+        self.assertEqual("popular-1", hitters.top(1)[0][0])
+
+        small = HeavyHitters(capacity=100)
+        small.update(values[:50])
+        self.assertEqual(0, small.error)
+        self.assertDictEqual(dict(Counter(values[:50])), small.counts)
+        exact = HeavyHitters(capacity=None)
+        exact.update(values)
+        self.assertDictEqual(dict(Counter(values)), exact.counts)
+        with self.assertRaises(ValueError):
+            HeavyHitters(capacity=0)
+
+    def test_merge(self):
+        """
+        Partial summaries, like the ones of the workers, merged in any order
+        :return:
+        """
+        rng = random.Random(7)
+        values = skewed_stream(rng, 30_000)
+        partials = []
+        for idx in range(0, len(values), 3_000):
+            partial = HeavyHitters(capacity=64)
+            partial.update(values[idx:idx + 3_000])
+            partials.append(partial)
+        rng.shuffle(partials)
+        merged = HeavyHitters(capacity=64)
+        for partial in partials:
+            merged.merge(partial)
+        self.assertBounds(Counter(values), merged)
+        self.assertEqual(merged, HeavyHitters.from_state(json.loads(json.dumps(merged.to_state()))))
+
+    def test_top_values(self):
+        """
+        Every field of the top report, and the checkpoints saved before the counts were bounded
+        :return:
+        """
+        with open(BASEDIR.joinpath("eve-2.json"), "rb") as eve:
+            events = [json.loads(line) for line in eve]
+        for name, field in TOP_VALUE_FIELDS.items():
+            with self.subTest(name=name):
+                report = TopValues(field=field)
+                report.ingest_batch(events)
+                first, *rest = field.split(".")
+                expected = Counter()
+                for event in events:
+                    value = event.get(first)
+                    for key in rest:
+                        value = value.get(key) if isinstance(value, dict) else None
+                    if value:
+                        expected[value] += 1
+                self.assertDictEqual(dict(expected), report.top())
+                self.assertEqual(0, report.hitters.error)
+
+    def test_from_checkpoint(self):
+        """
+        A checkpoint resumed with another budget keeps the bounds, one of another field is rejected
+        :return:
+        """
+        rng = random.Random(11)
+        values = skewed_stream(rng, 20_000)
+        saved = TopValues(field="value", counters=None)
+        saved.ingest_batch({"value": value} for value in values[:10_000])
+        state = json.loads(json.dumps(saved.to_state()))
+        resumed = TopValues.from_checkpoint(state, field="value", counters=64)
+        self.assertEqual(64, resumed.counters)
+        resumed.ingest_batch({"value": value} for value in values[10_000:])
+        self.assertBounds(Counter(values), resumed.hitters)
+        grown = TopValues.from_checkpoint(resumed.to_state(), field="value", counters=None)
+        self.assertEqual(resumed.hitters.error, grown.hitters.error)
+        self.assertEqual(resumed.top(), grown.top())
+        with self.assertRaises(ValueError):
+            TopValues.from_checkpoint(state, field="alert.signature", counters=64)
+
+
+class HyperLogLogTestCase(unittest.TestCase):
+    """
+    Distinct counts are exact for small sets, and within a few standard errors for large ones
+    """
+
+    def test_count(self):
+        """
+        From exact hashes to registers, merged and saved
+        :return:
+        """
+        for size in [0, 1, 256, 257, 5_000, 200_000]:
+            with self.subTest(size=size):
+                counter = HyperLogLog()
+                counter.update(f"10.{idx >> 16 & 255}.{idx >> 8 & 255}.{idx & 255}" for idx in range(size))
+                counter.update(["10.0.0.0"] * 10)
+                expected = max(size, 1)
+                if counter.registers is None:
+                    self.assertEqual(expected, counter.count())
+                    self.assertEqual(0, counter.error)
+                else:
+                    self.assertLess(abs(counter.count() - expected), 4 * counter.error * expected)
+                self.assertEqual(counter, HyperLogLog.from_state(json.loads(json.dumps(counter.to_state()))))
+
+        everything = HyperLogLog(precision=10)
+        everything.update(range(90_000))
+        for split in [10, 50_000]:
+            first, second = HyperLogLog(precision=10), HyperLogLog(precision=10)
+            first.update(range(split + 30))
+            second.update(range(split, 90_000))
+            self.assertEqual(everything, first.merge(second))
+            self.assertEqual(everything.count(), HyperLogLog(precision=10).merge(second).merge(first).count())
+        with self.assertRaises(ValueError):
+            everything.merge(HyperLogLog())
+        with self.assertRaises(ValueError):
+            HyperLogLog(precision=17)
+
+        for precision in [4, 5, 6, 7]:
+            with self.subTest(precision=precision):
+                estimates = []
+                for seed in range(50):
+                    counter = HyperLogLog(precision=precision)
+                    counter.update(f"{seed}-{idx}" for idx in range(2_000))
+                    estimates.append(counter.count())
+                # The mean of independent estimates has a fraction of the error of each one
+                self.assertLess(abs(sum(estimates) / len(estimates) - 2_000), 3 * counter.error * 2_000 / math.sqrt(len(estimates)))
+
+    def test_distinct_report(self):
+        """
+        Same as sets of values per key while they are small, within the error after
+        :return:
+        """
+        with open(BASEDIR.joinpath("eve-2.json"), "rb") as eve:
+            events = [json.loads(line) for line in eve]
+        for name, (key_field, value_field) in DISTINCT_REPORTS.items():
+            with self.subTest(name=name):
+                expected: dict = {}
+                for event in events:
+                    if event.get("event_type") == "flow" and key_field in event and value_field in event:
+                        expected.setdefault(event[key_field], set()).add(event[value_field])
+                report = DistinctCountReport(key_field=key_field, value_field=value_field)
+                for idx in range(0, len(events), 500):
+                    report.ingest_batch(events[idx:idx + 500])
+                self.assertTrue(expected)
+                top = report.top()
+                self.assertSetEqual(set(expected), {key for key, _, _ in top})
+                for key, count, error in top:
+                    if error:
+                        self.assertLess(abs(count - len(expected[key])), 4 * error * len(expected[key]))
+                    else:
+                        self.assertEqual(len(expected[key]), count)
+                self.assertEqual(report, DistinctCountReport.from_state(json.loads(json.dumps(report.to_state()))))
+                state = json.loads(json.dumps(report.to_state()))
+                self.assertEqual(report, DistinctCountReport.from_checkpoint(state, key_field, value_field, 12))
+                with self.assertRaises(ValueError):
+                    DistinctCountReport.from_checkpoint(state, key_field, value_field, 10)
+                with self.assertRaises(ValueError):
+                    DistinctCountReport.from_checkpoint(state, value_field, key_field, 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+"""
+Unit test for reading eve events from a unix socket
+"""
+
+import contextlib
+import io
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from suricatalog.filter import AlwaysTrueFilter, OnlyAlertsFilter
+from suricatalog.log import EveLogHandler
+from suricatalog.scripts import eve_json, eve_log
+from suricatalog.stream import READ_SIZE, TOO_LONG_HEAD, UnixStreamReader, is_unix_source, unix_socket_path
+from suricatalog.time import DEFAULT_TIMESTAMP_10Y_AGO
+
+BASEDIR = Path(__file__).parent
+
+
+def replay(socket_path: Path, data: bytes, chunk_size: int = 1000, delay: float = 0.0) -> threading.Thread:
+    """
+    Act like Suricata: connect to the socket as soon as it shows up and write the data, in chunks
+    :param socket_path:
+    :param data:
+    :param chunk_size:
+    :param delay: Seconds to wait after each chunk
+    :return: Thread writing the data
+    """
+
+    def write() -> None:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            for _ in range(500):
+                try:
+                    sock.connect(str(socket_path))
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    time.sleep(0.01)
+            for start in range(0, len(data), chunk_size):
+                sock.sendall(data[start:start + chunk_size])
+                if delay:
+                    time.sleep(delay)
+
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    return thread
+
+
+def read_replayed(socket_path: Path, data: bytes, data_filter, count: int) -> list[dict]:
+    """
+    Replay the data over the socket and read it back with EveLogHandler
+    :param socket_path:
+    :param data:
+    :param data_filter:
+    :param count: Stop once this many events were read
+    :return:
+    """
+    writer = replay(socket_path, data, chunk_size=777)
+    deadline = time.monotonic() + 30
+    events = []
+    for event in EveLogHandler().get_events(
+            eve_files=[f"unix://{socket_path}"],
+            data_filter=data_filter,
+            stop=lambda: len(events) >= count or time.monotonic() > deadline
+    ):
+        events.append(event)
+    writer.join()
+    return events
+
+
+def read_behind(reader: UnixStreamReader, lines: list[bytes]) -> int:
+    """
+    Replay the lines over the socket and stop reading after the first chunk, until everything was sent
+    :param reader:
+    :param lines:
+    :return: Number of lines read
+    """
+    writer = replay(reader.socket_path, b"".join(lines), chunk_size=4096, delay=0.001)
+    delivered = 0
+    for chunk in reader.chunks(stop=lambda: not writer.is_alive() and reader.received == len(lines)):
+        delivered += len(chunk)
+        if delivered == len(chunk):
+            writer.join()
+    return delivered
+
+
+class StreamTestCase(unittest.TestCase):
+    """
+    Events from a socket must be the same as from the file
+    """
+
+    def test_unix_source(self):
+        """
+        Sources with the unix scheme, before and after going through Path()
+        :return:
+        """
+        self.assertTrue(is_unix_source("unix:///var/run/suricata/eve.sock"))
+        self.assertTrue(is_unix_source(Path("unix:///var/run/suricata/eve.sock")))
+        self.assertFalse(is_unix_source(Path("/var/log/suricata/eve.json")))
+        for source in ["unix:///var/run/eve.sock", Path("unix:///var/run/eve.sock")]:
+            self.assertEqual(Path("/var/run/eve.sock"), unix_socket_path(source))
+
+    def test_get_events(self):
+        """
+        Replay an eve file over the socket, with lines split across writes
+        :return:
+        """
+        eve_file = BASEDIR.joinpath("eve-2.json")
+        data = eve_file.read_bytes()
+        only_alerts = OnlyAlertsFilter()
+        only_alerts.timestamp = DEFAULT_TIMESTAMP_10Y_AGO
+        for data_filter in [AlwaysTrueFilter(), only_alerts]:
+            with self.subTest(data_filter=data_filter), tempfile.TemporaryDirectory() as tmp_dir:
+                expected = list(EveLogHandler(seek_slack=None).get_events(eve_files=[eve_file], data_filter=data_filter))
+                socket_path = Path(tmp_dir) / "eve.sock"
+                self.assertListEqual(expected, read_replayed(socket_path, data, data_filter, len(expected)))
+                self.assertFalse(socket_path.exists())
+
+    def test_overflow(self):
+        """
+        A consumer that falls behind never blocks the writer, the lines that don't fit are counted
+        :return:
+        """
+        lines = BASEDIR.joinpath("eve-2.json").read_bytes().splitlines(keepends=True)
+        for overflow in ["drop", "sample"]:
+            with self.subTest(overflow=overflow), tempfile.TemporaryDirectory() as tmp_dir:
+                reader = UnixStreamReader(Path(tmp_dir) / "eve.sock", queue_size=4, overflow=overflow, sample_every=5)
+                delivered = read_behind(reader, lines)
+                self.assertEqual(len(lines), reader.received)
+                self.assertTrue(reader.dropped or reader.sampled)
+                if overflow == "sample":
+                    self.assertTrue(reader.sampled)
+                else:
+                    self.assertFalse(reader.sampled)
+                self.assertLessEqual(delivered, reader.received - reader.dropped - reader.sampled)
+
+    def test_too_long(self):
+        """
+        A line that doesn't fit on the queue is dropped as malformed, the lines after it still arrive
+        :return:
+        """
+        line = b'{"event_type":"alert","src_ip":"10.0.0.1"}'
+        too_long = b'{"payload":"' + b"A" * (3 * READ_SIZE) + b'"}'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            malformed = []
+            reader = UnixStreamReader(Path(tmp_dir) / "eve.sock", queue_size=1, malformed=malformed.append)
+            writer = replay(reader.socket_path, line + b"\n" + too_long + b"\n" + line + b"\n", chunk_size=64 * 1024)
+            deadline = time.monotonic() + 30
+            delivered = []
+            for chunk in reader.chunks(stop=lambda: len(delivered) >= 2 or time.monotonic() > deadline):
+                delivered.extend(chunk)
+            writer.join()
+        self.assertListEqual([line, line], delivered)
+        self.assertEqual(1, reader.too_long)
+        self.assertListEqual([too_long[:TOO_LONG_HEAD]], malformed)
+
+    def test_scripts(self):
+        """
+        The eve_json reports never end on a socket, so they reject it. A queue without room is a usage error
+        :return:
+        """
+        for main, argv in [
+            (eve_json.main, ["eve_json", "--flow", "unix:///var/run/suricata/eve.sock"]),
+            (eve_json.main, ["eve_json", str(BASEDIR.joinpath("eve-2.json")), "unix:///var/run/suricata/eve.sock"]),
+            (eve_log.main, ["eve_log", "--stream_queue", "0", "unix:///var/run/suricata/eve.sock"]),
+        ]:
+            with (
+                self.subTest(argv=argv), patch("sys.argv", argv), contextlib.redirect_stderr(io.StringIO()),
+                self.assertRaises(SystemExit) as exit_context
+            ):
+                main()
+            self.assertEqual(2, exit_context.exception.code)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Unit test for timestamp handling
+"""
+
+import unittest
+from datetime import UTC, datetime, timedelta
+
+from suricatalog.filter import OnlyAlertsFilter, TimestampFilter
+from suricatalog.log import merge_key
+from suricatalog.time import (
+    TimestampBound,
+    parse_timestamp,
+    timestamp_micros,
+    utc_offset,
+)
+
+
+class TimeTestCase(unittest.TestCase):
+    """
+    Fast paths must agree with datetime
+    """
+
+    def test_parse_timestamp(self):
+        """
+        Positive and negative UTC offsets are honored
+        :return:
+        """
+        expected = datetime(2022, 2, 8, 14, 40, 29, 80710, tzinfo=UTC)
+        for candidate in [
+            "2022-02-08T09:40:29.080710-0500",
+            "2022-02-08T15:40:29.080710+0100",
+            "2022-02-08T20:10:29.080710+05:30",
+            "2022-02-08T14:40:29.080710Z",
+        ]:
+            with self.subTest(candidate=candidate):
+                self.assertEqual(expected, parse_timestamp(candidate))
+                self.assertEqual(int(expected.timestamp() * 1_000_000), timestamp_micros(candidate))
+        self.assertEqual(timedelta(hours=-5), utc_offset("-0500"))
+        for candidate in ["2022-02-30T09:40:29.080710-0500", "2022-02-08T09:40:29.080710-05xx", "yesterday", 1]:
+            with self.subTest(candidate=candidate), self.assertRaises(ValueError):
+                timestamp_micros(candidate)
+
+    def test_bound(self):
+        """
+        String comparisons give the same answer as comparing the datetimes, on any UTC offset
+        :return:
+        """
+        threshold = parse_timestamp("2022-02-08T09:40:29.080710-0500")
+        bound = TimestampBound(threshold)
+        for offset in ["-0500", "+0000", "+0100", "+0530", "-1000"]:
+            zone = datetime.strptime(offset, "%z").tzinfo
+            for delta in [timedelta(microseconds=-1), timedelta(), timedelta(microseconds=1), timedelta(days=400)]:
+                candidate = (threshold + delta).astimezone(zone).strftime("%Y-%m-%dT%H:%M:%S.%f%z")
+                with self.subTest(candidate=candidate):
+                    self.assertEqual(delta > timedelta(), bound.is_newer(candidate))
+        self.assertTrue(bound.is_newer("2022-02-08T14:40:29.080711Z"))
+        self.assertSetEqual({"-0500", "+0000", "+0100", "+0530", "-1000"}, set(bound.rendered))
+        with self.assertRaises(ValueError):
+            bound.is_newer("2022-02-08T09:40:29.080711-05xx")
+        with self.assertRaises(ValueError):
+            TimestampBound(datetime(2022, 2, 8))
+
+        for data_filter in [OnlyAlertsFilter(), TimestampFilter()]:
+            with self.subTest(data_filter=data_filter):
+                data_filter.timestamp = threshold
+                self.assertTrue(data_filter.accept({"timestamp": "2022-02-08T15:40:29.080711+0100", "event_type": "alert"}))
+                self.assertFalse(data_filter.accept({"timestamp": "2022-02-08T15:40:29.080710+0100", "event_type": "alert"}))
+                self.assertFalse(data_filter.accept({"timestamp": "garbage", "event_type": "alert"}))
+                with self.assertRaises(ValueError):
+                    data_filter.timestamp = datetime(2022, 2, 8)
+
+    def test_merge_key(self):
+        """
+        Sensors on different UTC offsets interleave in time order
+        :return:
+        """
+        events = [
+            {"timestamp": "2022-02-08T15:40:29.080710+0100"},
+            {"timestamp": "2022-02-08T09:40:29.080709-0500"},
+            {},
+            {"timestamp": "2022-02-08T14:40:29.080711+0000"},
+        ]
+        self.assertListEqual([events[2], events[1], events[0], events[3]], sorted(events, key=merge_key))
+
+
+if __name__ == "__main__":
+    unittest.main()